@@ -0,0 +1,117 @@
+# Tide Langner
+# Batched PVcell I-V curves over parameter arrays
+
+import numpy as np
+from pvmismatch.pvmismatch_lib import pvcell
+from pvmismatch.pvmismatch_lib.pvconstants import PVconstants
+from case_study_data.module_cache import CELL_DEFAULTS
+
+# pvmismatch cell-model constants not varied in this study (defaults as in PVcell)
+CELL_MODEL_DEFAULTS = dict(
+    aRBD=pvcell.ARBD,
+    bRBD=pvcell.BRBD,
+    VRBD=pvcell.VRBD_,
+    nRBD=pvcell.NRBD,
+    Eg=pvcell.EG,
+)
+
+"""
+PVcell.calcCell is explicit in the diode voltage (no solve): it builds a diode-voltage grid per cell
+(reverse, forward to Voc and a 4th-quadrant tail towards Voc @ STC), then evaluates the currents on it.
+calc_cells repeats exactly those steps with every parameter as an array, so n parameter sets give one
+(n, 3 * npts) block instead of n PVcell constructions. Row k equals PVcell(**params_k).Icell / Vcell / Pcell.
+"""
+
+
+def cell_parameters(n=None, **params):
+    """
+    Broadcast cell parameters (see CELL_DEFAULTS / CELL_MODEL_DEFAULTS) to 1-D arrays of a common length.
+    Missing parameters take their defaults; n forces the length when every parameter is a scalar.
+    """
+    allowed = set(CELL_DEFAULTS) | set(CELL_MODEL_DEFAULTS)
+    unknown = set(params) - allowed
+    if unknown:
+        raise ValueError(f"Unknown cell parameter(s): {sorted(unknown)}. Allowed: {sorted(allowed)}")
+    full = {**CELL_DEFAULTS, **CELL_MODEL_DEFAULTS, **params}
+    arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in full.values()))
+    if n is not None:
+        arrays = [np.broadcast_to(a, (int(n),)) for a in arrays]
+    if arrays[0].ndim != 1:
+        raise ValueError("Cell parameters must be scalars or 1-D arrays.")
+    return dict(zip(full, arrays))
+
+
+def calc_cells(pvconst=None, **params):
+    """
+    I-V curves of many cells in one vectorized pass, following PVcell.calcCell.
+
+    Parameters:
+      - pvconst: PVconstants (default: a new PVconstants(), as PVcell); sets npts, k, q and T0
+      - params: Rs, Rsh, Isc0_T0, alpha_Isc, Isat1_T0, Isat2_T0, Ee [suns], Tcell [K] (and the
+        reverse-breakdown constants / Eg), each a scalar or 1-D array (broadcast together)
+
+    Returns dict with "Icell", "Vcell", "Pcell" (n, 3 * npts) and the broadcast parameters under "params".
+    """
+    pvconst = pvconst if pvconst is not None else PVconstants()
+    p = cell_parameters(**params)
+    col = {k: v[:, None] for k, v in p.items()}
+    Rs, Rsh, Tcell, Ee = col["Rs"], col["Rsh"], col["Tcell"], col["Ee"]
+
+    # Temperature-dependent properties (PVcell.Vt / Isat1 / Isat2 / Isc0)
+    Vt = pvconst.k * Tcell / pvconst.q
+    Tstar = Tcell ** 3. / pvconst.T0 ** 3.
+    inv_delta_T = 1. / pvconst.T0 - 1. / Tcell
+    Isat1 = col["Isat1_T0"] * Tstar * np.exp(col["Eg"] * pvconst.q / pvconst.k * inv_delta_T)
+    Isat2 = col["Isat2_T0"] * Tstar * np.exp(col["Eg"] * pvconst.q / (2.0 * pvconst.k) * inv_delta_T)
+    Isc0 = col["Isc0_T0"] * (1. + col["alpha_Isc"] * (Tcell - pvconst.T0))
+    Isc = Ee * Isc0
+
+    # Photogenerated current (PVcell.Aph / Igen; zero without irradiance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Vdiode_sc = Isc * Rs
+        Aph = 1. + (Isat1 * (np.exp(Vdiode_sc / Vt) - 1.) + Isat2 * (np.exp(Vdiode_sc / 2. / Vt) - 1.)
+                    + Vdiode_sc / Rsh) / Isc
+    Aph = np.where(Isc == 0, np.nan, Aph)
+    Igen = np.where(Ee == 0, 0.0, Aph * Isc)
+
+    # Open-circuit voltage estimates (PVcell.Voc / _VocSTC; VocSTC uses Vt at Tcell, as PVcell does)
+    C = Aph * Isc + Isat1 + Isat2
+    Voc = Vt * np.log(((-Isat2 + np.sqrt(Isat2 ** 2. + 4. * Isat1 * C)) / 2. / Isat1) ** 2.)
+    Vdiode_sc0 = col["Isc0_T0"] * Rs
+    Aph0 = 1. + (col["Isat1_T0"] * (np.exp(Vdiode_sc0 / Vt) - 1.)
+                 + col["Isat2_T0"] * (np.exp(Vdiode_sc0 / 2. / Vt) - 1.) + Vdiode_sc0 / Rsh) / col["Isc0_T0"]
+    C0 = Aph0 * col["Isc0_T0"] + col["Isat1_T0"] + col["Isat2_T0"]
+    VocSTC = Vt * np.log(((-col["Isat2_T0"] + np.sqrt(col["Isat2_T0"] ** 2. + 4. * col["Isat1_T0"] * C0))
+                          / 2. / col["Isat1_T0"]) ** 2.)
+
+    # Diode-voltage grid (PVcell.calcCell branches on delta_Voc per cell)
+    delta_Voc = VocSTC - Voc
+    Vff = np.where(delta_Voc == 0, 0.8 * Voc, np.where(delta_Voc < 0, VocSTC, Voc))
+    delta_Voc = np.where(delta_Voc == 0, 0.2 * Voc, np.abs(delta_Voc))
+    Vreverse = col["VRBD"] * pvconst.negpts.T
+    Vforward = Vff * pvconst.pts.T
+    Vquad4 = Vff + delta_Voc * np.flipud(pvconst.negpts).T
+    Vdiode = np.concatenate((Vreverse, Vforward, Vquad4), axis=1)
+
+    # Currents (PVcell.calcCell)
+    Idiode1 = Isat1 * (np.exp(Vdiode / Vt) - 1.)
+    Idiode2 = Isat2 * (np.exp(Vdiode / 2. / Vt) - 1.)
+    Ishunt = Vdiode / Rsh
+    fRBD = 1. - Vdiode / col["VRBD"]
+    fRBD[fRBD == 0] = pvcell.EPS
+    Vdiode_norm = Vdiode / Rsh / col["Isc0_T0"]
+    fRBD = col["Isc0_T0"] * fRBD ** (-col["nRBD"])
+    IRBD = (col["aRBD"] * Vdiode_norm + col["bRBD"] * Vdiode_norm ** 2) * fRBD
+    Icell = Igen - Idiode1 - Idiode2 - Ishunt - IRBD
+    Vcell = Vdiode - Icell * Rs
+    return {"Icell": Icell, "Vcell": Vcell, "Pcell": Icell * Vcell, "params": p}
+
+
+def degraded_cells(rs_factors=1.0, rsh_factors=1.0, pvconst=None, **params):
+    """
+    Batched cells for degradation paths: Rs * rs_factor and Rsh / rsh_factor around the given (or default)
+    healthy parameters, e.g. the DEG_LEVELS factors or the find_curves Rs/Rsh points.
+    """
+    base = {**CELL_DEFAULTS, **params}
+    return calc_cells(pvconst=pvconst, **{**params, "Rs": base["Rs"] * np.asarray(rs_factors, dtype=float),
+                                          "Rsh": base["Rsh"] / np.asarray(rsh_factors, dtype=float)})
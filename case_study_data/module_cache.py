@@ -0,0 +1,152 @@
+# Tide Langner
+# Shared PVcell / PVmodule factory: interns objects by quantized parameter key with LRU eviction
+
+from collections import OrderedDict
+from pvmismatch.pvmismatch_lib import pvcell, pvmodule
+
+# Jinko JKM290PP-72 healthy cell parameters (defaults for any parameter not given)
+CELL_DEFAULTS = dict(
+    Rs=0.00641575,
+    Rsh=285.79,
+    Isc0_T0=8.69,
+    alpha_Isc=0.00060,
+    Isat1_T0=1.79556E-10,
+    Isat2_T0=1.2696E-5,
+    Ee=1.0,
+    Tcell=298.15,
+)
+
+# Degradation levels of the study: Rs * factor, Rsh / factor (level 0 = healthy, 1..6 = 10%..60% degraded).
+# The single source for sys_degraded_fully, sys_montecarlo and excel_tool
+DEG_FACTORS = {0: 1.0, 1: 1.965, 2: 2.980, 3: 4.070, 4: 5.300, 5: 6.815, 6: 8.970}
+
+
+def deg_level_params(level):
+    """Rs and Rsh of a degradation level (see DEG_FACTORS), relative to the healthy CELL_DEFAULTS."""
+    if level not in DEG_FACTORS:
+        raise ValueError(f"Invalid degradation level {level}. Must be one of {sorted(DEG_FACTORS)}.")
+    factor = DEG_FACTORS[level]
+    return dict(Rs=CELL_DEFAULTS["Rs"] * factor, Rsh=CELL_DEFAULTS["Rsh"] / factor)
+
+# Significant digits kept in cache keys (parameters equal to this precision share one object)
+KEY_SIG_DIGITS = 10
+
+"""
+Cached cells/modules are shared between callers and must never be changed in place:
+  - PVstring.setSuns/setTemps and PVsystem.setSuns/setTemps copy the modules they change, so strings/systems
+    built from cached modules can be updated through them safely
+  - PVmodule.setSuns/setTemps copy the affected cells but update the module ITSELF (pvcells, Imod/Vmod/Pmod);
+    never call them on a cached module, take copy(module) first (or ask get_module for the new parameters)
+  - likewise never assign to cell attributes (e.g. cell.Rs = ..., cell.Ee = ...) of a cached cell
+Any of these would silently change every other user of the cached object.
+"""
+
+
+class _LRUCache:
+    """Minimal LRU mapping with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = int(maxsize)
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.data), "maxsize": self.maxsize}
+
+
+_cells = _LRUCache(maxsize=256)
+_modules = _LRUCache(maxsize=256)
+
+
+def _quantize(x, digits=KEY_SIG_DIGITS):
+    """Round to a fixed number of significant digits so float noise maps to the same key."""
+    return float(f"{float(x):.{digits}g}")
+
+
+def _cell_params(params):
+    """Fill defaults and reject unknown parameters."""
+    unknown = set(params) - set(CELL_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown cell parameter(s): {sorted(unknown)}. Allowed: {sorted(CELL_DEFAULTS)}")
+    full = dict(CELL_DEFAULTS)
+    full.update(params)
+    return full
+
+
+def cell_key(**params):
+    """Quantized, hashable key for a cell parameter set."""
+    full = _cell_params(params)
+    return tuple((name, _quantize(full[name])) for name in CELL_DEFAULTS)
+
+
+def get_cell(**params) -> pvcell.PVcell:
+    """
+    Return a shared PVcell for the given parameters (see CELL_DEFAULTS), building it on a cache miss.
+    The first parameter set seen for a key is the one used to build the cell.
+    """
+    full = _cell_params(params)
+    key = cell_key(**full)
+    cell = _cells.get(key)
+    if cell is None:
+        cell = pvcell.PVcell(**full)
+        _cells.put(key, cell)
+    return cell
+
+
+def get_module(**params) -> pvmodule.PVmodule:
+    """
+    Return a shared 72-cell (STD72) PVmodule built from identical cells with the given parameters.
+    """
+    key = ("STD72",) + cell_key(**params)
+    mod = _modules.get(key)
+    if mod is None:
+        cell = get_cell(**params)
+        mod = pvmodule.PVmodule(cell_pos=pvmodule.STD72, pvcells=[cell] * 72)
+        _modules.put(key, mod)
+    return mod
+
+
+def cache_info():
+    """Hit/miss/eviction counters and sizes for the cell and module caches."""
+    return {"cells": _cells.info(), "modules": _modules.info()}
+
+
+def cache_clear():
+    """Drop all cached objects and reset counters."""
+    _cells.clear()
+    _modules.clear()
+
+
+def set_cache_size(cells=None, modules=None):
+    """Change the LRU bounds (evicts immediately if the new bound is smaller)."""
+    for cache, size in ((_cells, cells), (_modules, modules)):
+        if size is None:
+            continue
+        if int(size) < 1:
+            raise ValueError("Cache size must be >= 1.")
+        cache.maxsize = int(size)
+        while len(cache.data) > cache.maxsize:
+            cache.data.popitem(last=False)
+            cache.evictions += 1
@@ -5,23 +5,29 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from textwrap import fill
+from mismatch_study.sys_mismatch_calculator import refine_mpp
 
-def mpp_from_curve(I, V, P):
+def mpp_from_curve(I, V, P, refine=None):
+    """Sampled MPP, or sub-sample MPP with refine="parabolic" (see sys_mismatch_calculator.refine_mpp)."""
+    if refine is not None:
+        Pmp, Imp, Vmp = refine_mpp(np.ravel(I), np.ravel(V), np.ravel(P), method=refine)
+        return float(Pmp), float(Imp), float(Vmp)
     k = np.argmax(P)
     return P[k].squeeze().item(), I[k].squeeze().item(), V[k].squeeze().item()
 
-def mismatch_report(pvsys, pvsys_healthy=None):
+def mismatch_report(pvsys, pvsys_healthy=None, refine=None):
     """
     Reports degradation-only vs mismatch-only loss_report at the module, string, and system levels.
+    refine: None (sampled MPPs) or "parabolic" (sub-sample MPPs)
     """
 
     # --- actual system degraded MPP (with mismatch) ---
-    Pmp_sys, _, _ = mpp_from_curve(pvsys.Isys, pvsys.Vsys, pvsys.Psys)
+    Pmp_sys, _, _ = mpp_from_curve(pvsys.Isys, pvsys.Vsys, pvsys.Psys, refine)
 
     # --- per-string degraded (with mismatch inside strings) ---
     Pmp_str = []
     for pvstr in pvsys.pvstrs:
-        Pmp_s, _, _ = mpp_from_curve(pvstr.Istring, pvstr.Vstring, pvstr.Pstring)
+        Pmp_s, _, _ = mpp_from_curve(pvstr.Istring, pvstr.Vstring, pvstr.Pstring, refine)
         Pmp_str.append(Pmp_s)
     Pmp_str_sum = float(np.sum(Pmp_str))
 
@@ -29,7 +35,7 @@ def mismatch_report(pvsys, pvsys_healthy=None):
     Pmp_mod = []
     for pvstr in pvsys.pvstrs:
         for mod in pvstr.pvmods:
-            Pmp_m, _, _ = mpp_from_curve(mod.Imod, mod.Vmod, mod.Pmod)
+            Pmp_m, _, _ = mpp_from_curve(mod.Imod, mod.Vmod, mod.Pmod, refine)
             Pmp_mod.append(Pmp_m)
     Pmp_mod_sum = float(np.sum(Pmp_mod))
 
@@ -42,21 +48,21 @@ def mismatch_report(pvsys, pvsys_healthy=None):
         Pmp_mod_healthy = []
         for pvstr in pvsys_healthy.pvstrs:
             for mod in pvstr.pvmods:
-                Pmp_m, _, _ = mpp_from_curve(mod.Imod, mod.Vmod, mod.Pmod)
+                Pmp_m, _, _ = mpp_from_curve(mod.Imod, mod.Vmod, mod.Pmod, refine)
                 Pmp_mod_healthy.append(Pmp_m)
         Pmp_mod_healthy_sum = float(np.sum(Pmp_mod_healthy))
 
         # Healthy strings
         Pmp_str_healthy = []
         for pvstr in pvsys_healthy.pvstrs:
-            Pmp_s, _, _ = mpp_from_curve(pvstr.Istring, pvstr.Vstring, pvstr.Pstring)
+            Pmp_s, _, _ = mpp_from_curve(pvstr.Istring, pvstr.Vstring, pvstr.Pstring, refine)
             Pmp_str_healthy.append(Pmp_s)
         Pmp_str_healthy_sum = float(np.sum(Pmp_str_healthy))
 
         # Healthy system
         Pmp_sys_healthy, _, _ = mpp_from_curve(pvsys_healthy.Isys,
                                                pvsys_healthy.Vsys,
-                                               pvsys_healthy.Psys)
+                                               pvsys_healthy.Psys, refine)
 
     # --- Loss decomposition ---
     loss_report = {}
@@ -109,8 +109,14 @@ Imis_sys_1, Vmis_sys_1, Pmis_sys_1 = mismatch_sys_1.Isys, mismatch_sys_1.Vsys, m
 
 
 # --- Mismatch Report Components ---
-def mpp_from_curve(I, V, P):
+MPP_REFINE = None  # None (sampled maximum) or "parabolic" (sub-sample MPP, see sys_mismatch_calculator.refine_mpp)
+
+def mpp_from_curve(I, V, P, refine=MPP_REFINE):
     """Return (Pmp, Imp, Vmp) from sampled I-V-P arrays"""
+    if refine is not None:
+        from mismatch_study.sys_mismatch_calculator import refine_mpp
+        Pmp, Imp, Vmp = refine_mpp(I, V, P, method=refine)
+        return float(Pmp), float(Imp), float(Vmp)
     k = np.argmax(P)
     return float(P[k]), float(I[k]), float(V[k])
 
@@ -3,7 +3,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider
-from scipy.optimize import newton
 
 # ---- Cell Constants ----
 I_d1_sat_T0 = 2.286188161253440e-11
@@ -23,8 +22,23 @@ I_d1_sat = I_d1_sat_T0 * T_star * np.exp(E_g * q / k * delta_inv_T)
 I_d2_sat = I_d2_sat_T0 * T_star * np.exp(E_g * q / (2 * k) * delta_inv_T)
 V_t = k * T_cell / q
 
-def make_IV_curve(R_s, R_sh, E_e):
-    """Compute I-V curve for given Rs, Rsh, Ee."""
+V_POINTS = np.linspace(0, 0.8, 200)
+
+def solve_IV_batch(R_s, R_sh, E_e, V=V_POINTS, tol=1e-10, maxiter=100):
+    """
+    Two-diode I-V curves for a batch of (Rs, Rsh, Ee) parameter sets, all voltages solved together.
+
+    The two-diode equation has no closed (Lambert-W) form, so I(V) is found by Newton's method on the whole
+    (batch, voltage) array. The residual is decreasing and concave in I, so starting from I = I_gen (where
+    the residual is <= 0 for V >= 0) every point converges monotonically, without overshoot.
+
+    R_s, R_sh, E_e: scalars or arrays broadcast to a batch shape B; V: voltage points (N,).
+    Returns (V, I) with I of shape B + (N,) (negative currents clipped to 0).
+    """
+    R_s, R_sh, E_e = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (R_s, R_sh, E_e)))
+    R_s, R_sh, E_e = R_s[..., None], R_sh[..., None], E_e[..., None]
+    V = np.asarray(V, dtype=float)
+
     I_sc0 = I_sc0_T0 * (1 + alpha_I_sc * (T_cell - T_0))
     I_sc = E_e * I_sc0
 
@@ -35,62 +49,73 @@ def make_IV_curve(R_s, R_sh, E_e):
     A_ph = 1 + (I_d1_sc + I_d2_sc + I_sh_sc) / I_sc
     I_gen = A_ph * I_sc
 
-    def residual(I, V):
-        return (I_gen
-                - I_d1_sat * (np.exp((V + R_s * I) / V_t) - 1)
-                - I_d2_sat * (np.exp((V + R_s * I) / (2 * V_t)) - 1)
-                - (V + R_s * I) / R_sh
-                - I)
-
-    V_vec = np.linspace(0, 0.8, 200)
-    I_vec = []
-    for V in V_vec:
-        try:
-            guess = I_vec[-1] if I_vec else I_sc
-            I_sol = newton(residual, guess, args=(V,), maxiter=100, tol=1e-8)
-            I_vec.append(max(I_sol, 0))
-        except RuntimeError:
-            I_vec.append(np.nan)
-    return V_vec, np.array(I_vec)
-
-# ---- Initial parameters ----
-R_s0, R_sh0, E_e0 = 0.0043, 10.0, 1.0
-V, I = make_IV_curve(R_s0, R_sh0, E_e0)
-
-# ---- Set up figure ----
-fig, ax = plt.subplots(figsize=(10, 6))
-plt.subplots_adjust(left=0.25, bottom=0.35)
-(line,) = ax.plot(V, I, lw=2, color="red")
-ax.set_xlabel("Voltage [V]")
-ax.set_ylabel("Current [A]")
-ax.set_ylim(0, 7)
-ax.set_xlim(0, 0.8)
-ax.grid(True)
-
-# ---- Sliders ----
-axcolor = "lightgoldenrodyellow"
-ax_rs = plt.axes([0.25, 0.25, 0.65, 0.03], facecolor=axcolor)
-ax_rsh = plt.axes([0.25, 0.18, 0.65, 0.03], facecolor=axcolor)
-ax_ee = plt.axes([0.25, 0.11, 0.65, 0.03], facecolor=axcolor)
-
-s_rs = Slider(ax_rs, "R_s [Ω]", 1e-4, 0.05, valinit=R_s0, valstep=1e-4)
-s_rsh = Slider(ax_rsh, "R_sh [Ω]", 1, 15, valinit=R_sh0, valstep=0.5)
-s_ee = Slider(ax_ee, "E_e [suns]", 0.1, 1.2, valinit=E_e0, valstep=0.05)
-
-# ---- Update function ----
-def update(val):
-    R_s = s_rs.val
-    R_sh = s_rsh.val
-    E_e = s_ee.val
-    V, I = make_IV_curve(R_s, R_sh, E_e)
-    line.set_ydata(I)
-    line.set_xdata(V)
-    ax.relim()
-    ax.autoscale_view()
-    fig.canvas.draw_idle()
-
-s_rs.on_changed(update)
-s_rsh.on_changed(update)
-s_ee.on_changed(update)
-
-plt.show()
+    I = np.broadcast_to(I_gen, np.broadcast_shapes(I_gen.shape, V.shape)).copy()
+    for _ in range(maxiter):
+        V_d = V + R_s * I
+        e1 = I_d1_sat * np.exp(V_d / V_t)
+        e2 = I_d2_sat * np.exp(V_d / (2 * V_t))
+        residual = I_gen - (e1 - I_d1_sat) - (e2 - I_d2_sat) - V_d / R_sh - I
+        slope = -R_s * (e1 / V_t + e2 / (2 * V_t) + 1 / R_sh) - 1
+        step = residual / slope
+        I -= step
+        if np.max(np.abs(step)) < tol:
+            break
+    return V, np.maximum(I, 0)
+
+def make_IV_curve(R_s, R_sh, E_e):
+    """Compute I-V curve for given Rs, Rsh, Ee."""
+    return solve_IV_batch(R_s, R_sh, E_e)
+
+def curve_family(R_s, R_sh, E_e):
+    """
+    Pre-tabulate I-V curves along a parameter path in one batch, e.g. the degradation paths of
+    case_study_data.find_curves: curve_family(find_Rs_curve().values, find_Rsh_curve().values, 1.0).
+    Returns (V, I) with one curve per row.
+    """
+    return solve_IV_batch(R_s, R_sh, E_e)
+
+def main():
+    # ---- Initial parameters ----
+    R_s0, R_sh0, E_e0 = 0.0043, 10.0, 1.0
+    V, I = make_IV_curve(R_s0, R_sh0, E_e0)
+
+    # ---- Set up figure ----
+    fig, ax = plt.subplots(figsize=(10, 6))
+    plt.subplots_adjust(left=0.25, bottom=0.35)
+    (line,) = ax.plot(V, I, lw=2, color="red")
+    ax.set_xlabel("Voltage [V]")
+    ax.set_ylabel("Current [A]")
+    ax.set_ylim(0, 7)
+    ax.set_xlim(0, 0.8)
+    ax.grid(True)
+
+    # ---- Sliders ----
+    axcolor = "lightgoldenrodyellow"
+    ax_rs = plt.axes([0.25, 0.25, 0.65, 0.03], facecolor=axcolor)
+    ax_rsh = plt.axes([0.25, 0.18, 0.65, 0.03], facecolor=axcolor)
+    ax_ee = plt.axes([0.25, 0.11, 0.65, 0.03], facecolor=axcolor)
+
+    s_rs = Slider(ax_rs, "R_s [Ω]", 1e-4, 0.05, valinit=R_s0, valstep=1e-4)
+    s_rsh = Slider(ax_rsh, "R_sh [Ω]", 1, 15, valinit=R_sh0, valstep=0.5)
+    s_ee = Slider(ax_ee, "E_e [suns]", 0.1, 1.2, valinit=E_e0, valstep=0.05)
+
+    # ---- Update function ----
+    def update(val):
+        R_s = s_rs.val
+        R_sh = s_rsh.val
+        E_e = s_ee.val
+        V, I = make_IV_curve(R_s, R_sh, E_e)
+        line.set_ydata(I)
+        line.set_xdata(V)
+        ax.relim()
+        ax.autoscale_view()
+        fig.canvas.draw_idle()
+
+    s_rs.on_changed(update)
+    s_rsh.on_changed(update)
+    s_ee.on_changed(update)
+
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
 # Tide Langner
 # Tool for defining a system from an Excel file
 
+import hashlib
+import importlib.util
+import json
+import os
+import time
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
 from typing import Dict, List, Tuple
 from pvmismatch.pvmismatch_lib import pvcell, pvmodule, pvstring, pvsystem
 from mismatch_study.sys_mismatch_calculator import loss_calculator
 from mismatch_study.sys_mismatch_calculator import mpp_from_curve
+from mismatch_study.sys_mismatched import CompositeSystem
+from case_study_data.module_cache import DEG_FACTORS, get_cell, get_module
 
 # =========================
 # Constants / Configuration
@@ -29,15 +39,15 @@ HEALTHY_PARAMS = dict(
     Isat2_T0=1.2696E-5,
 )
 
-# Degradation multipliers for levels 1-6
-DEG_LEVELS = {
-    1: (1.965, 1.965),  # Rs*1.965 ; Rsh/1.965
-    2: (2.980, 2.980),  # Rs*2.980 ; Rsh/2.980
-    3: (4.070, 4.070),  # Rs*4.070 ; Rsh/4.070
-    4: (5.300, 5.300),  # Rs*5.300 ; Rsh/5.300
-    5: (6.815, 6.815),  # Rs*6.815 ; Rsh/6.815
-    6: (8.970, 8.970),  # Rs*8.970 ; Rsh/8.970
-}
+# String summary sheet columns: required, and optional with their default (L-levels 0, TotalMods 30)
+SHEET_REQUIRED_COLUMNS = ("Inverter", "StringName", "L0_healthy")
+SHEET_OPTIONAL_COLUMNS = {"TotalMods": num_modules_per_str, **{f"L{i}": 0 for i in range(1, 7)}}
+
+# Columnar cache of parsed sheets (next to the workbook), see read_plant_sheet
+SHEET_CACHE_DIR = ".sheet_cache"
+
+# Degradation multipliers (Rs factor, Rsh divisor) for levels 1-6, from module_cache.DEG_FACTORS
+DEG_LEVELS = {lvl: (factor, factor) for lvl, factor in DEG_FACTORS.items() if lvl > 0}
 
 # ===============
 # HELPER BUILDERS
@@ -58,14 +68,16 @@ def _parse_str_index(string_name: str) -> int:
     return int(m.group(1))
 
 def _make_cell(rs: float, rsh: float) -> pvcell.PVcell:
-    """Create a PVcell with Rs/Rsh parameters."""
-    return pvcell.PVcell(Rs=rs, Rsh=rsh,
-                         Isc0_T0=HEALTHY_PARAMS["Isc0_T0"], alpha_Isc=HEALTHY_PARAMS["alpha_Isc"],
-                         Isat1_T0=HEALTHY_PARAMS["Isat1_T0"], Isat2_T0=HEALTHY_PARAMS["Isat2_T0"])
+    """Return the shared (cached) PVcell with Rs/Rsh parameters."""
+    return get_cell(Rs=rs, Rsh=rsh,
+                    Isc0_T0=HEALTHY_PARAMS["Isc0_T0"], alpha_Isc=HEALTHY_PARAMS["alpha_Isc"],
+                    Isat1_T0=HEALTHY_PARAMS["Isat1_T0"], Isat2_T0=HEALTHY_PARAMS["Isat2_T0"])
 
-def _make_module_from_cell(cell: pvcell.PVcell) -> pvmodule.PVmodule:
-    # 72-cell module layout
-    return pvmodule.PVmodule(cell_pos=pvmodule.STD72, pvcells=[cell] * 72)
+def _make_module(rs: float, rsh: float) -> pvmodule.PVmodule:
+    """Return the shared (cached) 72-cell PVmodule with Rs/Rsh parameters."""
+    return get_module(Rs=rs, Rsh=rsh,
+                      Isc0_T0=HEALTHY_PARAMS["Isc0_T0"], alpha_Isc=HEALTHY_PARAMS["alpha_Isc"],
+                      Isat1_T0=HEALTHY_PARAMS["Isat1_T0"], Isat2_T0=HEALTHY_PARAMS["Isat2_T0"])
 
 def _get_module_prototypes() -> Dict[str, pvmodule.PVmodule]:
     """
@@ -73,63 +85,164 @@ def _get_module_prototypes() -> Dict[str, pvmodule.PVmodule]:
     Returns a dict: {"H": PVmodule, "L1": PVmodule, ..., "L6": PVmodule}.
     """
     # Healthy module
-    healthy_cell = _make_cell(HEALTHY_PARAMS["Rs"], HEALTHY_PARAMS["Rsh"])
-    prototypes = {"H": _make_module_from_cell(healthy_cell)}
+    prototypes = {"H": _make_module(HEALTHY_PARAMS["Rs"], HEALTHY_PARAMS["Rsh"])}
 
     # Degraded modules by level
     for lvl, (rs_factor, rsh_factor) in DEG_LEVELS.items():
-        cell = _make_cell(HEALTHY_PARAMS["Rs"] * rs_factor, HEALTHY_PARAMS["Rsh"] / rsh_factor)
-        prototypes[f"L{lvl}"] = _make_module_from_cell(cell)
+        prototypes[f"L{lvl}"] = _make_module(HEALTHY_PARAMS["Rs"] * rs_factor, HEALTHY_PARAMS["Rsh"] / rsh_factor)
     return prototypes
 
-def _instantiate_modules(proto: pvmodule.PVmodule, count: int) -> List[pvmodule.PVmodule]:
-    """
-    Create 'count' fresh PVmodule instances with the same cell parameters as 'proto'.
-    """
-    # Extract the first cell to replicate parameters
-    c = proto.pvcells[0]
-    cell_copy = pvcell.PVcell(Rs=float(c.Rs), Rsh=float(c.Rsh),
-                              Isc0_T0=float(c.Isc0_T0), alpha_Isc=float(c.alpha_Isc),
-                              Isat1_T0=float(c.Isat1_T0), Isat2_T0=float(c.Isat2_T0))
-    return [_make_module_from_cell(cell_copy) for _ in range(count)]
-
-def _compose_string_modules(counts: Dict[str, int], protos: Dict[str, pvmodule.PVmodule]) -> List[pvmodule.PVmodule]:
+def _compose_string_keys(counts: Dict[str, int]) -> Tuple[str, ...]:
     """
-    Compose a list of 30 PVmodule instances for one string using counts:
+    Prototype keys of the 30 modules of one string using counts:
     counts = {"H": L0_healthy, "L1": L1, "L2": L2, "L3": L3}
+    Strings reference the shared, immutable prototypes (see case_study_data.module_cache) instead of
+    fresh module instances, so the key tuple fully identifies a string.
     """
-    modules: List[pvmodule.PVmodule] = []
+    keys: List[str] = []
     for key in ("H", "L1", "L2", "L3"):
-        if counts.get(key, 0) > 0 and key in protos:
-            modules.extend(_instantiate_modules(protos[key], counts[key]))
+        if counts.get(key, 0) > 0:
+            keys.extend([key] * counts[key])
     # Ensure total = 30; if fewer, pad with healthy; if more, trim (safety)
-    if len(modules) < num_modules_per_str:
-        short = num_modules_per_str - len(modules)
-        modules.extend(_instantiate_modules(protos["H"], short))
-    elif len(modules) > num_modules_per_str:
-        modules = modules[:num_modules_per_str]
-    return modules
+    if len(keys) < num_modules_per_str:
+        keys.extend(["H"] * (num_modules_per_str - len(keys)))
+    elif len(keys) > num_modules_per_str:
+        keys = keys[:num_modules_per_str]
+    return tuple(keys)
+
+# One PVstring per distinct composition (tuple of prototype keys), shared by every inverter that contains it.
+# Prototypes come from _get_module_prototypes, which always returns the same cached modules.
+_string_cache: Dict[Tuple[str, ...], pvstring.PVstring] = {}
+
+def _get_string(keys: Tuple[str, ...], protos: Dict[str, pvmodule.PVmodule]) -> pvstring.PVstring:
+    """Return the shared PVstring for this composition, solving it on first use."""
+    pvstr = _string_cache.get(keys)
+    if pvstr is None:
+        pvstr = pvstring.PVstring(pvmods=[protos[k] for k in keys])
+        _string_cache[keys] = pvstr
+    return pvstr
 
 # ===============
 # EXCEL UTILITIES
 # ===============
 
-def _read_inverter_rows(path: str, sheet: str, inv_code: str) -> pd.DataFrame:
+def _validate_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check and normalise a string summary sheet.
+    Required columns: Inverter, StringName, L0_healthy. Optional: L1..L6 (default 0), TotalMods (default 30).
+    Returns a copy with exactly those columns: Inverter/StringName as str, counts as non-negative int64.
     """
-    Read Excel and return rows for a single inverter code.
-    Expected columns (at least): Inverter, StringName, L0_healthy, L1..L6, TotalMods.
-    Missing L-levels default to 0; missing TotalMods defaults to num_modules_per_str.
+    missing = [c for c in SHEET_REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"String summary sheet is missing column(s) {missing}; found {list(df.columns)}")
+
+    out = pd.DataFrame({"Inverter": df["Inverter"].astype(str), "StringName": df["StringName"].astype(str)})
+    for col, default in (("L0_healthy", None), *SHEET_OPTIONAL_COLUMNS.items()):
+        values = df[col] if col in df.columns else pd.Series(default, index=df.index)
+        if default is not None:
+            values = values.fillna(default)
+        numeric = pd.to_numeric(values, errors="coerce")
+        bad = numeric.isna() | (numeric < 0) | (numeric != np.round(numeric))
+        if bad.any():
+            rows = list(df.index[bad][:5])
+            raise ValueError(f"Column '{col}' must hold non-negative integers (bad rows: {rows})")
+        out[col] = numeric.astype(np.int64)
+    return out.reset_index(drop=True)
+
+def _file_sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _sheet_cache_paths(path: Path, sheet: str, fmt: str) -> Tuple[Path, Path]:
+    """(data_path, key_path) of the cached copy of one sheet."""
+    cache_dir = path.parent / SHEET_CACHE_DIR
+    stem = f"{path.stem}.{sheet}"
+    return cache_dir / f"{stem}.{fmt}", cache_dir / f"{stem}.json"
+
+def _load_sheet_cache(data_path: Path, fmt: str) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pd.read_parquet(data_path)
+    with np.load(data_path, allow_pickle=False) as data:
+        df = pd.DataFrame({col: data[col] for col in data.files})
+    for col in ("Inverter", "StringName"):
+        df[col] = df[col].astype(str)
+    return df
+
+def _write_sheet_cache(df: pd.DataFrame, data_path: Path, key_path: Path, key: Dict[str, object], fmt: str):
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = data_path.with_name(data_path.name + ".tmp")
+    if fmt == "parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        with open(tmp, "wb") as f:
+            np.savez(f, **{col: df[col].to_numpy(dtype=str if col in ("Inverter", "StringName") else np.int64)
+                           for col in df.columns})
+    os.replace(tmp, data_path)
+    with open(key_path, "w") as f:
+        json.dump(key, f, indent=2)
+
+def read_plant_sheet(path="string_summary_edited.xlsx", sheet="Sheet2", use_cache=True,
+                     cache_format="auto") -> pd.DataFrame:
     """
-    df = pd.read_excel(path, sheet_name=sheet, usecols="A:G", skiprows=1, engine="openpyxl")
+    Read and validate the string summary sheet (all inverters), see _validate_sheet.
+
+    The first read parses the workbook with openpyxl and writes a columnar copy to
+    <workbook dir>/.sheet_cache/<name>.<sheet>.{npz|parquet} with a JSON key (mtime, size, SHA-1).
+    Later reads load the copy directly if the workbook's mtime and size are unchanged, or if its
+    content hash still matches (e.g. after a touch/copy); otherwise the workbook is parsed again.
+
+    Parameters:
+      use_cache: False always parses the workbook (and does not write a cache)
+      cache_format: "npz", "parquet" (needs pyarrow), or "auto" (parquet if available, else npz)
+    """
+    path = Path(path)
+    if not use_cache:
+        return _validate_sheet(pd.read_excel(path, sheet_name=sheet, usecols="A:G", skiprows=1, engine="openpyxl"))
+
+    if cache_format == "auto":
+        cache_format = "parquet" if importlib.util.find_spec("pyarrow") is not None else "npz"
+    if cache_format not in ("npz", "parquet"):
+        raise ValueError(f"Invalid cache_format '{cache_format}'. Must be 'npz', 'parquet' or 'auto'.")
+
+    data_path, key_path = _sheet_cache_paths(path, sheet, cache_format)
+    stat = path.stat()
+    key = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": None, "sheet": sheet}
+
+    if data_path.exists() and key_path.exists():
+        with open(key_path, "r") as f:
+            cached = json.load(f)
+        if (cached.get("sheet") == sheet and cached.get("mtime_ns") == key["mtime_ns"]
+                and cached.get("size") == key["size"]):
+            return _load_sheet_cache(data_path, cache_format)
+        key["sha1"] = _file_sha1(path)
+        if cached.get("sheet") == sheet and cached.get("sha1") == key["sha1"]:
+            # Same content, new timestamp: refresh the key only
+            with open(key_path, "w") as f:
+                json.dump(key, f, indent=2)
+            return _load_sheet_cache(data_path, cache_format)
+
+    df = _validate_sheet(pd.read_excel(path, sheet_name=sheet, usecols="A:G", skiprows=1, engine="openpyxl"))
+    if key["sha1"] is None:
+        key["sha1"] = _file_sha1(path)
+    _write_sheet_cache(df, data_path, key_path, key, cache_format)
+    return df
+
+def _select_inverter(file: pd.DataFrame, inverter: int) -> pd.DataFrame:
+    """Rows of the plant sheet belonging to one inverter (1-based index)."""
+    return file.loc[file["Inverter"].astype(str) == _get_inv_code(inverter)].copy()
+
+def _read_inverter_rows(path: str, sheet: str, inv_code: str) -> pd.DataFrame:
+    """Read Excel and return rows for a single inverter code (see read_plant_sheet)."""
+    df = read_plant_sheet(path, sheet)
     return df.loc[df["Inverter"].astype(str) == inv_code].copy()
 
-def _build_inverter_strings(df: pd.DataFrame, protos: Dict[str, pvmodule.PVmodule]) \
-        -> Tuple[List[pvstring.PVstring], Dict[int, Dict[str, int]]]:
+def _inverter_string_counts(df: pd.DataFrame) -> Dict[int, Dict[str, int]]:
     """
-    Build 28 PVstrings for an inverter, mapping any missing string to healthy.
-    Returns:
-      - list of PVstring objects
-      - metadata dict per string index with counts used
+    Module counts per level for the 28 strings of an inverter, mapping any missing string to healthy.
+    Returns a dict per 1-based string index: {"H": n, "L1": n, ..., "L6": n}.
     """
     # Initialise all 28 strings as healthy
     base_counts = {"H": num_modules_per_str}
@@ -162,12 +275,22 @@ def _build_inverter_strings(df: pd.DataFrame, protos: Dict[str, pvmodule.PVmodul
 
             per_str_counts[sidx] = used
 
-    # Build strings
+    return per_str_counts
+
+def _build_inverter_strings(df: pd.DataFrame, protos: Dict[str, pvmodule.PVmodule]) \
+        -> Tuple[List[pvstring.PVstring], Dict[int, Dict[str, int]]]:
+    """
+    Build 28 PVstrings for an inverter, mapping any missing string to healthy.
+    Returns:
+      - list of PVstring objects
+      - metadata dict per string index with counts used
+    """
+    per_str_counts = _inverter_string_counts(df)
+
+    # Build strings (identical compositions share one PVstring)
     pvstrings: List[pvstring.PVstring] = []
     for sidx in range(1, num_strs_per_inv+1):
-        counts = per_str_counts[sidx]
-        mods = _compose_string_modules(counts, protos)
-        pvstrings.append(pvstring.PVstring(pvmods=mods))
+        pvstrings.append(_get_string(_compose_string_keys(per_str_counts[sidx]), protos))
     return pvstrings, per_str_counts
 
 # =================
@@ -192,22 +315,20 @@ def create_all_inverters(path="string_summary_edited.xlsx", sheet="Sheet2") -> D
     systems: Dict[int, pvsystem.PVsystem] = {}
     protos = _get_module_prototypes()
     # Read once to avoid repeated IO
-    file = pd.read_excel(path, sheet_name=sheet, usecols="A:G", skiprows=1, engine="openpyxl")
+    file = read_plant_sheet(path, sheet)
     for inv_num in range(1, num_inverters+1):
-        inv = _get_inv_code(inv_num)
-        df = file.loc[file["Inverter"].astype(str) == inv].copy()
+        df = _select_inverter(file, inv_num)
         pvstrings, _ = _build_inverter_strings(df, protos)
         systems[inv_num] = pvsystem.PVsystem(pvstrs=pvstrings)
     return systems
 
 def create_combined_system(inverters: List[int], path="string_summary_edited.xlsx", sheet="Sheet2") -> pvsystem.PVsystem:
     """Create a single PVsystem by concatenating strings from the selected inverters."""
-    file = pd.read_excel(path, sheet_name=sheet, usecols="A:G", skiprows=1, engine="openpyxl")
+    file = read_plant_sheet(path, sheet)
     protos = _get_module_prototypes()
     all_strings: List[pvstring.PVstring] = []
     for inv_num in inverters:
-        inv = _get_inv_code(inv_num)
-        df = file.loc[file["Inverter"].astype(str) == inv].copy()
+        df = _select_inverter(file, inv_num)
         pvstrings, _ = _build_inverter_strings(df, protos)
         all_strings.extend(pvstrings)
     return pvsystem.PVsystem(pvstrs=all_strings)
@@ -263,9 +384,11 @@ def plot_system_iv_pv(sys: pvsystem.PVsystem, title: str = "System", save_path:
 
 def plot_inverters(inverters: List[int], path="string_summary_edited.xlsx", sheet="Sheet2"):
     """Plot IV/PV for given inverter indices, each on its own figure."""
+    file = read_plant_sheet(path, sheet)
+    protos = _get_module_prototypes()
     for inv in inverters:
-        sys, _ = create_system_from_excel(path=path, sheet=sheet, inverter=inv)
-        plot_system_iv_pv(sys, title=f"Inverter {inv}")
+        pvstrings, _ = _build_inverter_strings(_select_inverter(file, inv), protos)
+        plot_system_iv_pv(pvsystem.PVsystem(pvstrs=pvstrings), title=f"Inverter {inv}")
 
 # =================
 # HEALTHY BASELINES
@@ -277,16 +400,9 @@ def create_healthy_inverter(inverter: int = 1) -> pvsystem.PVsystem:
     Matches the electrical parameters used elsewhere in this module.
     """
     protos = _get_module_prototypes()
-    # Build one healthy string
-    mods_healthy = _instantiate_modules(protos["H"], num_modules_per_str)
-    str_healthy = pvstring.PVstring(pvmods=mods_healthy)
-    # Replicate to num_strs_per_inv
-    pvstrings = []
-    for _ in range(num_strs_per_inv):
-        # fresh instances for each string to avoid shared state
-        mods = _instantiate_modules(protos["H"], num_modules_per_str)
-        pvstrings.append(pvstring.PVstring(pvmods=mods))
-    return pvsystem.PVsystem(pvstrs=pvstrings)
+    # Build one healthy string and share it across num_strs_per_inv
+    str_healthy = _get_string(("H",) * num_modules_per_str, protos)
+    return pvsystem.PVsystem(pvstrs=[str_healthy] * num_strs_per_inv)
 
 def create_healthy_combined(inverters: List[int]) -> pvsystem.PVsystem:
     """
@@ -294,47 +410,135 @@ def create_healthy_combined(inverters: List[int]) -> pvsystem.PVsystem:
     for the selected inverter indices.
     """
     protos = _get_module_prototypes()
-    all_strings: List[pvstring.PVstring] = []
-    for _ in inverters:
-        for _s in range(num_strs_per_inv):
-            mods = _instantiate_modules(protos["H"], num_modules_per_str)
-            all_strings.append(pvstring.PVstring(pvmods=mods))
-    return pvsystem.PVsystem(pvstrs=all_strings)
+    str_healthy = _get_string(("H",) * num_modules_per_str, protos)
+    return pvsystem.PVsystem(pvstrs=[str_healthy] * (num_strs_per_inv * len(inverters)))
+
+# ================
+# PLANT EVALUATION
+# ================
+
+# Healthy inverter baseline, built once per worker process (see _init_plant_worker)
+_worker_healthy = None
+
+def _init_plant_worker():
+    """Process-pool initializer: build the shared healthy inverter baseline in this worker."""
+    global _worker_healthy
+    _worker_healthy = create_healthy_inverter()
+
+def _evaluate_inverter(job: Tuple[int, Dict[int, Dict[str, int]]]) -> Dict[str, float]:
+    """
+    Build one inverter from its per-string counts and return its loss report (plus inverter id/counts).
+    Strings with identical compositions are collapsed into one weighted string (CompositeSystem).
+    """
+    inv_num, per_str_counts = job
+    signatures = [_compose_string_keys(per_str_counts[sidx]) for sidx in range(1, num_strs_per_inv + 1)]
+    pvsys = CompositeSystem(_get_module_prototypes(), signatures, string_cache=_string_cache)
+    degraded = [sum(v for k, v in c.items() if k != "H") for c in per_str_counts.values()]
+    report = {"inverter": inv_num,
+              "degraded_strings": sum(1 for d in degraded if d > 0),
+              "degraded_modules": sum(degraded)}
+    report.update(loss_calculator(pvsys, _worker_healthy, num_strs_affected=num_strs_per_inv))
+    return report
+
+def evaluate_plant(path="string_summary_edited.xlsx", sheet="Sheet2", inverters=None,
+                   max_workers=None) -> pd.DataFrame:
+    """
+    Per-inverter loss table for the plant.
+
+    The sheet is parsed once; inverters are evaluated in a process pool, each worker comparing against
+    its own copy of the healthy inverter baseline (built once per worker).
+
+    Parameters:
+      path, sheet: Excel source (see read_plant_sheet)
+      inverters: 1-based inverter indices (default: all 1..num_inverters)
+      max_workers: pool size; defaults to min(len(inverters), os.cpu_count()); <= 1 runs in-process
+
+    Returns:
+      DataFrame indexed by inverter with degraded_strings, degraded_modules and the loss_calculator metrics
+    """
+    start = time.time()
+    if inverters is None:
+        inverters = range(1, num_inverters + 1)
+    file = read_plant_sheet(path, sheet)
+    jobs = [(int(inv), _inverter_string_counts(_select_inverter(file, inv))) for inv in inverters]
+
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+
+    if max_workers <= 1:
+        _init_plant_worker()
+        rows = [_evaluate_inverter(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_plant_worker) as pool:
+            rows = list(pool.map(_evaluate_inverter, jobs))
+
+    table = pd.DataFrame(rows).set_index("inverter").sort_index()
+    elapsed = time.time() - start
+    print(f"\nEvaluated {len(table)} inverters in {timedelta(seconds=elapsed)} ({max_workers} workers)")
+    return table
+
+# ===============
+# RECONFIGURATION
+# ===============
+
+def optimise_inverter(inverter=1, path="string_summary_edited.xlsx", sheet="Sheet2", **kwargs) -> Dict[str, object]:
+    """
+    Reassign an inverter's modules (as counted in the sheet) across its 28 strings to maximise the inverter MPP.
+    See mismatch_study.sys_reconfigure.optimise_strings for the search and kwargs; the result also has
+    "inverter".
+    """
+    # Imported on use: the reconfiguration chain pulls in the time-series/curve-table modules
+    from mismatch_study.sys_reconfigure import optimise_strings
+
+    per_str_counts = _inverter_string_counts(_select_inverter(read_plant_sheet(path, sheet), inverter))
+    layout = [_compose_string_keys(per_str_counts[sidx]) for sidx in range(1, num_strs_per_inv + 1)]
+    result = optimise_strings(_get_module_prototypes(), layout=layout, **kwargs)
+    result["inverter"] = inverter
+    return result
 
 # ===
 # RUN
 # ===
 
-# Single Inverter System and Plot
-inv = 1
-sys_i01, meta = create_system_from_excel(path="string_summary_edited.xlsx", sheet="Sheet2", inverter=inv)
-healthy_sys = create_healthy_inverter(inverter=inv)
-# print("String 6 counts:", meta[6])  # example
-plot_system_iv_pv(sys_i01, title="Inverter 1")
+if __name__ == "__main__":
+    # Single Inverter System and Plot
+    inv = 1
+    sys_i01, meta = create_system_from_excel(path="string_summary_edited.xlsx", sheet="Sheet2", inverter=inv)
+    healthy_sys = create_healthy_inverter(inverter=inv)
+    # print("String 6 counts:", meta[6])  # example
+    plot_system_iv_pv(sys_i01, title="Inverter 1")
+
+    report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
+    print(f"\n=== Mismatch Report for Inverter {inv} ===")
+    for k, v in report.items():
+        print(f"{k}: {v}")
+
+    # # Module reconfiguration of one inverter (greedy Imp sort + pairwise swaps)
+    # best = optimise_inverter(inverter=inv)
+    # print(best["Pmp_initial"], best["Pmp_optimised"], best["compositions"])
 
-report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
-print(f"\n=== Mismatch Report for Inverter {inv} ===")
-for k, v in report.items():
-    print(f"{k}: {v}")
+    # # Plant-level loss table (all inverters, parallel)
+    # plant = evaluate_plant(path="string_summary_edited.xlsx", sheet="Sheet2")
+    # print(plant[["degraded_strings", "system_MPP_degraded", "mismatch_total", "percent_loss"]])
 
 
-# # Multiple Inverter System and Plot
-# inverters = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-# sys_all = create_combined_system(inverters)
-# plot_system_iv_pv(sys_all, title="All Inverters")
+    # # Multiple Inverter System and Plot
+    # inverters = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    # sys_all = create_combined_system(inverters)
+    # plot_system_iv_pv(sys_all, title="All Inverters")
 
-# report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
-# print(f"\n=== Mismatch Report for Inverters {inverters} ===")
-# for k, v in report.items():
-#     print(f"{k}: {v}")
+    # report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
+    # print(f"\n=== Mismatch Report for Inverters {inverters} ===")
+    # for k, v in report.items():
+    #     print(f"{k}: {v}")
 
 
-# # Create all inverters
-# system = create_all_inverters(path="string_summary_edited.xlsx", sheet="Sheet2")
-# # system[1], system[2], ...
+    # # Create all inverters
+    # system = create_all_inverters(path="string_summary_edited.xlsx", sheet="Sheet2")
+    # # system[1], system[2], ...
 
-# report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
-# print(f"\n=== Mismatch Report for Inverter {inv} ===")
-# for k, v in report.items():
-#     print(f"{k}: {v}")
+    # report = loss_calculator(sys_i01, healthy_sys, num_strs_affected=28)
+    # print(f"\n=== Mismatch Report for Inverter {inv} ===")
+    # for k, v in report.items():
+    #     print(f"{k}: {v}")
 
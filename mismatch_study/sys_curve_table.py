@@ -0,0 +1,196 @@
+# Tide Langner
+# Module I-V lookup tables over an (Ee, Tcell) grid
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pvmismatch
+from pvmismatch.pvmismatch_lib.pvconstants import npinterpx
+from case_study_data.module_cache import get_module
+try:
+    from sys_mismatch_calculator import mpp_from_curve
+except ImportError:  # imported as part of the mismatch_study package (e.g. from excel_tool)
+    from mismatch_study.sys_mismatch_calculator import mpp_from_curve
+
+"""
+A curve table holds one module prototype's I-V curve at every node of an (Ee, Tcell) grid, resampled on a fixed
+normalised current axis u = I / Isc. At query time the curve is interpolated bilinearly in (log Ee, Tcell):
+  - V(u) is close to linear in log Ee and Tcell at fixed u
+  - Isc / Ee and Pmp / Ee are tabulated alongside (Isc is exactly proportional to Ee in pvmismatch)
+String curves for any composition are then series combinations of interpolated module curves
+(see sys_timeseries.evaluate_condition), so metrics at arbitrary conditions need no pvmismatch solve.
+
+Error estimate: at build time every grid cell is checked against an exact solve at its centre; the relative
+module MPP error there is stored per cell and returned with each query. This is a single-point estimate, NOT a
+bound: other points in a cell can be off by several times as much. Cells where pvmismatch itself returns
+degenerate curves (low irradiance combined with high temperature) have no estimate (error = inf).
+Mismatch is a small difference of near-equal powers, so interpolated curves are fit for system/string energies
+but not for mismatch or loss energies (sys_timeseries warns when they are used that way).
+"""
+
+# Bump when the table layout or interpolation changes (invalidates persisted tables)
+CURVE_TABLE_VERSION = 1
+
+# Default grid: Ee [suns] log-spaced, Tcell [K] linear
+DEFAULT_EE_GRID = tuple(np.geomspace(0.005, 1.4, 33))
+DEFAULT_TCELL_GRID = tuple(np.arange(250.0, 360.0 + 1e-9, 5.0))
+
+# Normalised current axis: forward branch from Voc (u = 0) clustered towards Isc, short reverse branch
+# (bypass-clipped); u = 0 keeps the open-circuit end strictly monotonic in V
+U_MIN, U_MAX = 0.0, 2.0
+U_FORWARD, U_REVERSE = 256, 32
+
+
+def _u_axis():
+    s = np.linspace(0.0, 1.0, U_FORWARD)
+    forward = U_MIN + (1.0 - U_MIN) * np.sin(0.5 * np.pi * s)
+    reverse = np.geomspace(1.0, U_MAX, U_REVERSE + 1)[1:]
+    return np.concatenate((forward, reverse))
+
+
+def _solve_node(params, Ee, Tcell, u):
+    """Exact module curve at one condition, resampled on u. Returns (V(u), Isc, Pmp)."""
+    pvmod = get_module(**params, Ee=Ee, Tcell=Tcell)
+    I, V = pvmod.Imod.flatten(), pvmod.Vmod.flatten()
+    Isc = float(pvmod.Isc.mean())
+    order = np.argsort(I)
+    return npinterpx(u * Isc, I[order], V[order]), Isc, mpp_from_curve(I, V, I * V)[0]
+
+
+def _locate(grid, x):
+    """Lower cell index and fractional position of x on a sorted grid (clamped to the grid)."""
+    i = int(np.clip(np.searchsorted(grid, x) - 1, 0, len(grid) - 2))
+    t = (x - grid[i]) / (grid[i + 1] - grid[i])
+    return i, float(np.clip(t, 0.0, 1.0))
+
+
+def _bilinear(values, i, ti, j, tj):
+    return ((1 - ti) * (1 - tj) * values[i, j] + ti * (1 - tj) * values[i + 1, j]
+            + (1 - ti) * tj * values[i, j + 1] + ti * tj * values[i + 1, j + 1])
+
+
+def interpolate_module(table, Ee, Tcell):
+    """
+    Module I-V curve at (Ee [suns], Tcell [K]) from a curve table.
+    Conditions outside the grid are clamped to its edges (flagged by "clamped").
+
+    Returns dict with "I", "V" (decreasing current, as PVmodule.Imod/Vmod), "Isc", "Pmp", "error"
+    (relative module MPP error estimate at the centre of the enclosing grid cell, not a bound) and "clamped".
+    """
+    log_ee = np.log(table["Ee"])
+    i, ti = _locate(log_ee, np.log(max(Ee, 1e-12)))
+    j, tj = _locate(table["Tcell"], Tcell)
+    clamped = not (table["Ee"][0] <= Ee <= table["Ee"][-1] and table["Tcell"][0] <= Tcell <= table["Tcell"][-1])
+
+    Isc = float(_bilinear(table["Isc_per_Ee"], i, ti, j, tj)) * Ee
+    Pmp = float(_bilinear(table["Pmp_per_Ee"], i, ti, j, tj)) * Ee
+    V = _bilinear(table["V"], i, ti, j, tj)
+    return {"I": np.flipud(table["u"] * Isc), "V": np.flipud(V), "Isc": Isc, "Pmp": Pmp,
+            "error": float(table["error"][i, j]), "clamped": clamped}
+
+
+def build_curve_table(params, ee_grid=DEFAULT_EE_GRID, tcell_grid=DEFAULT_TCELL_GRID, verbose=True):
+    """
+    Tabulate a module prototype over an (Ee, Tcell) grid.
+
+    Parameters:
+      - params (dict): cell parameters (see module_cache.CELL_DEFAULTS; Ee/Tcell are set per node)
+      - ee_grid: increasing irradiances [suns] (> 0)
+      - tcell_grid: increasing cell temperatures [K]
+
+    Returns dict of arrays: "Ee", "Tcell", "u", "V" (nEe, nT, nu), "Isc_per_Ee", "Pmp_per_Ee" (nEe, nT)
+    and "error" (nEe - 1, nT - 1), plus "params" and "key".
+    """
+    params = {k: float(v) for k, v in params.items() if k not in ("Ee", "Tcell")}
+    Ee = np.asarray(ee_grid, dtype=float)
+    Tcell = np.asarray(tcell_grid, dtype=float)
+    if len(Ee) < 2 or len(Tcell) < 2 or np.any(np.diff(Ee) <= 0) or np.any(np.diff(Tcell) <= 0) or Ee[0] <= 0:
+        raise ValueError("ee_grid and tcell_grid need >= 2 strictly increasing values (Ee > 0).")
+    u = _u_axis()
+
+    V = np.zeros((len(Ee), len(Tcell), len(u)))
+    Isc = np.zeros((len(Ee), len(Tcell)))
+    Pmp = np.zeros_like(Isc)
+    for a, ee in enumerate(Ee):
+        for b, t in enumerate(Tcell):
+            V[a, b], Isc[a, b], Pmp[a, b] = _solve_node(params, ee, t, u)
+
+    table = {"Ee": Ee, "Tcell": Tcell, "u": u, "V": V,
+             "Isc_per_Ee": Isc / Ee[:, None], "Pmp_per_Ee": Pmp / Ee[:, None],
+             "error": np.zeros((len(Ee) - 1, len(Tcell) - 1)),
+             "params": params, "key": curve_table_key(params, Ee, Tcell)}
+
+    # pvmismatch returns degenerate curves (Pmp ~ 0) at low irradiance and high temperature;
+    # cells touching such a node get no usable estimate (error = inf)
+    valid = Pmp > 1e-9 * Pmp.max()
+
+    # Error estimate per cell: interpolated vs exact module MPP at the cell centre (one point, not a bound)
+    for a in range(len(Ee) - 1):
+        for b in range(len(Tcell) - 1):
+            if not valid[a:a + 2, b:b + 2].all():
+                table["error"][a, b] = np.inf
+                continue
+            ee_c = float(np.sqrt(Ee[a] * Ee[a + 1]))
+            t_c = 0.5 * (Tcell[b] + Tcell[b + 1])
+            _, _, Pmp_exact = _solve_node(params, ee_c, t_c, u)
+            curve = interpolate_module(table, ee_c, t_c)
+            Pmp_curve = mpp_from_curve(curve["I"], curve["V"], curve["I"] * curve["V"])[0]
+            err = max(abs(curve["Pmp"] - Pmp_exact), abs(Pmp_curve - Pmp_exact))
+            table["error"][a, b] = err / Pmp_exact if Pmp_exact > 1e-9 * Pmp.max() else np.inf
+
+    if verbose:
+        print(f"[build_curve_table] {len(Ee)} x {len(Tcell)} nodes, max MPP error {np.nanmax(table['error'][np.isfinite(table['error'])]):.2e}, "
+              f"{int(np.sum(~np.isfinite(table['error'])))} cells without estimate")
+    return table
+
+
+def curve_table_key(params, ee_grid, tcell_grid):
+    """Content key of a table: cell parameters, grid, u axis, table version and pvmismatch version."""
+    h = hashlib.sha1()
+    h.update(json.dumps({"params": {k: float(params[k]) for k in sorted(params)},
+                         "version": CURVE_TABLE_VERSION, "pvmismatch": pvmismatch.__version__,
+                         "u": [U_MIN, U_MAX, U_FORWARD, U_REVERSE]}, sort_keys=True).encode())
+    h.update(np.ascontiguousarray(ee_grid, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(tcell_grid, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def save_curve_table(table, path):
+    """Write a curve table to .npz (atomic replace)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {k: v for k, v in table.items() if isinstance(v, np.ndarray)}
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez_compressed(tmp, **arrays, meta=json.dumps({"params": table["params"], "key": table["key"]}))
+    os.replace(tmp, path)
+
+
+def load_curve_table(path):
+    """Read a curve table written by save_curve_table."""
+    with np.load(path, allow_pickle=False) as data:
+        table = {k: data[k] for k in data.files if k != "meta"}
+        meta = json.loads(str(data["meta"]))
+    table.update(meta)
+    return table
+
+
+def get_curve_table(params, table_dir="results/curve_tables", ee_grid=DEFAULT_EE_GRID,
+                    tcell_grid=DEFAULT_TCELL_GRID, verbose=True):
+    """
+    Load the curve table for a module prototype from table_dir, building and saving it on first use.
+    Tables are named by their content key, so a changed prototype or grid builds a new table.
+    """
+    params = {k: float(v) for k, v in params.items() if k not in ("Ee", "Tcell")}
+    key = curve_table_key(params, np.asarray(ee_grid, dtype=float), np.asarray(tcell_grid, dtype=float))
+    path = Path(table_dir) / f"curves_{key[:16]}.npz"
+    if path.exists():
+        table = load_curve_table(path)
+        if table.get("key") == key:
+            return table
+    table = build_curve_table(params, ee_grid=ee_grid, tcell_grid=tcell_grid, verbose=verbose)
+    save_curve_table(table, path)
+    if verbose:
+        print(f"[get_curve_table] Saved {path}")
+    return table
@@ -3,7 +3,8 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from pvmismatch.pvmismatch_lib import pvcell, pvmodule, pvstring, pvsystem
+from pvmismatch.pvmismatch_lib import pvstring, pvsystem
+from case_study_data.module_cache import deg_level_params, get_module
 
 # Healthy cell characteristics
 """
@@ -13,6 +14,7 @@ Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5
 """
 
 # ========== DEGRADATION MODES ========== #
+# (factors defined once in case_study_data.module_cache.DEG_FACTORS)
 """
 # 1 = 90.0% healthy -> Rs*1.965 ; Rsh/1.965
 # 2 = 80.0% healthy -> Rs*2.980 ; Rsh/2.980
@@ -26,36 +28,17 @@ Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5
 
 def create_degraded(degradation_mode=1):
     """Create a degraded system based on cell degradation mode"""
-    if degradation_mode == 1:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*1.965, Rsh=285.79/1.965,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "10% Degraded"
-    elif degradation_mode == 2:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*2.980, Rsh=285.79/2.980,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "20% Degraded"
-    elif degradation_mode == 3:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*4.070, Rsh=285.79/4.070,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "30% Degraded"
-    elif degradation_mode == 4:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*5.300, Rsh=285.79/5.300,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "40% Degraded"
-    elif degradation_mode == 5:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*6.815, Rsh=285.79/6.815,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "50% Degraded"
-    else:
-        cell_degraded = pvcell.PVcell(Rs=0.00641575*8.970, Rsh=285.79/8.970,
-                                      Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
-        deg_label = "60% Degraded"
+    # Levels 1-5 as given, anything else falls back to the strongest level (6)
+    level = degradation_mode if degradation_mode in (1, 2, 3, 4, 5) else 6
+    module_degraded = get_module(**deg_level_params(level),
+                                 Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
+    deg_label = f"{10 * level}% Degraded"
 
     # Degraded Cell
+    cell_degraded = module_degraded.pvcells[0]
     Icell_deg, Vcell_deg, Pcell_deg = cell_degraded.Icell, cell_degraded.Vcell, cell_degraded.Pcell
 
-    # Degraded Module (72 cells)
-    module_degraded = pvmodule.PVmodule(cell_pos=pvmodule.STD72, pvcells=[cell_degraded] * 72)
+    # Degraded Module (72 cells, shared through the module cache)
     Imod_deg, Vmod_deg, Pmod_deg = module_degraded.Imod, module_degraded.Vmod, module_degraded.Pmod
 
     # Degraded string (30 mods)
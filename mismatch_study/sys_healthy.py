@@ -3,7 +3,8 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from pvmismatch.pvmismatch_lib import pvcell, pvmodule, pvstring, pvsystem
+from pvmismatch.pvmismatch_lib import pvstring, pvsystem
+from case_study_data.module_cache import get_module
 
 # Healthy cell characteristics
 """
@@ -13,13 +14,14 @@ Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5
 """
 
 def create_healthy():
+    # Healthy module (72 cells), shared through the module cache
+    module_healthy = get_module(Rs=0.00641575, Rsh=285.79,
+                                Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
+
     # Healthy cell
-    cell_healthy = pvcell.PVcell(Rs=0.00641575, Rsh=285.79,
-                                 Isc0_T0=8.69, alpha_Isc=0.00060, Isat1_T0=1.79556E-10, Isat2_T0=1.2696E-5)
+    cell_healthy = module_healthy.pvcells[0]
     Icell, Vcell, Pcell = cell_healthy.Icell, cell_healthy.Vcell, cell_healthy.Pcell
 
-    # Healthy module (72 cells)
-    module_healthy = pvmodule.PVmodule(cell_pos=pvmodule.STD72, pvcells=[cell_healthy] * 72)
     Imod, Vmod, Pmod = module_healthy.Imod, module_healthy.Vmod, module_healthy.Pmod
 
     # Healthy string (30 mods)
@@ -0,0 +1,192 @@
+# Tide Langner
+# Incremental system evaluation for single-module changes
+
+import time
+from copy import copy
+import numpy as np
+from pvmismatch.pvmismatch_lib.pvconstants import npinterpx
+from sys_mismatch_calculator import module_mpp, string_mpp, mpp_from_curve, healthy_sums, loss_metrics_batch
+
+"""
+pvmismatch recomputes a whole PVsystem on every change (PVsystem.setSuns -> update), and loss_calculator rescans
+every module and string. IncrementalSystem wraps a built system (PVsystem or CompositeSystem) and keeps:
+  - one PVstring per string position (shared objects stay shared, as in the wrapped system)
+  - each string's current on the system voltage grid, its MPP and its sum of module MPPs
+  - the system current sum Isys
+Changing a module marks its string dirty; update() recomputes only dirty string curves and applies
+Isys_new = Isys - I_old + I_new. The system grid follows PVconstants.calcParallel (min/max string voltage), so
+if a change moves those extremes every string is re-interpolated on the new grid (no string re-solve).
+Results match a full PVsystem rebuild up to float rounding of the running sum; resync() re-sums from scratch.
+"""
+
+
+class IncrementalSystem:
+    """
+    Wrapper around a built system for fast "what if this module changes" queries.
+
+    Parameters:
+      - pvsys: PVsystem or CompositeSystem (not modified; changed strings are copied as in PVsystem.setSuns)
+      - refine: MPP method for string/system MPPs, None (sampled) or "parabolic" (see refine_mpp)
+
+    Exposes Isys, Vsys, Psys, Pmp, Imp, Vmp, pvstrs, numberStrs, string_mpps and module_mpp_sums,
+    plus counters in stats ("string_solves", "incremental_updates", "grid_rebuilds").
+    """
+
+    def __init__(self, pvsys, refine=None):
+        self.pvstrs = list(pvsys.pvstrs)
+        self.pvconst = pvsys.pvconst
+        self.numberStrs = len(self.pvstrs)
+        self.refine = refine
+        self.stats = {"string_solves": 0, "incremental_updates": 0, "grid_rebuilds": 0}
+        self.resync()
+
+    # --- String bookkeeping ---
+    def _string_state(self, pvstr):
+        """(V_min, V_max, Pmp_string, sum of module MPPs) of one string."""
+        Vstring = pvstr.Vstring
+        Pmp = string_mpp(pvstr, self.refine)
+        Pmods = sum(module_mpp(m, self.refine) for m in pvstr.pvmods)
+        return float(Vstring.min()), float(Vstring.max()), Pmp, Pmods
+
+    def _grid(self, V_min, V_max):
+        return np.concatenate((V_min * self.pvconst.negpts, V_max * self.pvconst.pts), axis=0).flatten()
+
+    def _current(self, pvstr, Vsys):
+        return npinterpx(Vsys, pvstr.Vstring.flatten(), pvstr.Istring.flatten())
+
+    def resync(self):
+        """Full evaluation: all string states, a fresh grid and the exact Isys sum (as PVsystem.calcSystem)."""
+        self._V_min, self._V_max = np.zeros(self.numberStrs), np.zeros(self.numberStrs)
+        self._Pstr, self._Pmods = np.zeros(self.numberStrs), np.zeros(self.numberStrs)
+        for s, pvstr in enumerate(self.pvstrs):
+            self._V_min[s], self._V_max[s], self._Pstr[s], self._Pmods[s] = self._string_state(pvstr)
+        self._dirty = set()
+        self._rebuild_grid()
+
+    def _rebuild_grid(self):
+        """Interpolate every string on the grid of the current extremes (distinct strings once) and re-sum."""
+        self.Vsys = self._grid(self._V_min.min(), self._V_max.max())
+        by_id = {}
+        self._Istr = []
+        for pvstr in self.pvstrs:
+            if id(pvstr) not in by_id:
+                by_id[id(pvstr)] = self._current(pvstr, self.Vsys)
+            self._Istr.append(by_id[id(pvstr)])
+        self.Isys = np.zeros(2 * self.pvconst.npts)
+        for I in self._Istr:
+            self.Isys += I
+        self.stats["grid_rebuilds"] += 1
+        self._update_mpp()
+
+    def _update_mpp(self):
+        self.Psys = self.Isys * self.Vsys
+        self.Pmp, self.Imp, self.Vmp = mpp_from_curve(self.Isys, self.Vsys, self.Psys, refine=self.refine)
+
+    # --- Changes ---
+    def set_module(self, string, module, pvmod):
+        """Replace one module (PVmodule, same pvconst) in a string; the string is re-solved, the system deferred."""
+        if pvmod.pvconst is not self.pvconst:
+            raise Exception('pvconst must be the same for all modules')
+        pvstr = copy(self.pvstrs[string])
+        pvstr.pvmods = copy(pvstr.pvmods)
+        pvstr.pvmods[module] = pvmod
+        pvstr.Istring, pvstr.Vstring, pvstr.Pstring = pvstr.calcString()
+        self._replace_string(string, pvstr)
+        return self
+
+    def set_suns(self, Ee):
+        """
+        Set irradiance on modules, same dict format as PVsystem.setSuns (e.g. {0: {10: 0.1}} = string 0,
+        module 10 at 0.1 suns; {3: 0.5} = whole string 3). Only the addressed strings are re-solved.
+        """
+        if np.isscalar(Ee):
+            Ee = {s: Ee for s in range(self.numberStrs)}
+        for string, pvmod_Ee in Ee.items():
+            string = int(string)
+            pvstr = copy(self.pvstrs[string])
+            if np.isscalar(pvmod_Ee):
+                # PVstring.setSuns' scalar branch is Python 2 only; address every module instead
+                pvmod_Ee = {m: pvmod_Ee for m in range(len(pvstr.pvmods))}
+            pvstr.setSuns(pvmod_Ee)
+            self._replace_string(string, pvstr)
+        return self
+
+    def _replace_string(self, string, pvstr):
+        self.pvstrs[string] = pvstr
+        self._dirty.add(string)
+        self.stats["string_solves"] += 1
+
+    def update(self):
+        """Apply pending changes: dirty strings only, unless the system voltage grid moves."""
+        if not self._dirty:
+            return self
+        for s in self._dirty:
+            self._V_min[s], self._V_max[s], self._Pstr[s], self._Pmods[s] = self._string_state(self.pvstrs[s])
+        Vsys = self._grid(self._V_min.min(), self._V_max.max())
+        if not np.array_equal(Vsys, self.Vsys):
+            self._dirty = set()
+            self._rebuild_grid()
+            return self
+        for s in self._dirty:
+            I_new = self._current(self.pvstrs[s], self.Vsys)
+            self.Isys = self.Isys - self._Istr[s] + I_new
+            self._Istr[s] = I_new
+            self.stats["incremental_updates"] += 1
+        self._dirty = set()
+        self._update_mpp()
+        return self
+
+    # --- Queries ---
+    def what_if(self, string, module, pvmod=None, Ee=None):
+        """
+        System MPP if one module were replaced by pvmod or set to irradiance Ee (suns, or a PVmodule.setSuns
+        argument), without applying the change.
+
+        Returns dict with "Pmp", "delta_W" (vs current Pmp), "string_Pmp", "string_Pmp_before" and "elapsed_s".
+        """
+        if (pvmod is None) == (Ee is None):
+            raise ValueError("Give either pvmod or Ee.")
+        start = time.time()
+        self.update()
+        pvstr = copy(self.pvstrs[string])
+        if pvmod is not None:
+            pvstr.pvmods = copy(pvstr.pvmods)
+            pvstr.pvmods[module] = pvmod
+            pvstr.Istring, pvstr.Vstring, pvstr.Pstring = pvstr.calcString()
+        else:
+            pvstr.setSuns({module: Ee})
+        V_min, V_max, Pstr, _ = self._string_state(pvstr)
+
+        V_lo = min(V_min, np.delete(self._V_min, string).min(initial=np.inf))
+        V_hi = max(V_max, np.delete(self._V_max, string).max(initial=-np.inf))
+        Vsys = self._grid(V_lo, V_hi)
+        if np.array_equal(Vsys, self.Vsys):
+            Isys = self.Isys - self._Istr[string] + self._current(pvstr, Vsys)
+        else:
+            Isys = self._current(pvstr, Vsys)
+            for s, other in enumerate(self.pvstrs):
+                if s != string:
+                    Isys = Isys + self._current(other, Vsys)
+        Pmp = mpp_from_curve(Isys, Vsys, Isys * Vsys, refine=self.refine)[0]
+        return {"Pmp": Pmp, "delta_W": Pmp - self.Pmp, "string_Pmp": Pstr,
+                "string_Pmp_before": float(self._Pstr[string]), "elapsed_s": time.time() - start}
+
+    @property
+    def string_mpps(self):
+        """Per-string MPPs in system order."""
+        self.update()
+        return self._Pstr.copy()
+
+    @property
+    def module_mpp_sums(self):
+        """Per-string sums of module MPPs in system order."""
+        self.update()
+        return self._Pmods.copy()
+
+    def metrics(self, pvsys_healthy=None, num_strs_affected=150):
+        """loss_calculator metrics of the current state from the maintained sums (no module/string rescan)."""
+        self.update()
+        healthy = healthy_sums(pvsys_healthy, self.refine) if pvsys_healthy is not None else (None, None, None)
+        report = loss_metrics_batch(self.Pmp, self._Pmods.sum(), self._Pstr.sum(), *healthy,
+                                    num_strs_affected=num_strs_affected)
+        return {key: None if value is None else float(value) for key, value in report.items()}
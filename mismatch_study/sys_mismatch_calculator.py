@@ -1,61 +1,248 @@
 # Tide Langner
 # Calculate mismatch components
 
+import hashlib
+from collections import OrderedDict
 import numpy as np
 
 # --- MPP from sampled I-V-P arrays
-def mpp_from_curve(I, V, P):
-    """Return (Pmp, Imp, Vmp) from sampled I-V-P arrays"""
-    k = np.argmax(P)
-    return float(P[k]), float(I[k]), float(V[k])
+MPP_REFINE_METHODS = (None, "parabolic")
 
+def refine_mpp(I, V, P=None, method="parabolic"):
+    """
+    Sub-sample MPP of sampled curves, vectorized over leading axes.
+
+    Parameters:
+      - I, V, P: (..., points) arrays (V may be a shared (points,) axis; P defaults to I * V)
+      - method: "parabolic" - vertex of the parabola P(V) through the sampled maximum and its two
+        neighbours (works on non-uniform voltage spacing)
+
+    Returns (Pmp, Imp, Vmp) arrays of shape (...). Imp is read from the linear I-V segment containing Vmp.
+    Maxima at a curve end (or non-concave neighbourhoods) keep the sampled point.
+    """
+    if method not in MPP_REFINE_METHODS[1:]:
+        raise ValueError(f"Invalid MPP refine method '{method}'. Must be one of {MPP_REFINE_METHODS[1:]}.")
+
+    I = np.asarray(I, dtype=float)
+    V = np.broadcast_to(np.asarray(V, dtype=float), I.shape)
+    P = I * V if P is None else np.broadcast_to(np.asarray(P, dtype=float), I.shape)
+    n = I.shape[-1]
+
+    k = np.argmax(P, axis=-1)
+    interior = (k > 0) & (k < n - 1)
+    km, kp = np.clip(k - 1, 0, n - 1), np.clip(k + 1, 0, n - 1)
+
+    def take(a, idx):
+        return np.take_along_axis(a, idx[..., None], axis=-1)[..., 0]
+
+    V0, V1, V2 = take(V, km), take(V, k), take(V, kp)
+    I0, I1, I2 = take(I, km), take(I, k), take(I, kp)
+    P0, P1, P2 = take(P, km), take(P, k), take(P, kp)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Newton form P(V) = P0 + d1 (V - V0) + a (V - V0)(V - V1)
+        d1 = (P1 - P0) / (V1 - V0)
+        d2 = (P2 - P1) / (V2 - V1)
+        a = (d2 - d1) / (V2 - V0)
+        Vx = (V0 + V1) / 2.0 - d1 / (2.0 * a)
+        Vx = np.clip(Vx, np.minimum(V0, V2), np.maximum(V0, V2))
+        Px = P0 + d1 * (Vx - V0) + a * (Vx - V0) * (Vx - V1)
+        # Current on the linear I-V segment containing Vx
+        on_left = (Vx - V1) * (V0 - V1) >= 0
+        Va, Ia = np.where(on_left, V0, V2), np.where(on_left, I0, I2)
+        Ix = I1 + (Ia - I1) * (Vx - V1) / (Va - V1)
+
+    ok = interior & (a < 0) & np.isfinite(Px) & np.isfinite(Ix) & (Px >= P1)
+    return np.where(ok, Px, P1), np.where(ok, Ix, I1), np.where(ok, Vx, V1)
 
-# --- Cached MPP helpers (avoid recomputing argmax on immutable curves) ---
-def _mpp_cached(obj, I_attr: str, V_attr: str, P_attr: str, cache_attr: str):
+def mpp_from_curve(I, V, P, refine=None):
     """
-    Compute and cache MPP on 'obj' the first time; reuse afterwards.
-    Assumes the curve arrays are immutable for the lifetime of 'obj'.
+    Return (Pmp, Imp, Vmp) from sampled I-V-P arrays.
+    refine=None takes the sampled maximum; "parabolic" refines between samples (see refine_mpp).
     """
-    if hasattr(obj, cache_attr):
-        return getattr(obj, cache_attr)
+    if refine is None:
+        k = np.argmax(P)
+        return float(P[k]), float(I[k]), float(V[k])
+    Pmp, Imp, Vmp = refine_mpp(np.ravel(I), np.ravel(V), np.ravel(P), method=refine)
+    return float(Pmp), float(Imp), float(Vmp)
+
+
+# --- MPP cache (content-keyed, bounded) ---
+class MPPCache:
+    """
+    Bounded LRU cache of curve MPPs keyed by a content fingerprint of the curve arrays (and refine method).
+
+    Equal curves on different objects (e.g. equal-parameter modules) share one entry. Each object's
+    fingerprint is remembered together with the arrays it was computed from; pvmismatch replaces Imod/Istring/
+    Isys arrays on setSuns/setTemps/update, so a changed object is re-fingerprinted instead of returning a
+    stale MPP. Curve arrays must not be modified in place.
+
+    Parameters:
+      - max_entries: maximum number of cached MPPs (and of tracked objects); least recently used are evicted
+
+    Exposes stats (hits, misses, evictions, entries, hit_rate), clear() and invalidate(obj).
+    """
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = int(max_entries)
+        self._values = OrderedDict()   # (fingerprint, refine) -> Pmp
+        self._objects = OrderedDict()  # id(obj) -> (arrays, fingerprint)
+        self._sums = OrderedDict()     # (id(pvsys), refine) -> (strings, counts, Pmods, Pstrs)
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def fingerprint(*arrays):
+        h = hashlib.blake2b(digest_size=16)
+        for a in arrays:
+            a = np.ascontiguousarray(a)
+            h.update(f"{a.dtype.str}{a.shape}".encode())
+            h.update(a.tobytes())
+        return h.hexdigest()
+
+    def _trim(self, table, count=True):
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+            if count:
+                self.evictions += 1
 
-    I = getattr(obj, I_attr)
-    V = getattr(obj, V_attr)
-    P = getattr(obj, P_attr)
-    Pmp, Imp, Vmp = mpp_from_curve(I, V, P)
-    setattr(obj, cache_attr, Pmp)  # cache only what we need for sums
-    return Pmp
+    def _object_fingerprint(self, obj, I, V):
+        entry = self._objects.get(id(obj))
+        if entry is not None and entry[0][0] is I and entry[0][1] is V:
+            self._objects.move_to_end(id(obj))
+            return entry[1]
+        fp = self.fingerprint(I, V)
+        # Keep the arrays referenced so their identity stays a valid "unchanged" check
+        self._objects[id(obj)] = ((I, V), fp)
+        self._trim(self._objects, count=False)
+        return fp
 
-def sum_module_mpps(pvsys):
+    def mpp(self, obj, I_attr, V_attr, P_attr, refine=None):
+        """MPP of the curve stored on obj (e.g. "Imod", "Vmod", "Pmod"), computed once per distinct curve."""
+        I, V = getattr(obj, I_attr), getattr(obj, V_attr)
+        key = (self._object_fingerprint(obj, I, V), refine)
+        Pmp = self._values.get(key)
+        if Pmp is not None:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return Pmp
+        self.misses += 1
+        Pmp = mpp_from_curve(I, V, getattr(obj, P_attr), refine=refine)[0]
+        self._values[key] = Pmp
+        self._trim(self._values)
+        return Pmp
+
+    def system_sums(self, pvsys, refine=None):
+        """(sum of module MPPs, sum of string MPPs) of a system, reused while its strings are unchanged."""
+        pairs = _string_multiplicities(pvsys)
+        strings = tuple(s.Istring for s, _ in pairs)
+        counts = tuple(c for _, c in pairs)
+        key = (id(pvsys), refine)
+        entry = self._sums.get(key)
+        if (entry is not None and entry[1] == counts and len(entry[0]) == len(strings)
+                and all(a is b for a, b in zip(entry[0], strings))):
+            self._sums.move_to_end(key)
+            return entry[2], entry[3]
+        Pmods, Pstrs = sum_module_mpps(pvsys, refine, cache=self), sum_string_mpps(pvsys, refine, cache=self)
+        self._sums[key] = (strings, counts, Pmods, Pstrs)
+        self._trim(self._sums, count=False)
+        return Pmods, Pstrs
+
+    def invalidate(self, obj):
+        """Forget the fingerprint (and system sums) remembered for obj."""
+        self._objects.pop(id(obj), None)
+        for key in [k for k in self._sums if k[0] == id(obj)]:
+            del self._sums[key]
+
+    def clear(self):
+        self._values.clear()
+        self._objects.clear()
+        self._sums.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._values), "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# Shared cache used by the helpers below (one per process)
+MPP_CACHE = MPPCache()
+
+def _string_multiplicities(pvsys):
+    """(string, count) pairs: a CompositeSystem stores counts, a PVsystem lists every string once."""
+    if hasattr(pvsys, "string_counts"):
+        return pvsys.string_counts
+    return [(s, 1) for s in pvsys.pvstrs]
+
+def module_mpp(pvmod, refine=None, cache=None):
+    return (cache or MPP_CACHE).mpp(pvmod, "Imod", "Vmod", "Pmod", refine)
+
+def string_mpp(pvstr, refine=None, cache=None):
+    return (cache or MPP_CACHE).mpp(pvstr, "Istring", "Vstring", "Pstring", refine)
+
+def sum_module_mpps(pvsys, refine=None, cache=None):
     total = 0.0
-    for s in pvsys.pvstrs:
+    for s, count in _string_multiplicities(pvsys):
         for m in s.pvmods:
-            # Cache per-module MPP as _Pmp_mod
-            Pmp = _mpp_cached(m, "Imod", "Vmod", "Pmod", "_Pmp_mod")
-            total += Pmp
+            total += count * module_mpp(m, refine, cache)
     return total
 
-def sum_string_mpps(pvsys):
+def sum_string_mpps(pvsys, refine=None, cache=None):
     total = 0.0
-    for s in pvsys.pvstrs:
-        # Cache per-string MPP as _Pmp_str
-        Pmp = _mpp_cached(s, "Istring", "Vstring", "Pstring", "_Pmp_str")
-        total += Pmp
+    for s, count in _string_multiplicities(pvsys):
+        total += count * string_mpp(s, refine, cache)
     return total
 
-def system_mpp(pvsys):
-    # Cache system MPP as _Pmp_sys
-    return _mpp_cached(pvsys, "Isys", "Vsys", "Psys", "_Pmp_sys")
+def system_mpp(pvsys, refine=None, cache=None):
+    return (cache or MPP_CACHE).mpp(pvsys, "Isys", "Vsys", "Psys", refine)
+
+
+def healthy_sums(pvsys_healthy, refine=None, cache=None):
+    """
+    Return (Pmods_healthy, Pstrs_healthy, Psys_healthy) for a reference system.
+    Sums are kept in the MPP cache and reused across many calls while the system is unchanged.
+    """
+    cache = cache or MPP_CACHE
+    Pmods_healthy, Pstrs_healthy = cache.system_sums(pvsys_healthy, refine)
+    Psys_healthy = system_mpp(pvsys_healthy, refine, cache)
+    return Pmods_healthy, Pstrs_healthy, Psys_healthy
+
+def string_mpp_table(pv_strings, refine=None):
+    """
+    Per-string MPPs and per-string sums of module MPPs for a list of PVstring objects.
+    Returns (Pmp_str, sum_mods_mpp) as arrays, e.g. for counts @ Pmp_str in batched sweeps.
+    """
+    Pmp_str, sum_mods_mpp = [], []
+    for s in pv_strings:
+        Pmp_str.append(string_mpp(s, refine))
+        total = 0.0
+        for m in s.pvmods:
+            total += module_mpp(m, refine)
+        sum_mods_mpp.append(total)
+    return np.asarray(Pmp_str, dtype=float), np.asarray(sum_mods_mpp, dtype=float)
 
 
 # --- Loss calculator ---
-def loss_calculator(pvsys, pvsys_healthy=None, num_strs_affected=150):
+# Losses below this fraction of the healthy output are float noise (e.g. a healthy system rebuilt along another
+# path) and are treated as exactly zero, so loss ratios are not divided by ~1e-9 W
+LOSS_RTOL = 1e-9
+
+def snap_loss(loss, reference, rtol=LOSS_RTOL):
+    """loss with values within rtol * |reference| of zero set to 0 (scalar or array)."""
+    loss = np.asarray(loss, dtype=float)
+    snapped = np.where(np.abs(loss) <= rtol * np.abs(np.asarray(reference, dtype=float)), 0.0, loss)
+    return float(snapped) if snapped.ndim == 0 else snapped
+
+def loss_calculator(pvsys, pvsys_healthy=None, num_strs_affected=150, refine=None):
     """
     Calculates:
       - total losses (vs healthy)
       - degradation-only losses
       - mismatch losses (modules->strings, strings->system, total mismatch)
       - module/string/system outputs (degraded and healthy)
+
+    refine: None (sampled MPPs) or "parabolic" sub-sample MPPs (see refine_mpp)
     """
 
     # Healthy system
@@ -63,29 +250,12 @@ def loss_calculator(pvsys, pvsys_healthy=None, num_strs_affected=150):
     Pstrs_healthy = None
     Psys_healthy = None
     if pvsys_healthy is not None:
-        # Cache healthy sums at the system level to reuse across many calls
-        if hasattr(pvsys_healthy, "_sum_Pmods_mpp"):
-            Pmods_healthy = pvsys_healthy._sum_Pmods_mpp
-        else:
-            Pmods_healthy = sum_module_mpps(pvsys_healthy)
-            setattr(pvsys_healthy, "_sum_Pmods_mpp", Pmods_healthy)
-
-        if hasattr(pvsys_healthy, "_sum_Pstrs_mpp"):
-            Pstrs_healthy = pvsys_healthy._sum_Pstrs_mpp
-        else:
-            Pstrs_healthy = sum_string_mpps(pvsys_healthy)
-            setattr(pvsys_healthy, "_sum_Pstrs_mpp", Pstrs_healthy)
-
-        if hasattr(pvsys_healthy, "_Pmp_sys"):
-            Psys_healthy = pvsys_healthy._Pmp_sys
-        else:
-            Psys_healthy = system_mpp(pvsys_healthy)
-            # system_mpp will cache as _Pmp_sys
+        Pmods_healthy, Pstrs_healthy, Psys_healthy = healthy_sums(pvsys_healthy, refine)
 
     # Mismatched system
-    Pmods_actual = sum_module_mpps(pvsys)
-    Pstrs_actual = sum_string_mpps(pvsys)
-    Psys_actual = system_mpp(pvsys)
+    Pmods_actual = sum_module_mpps(pvsys, refine)
+    Pstrs_actual = sum_string_mpps(pvsys, refine)
+    Psys_actual = system_mpp(pvsys, refine)
 
     # Mismatch losses for mismatched system
     mismatch_mods_to_strs = Pmods_actual - Pstrs_actual
@@ -101,9 +271,9 @@ def loss_calculator(pvsys, pvsys_healthy=None, num_strs_affected=150):
     percent_degradation = 0.0
     if pvsys_healthy is not None:
         # (degradation + mismatch) losses
-        loss_mods = Pmods_healthy - Pmods_actual
-        loss_strs = Pstrs_healthy - Pstrs_actual
-        loss_sys = Psys_healthy - Psys_actual
+        loss_mods = snap_loss(Pmods_healthy - Pmods_actual, Pmods_healthy)
+        loss_strs = snap_loss(Pstrs_healthy - Pstrs_actual, Pstrs_healthy)
+        loss_sys = snap_loss(Psys_healthy - Psys_actual, Psys_healthy)
 
         if loss_sys != 0:
             # (degradation-only) loss (constant for all levels)
@@ -153,3 +323,121 @@ def loss_calculator(pvsys, pvsys_healthy=None, num_strs_affected=150):
         "percent_mismatch_strs_norm_vs_loss": percent_mismatch_strs_norm_vs_loss,
     }
 
+
+
+# --- Batched loss calculator ---
+def loss_metrics_batch(Psys_actual, Pmods_actual, Pstrs_actual,
+                       Pmods_healthy=None, Pstrs_healthy=None, Psys_healthy=None, num_strs_affected=150):
+    """
+    Array form of loss_calculator for precomputed MPPs.
+
+    Inputs are arrays of degraded outputs (any shape, broadcast together) and scalar healthy baselines.
+    num_strs_affected may be a scalar or an array broadcastable to the output shape.
+    Returns a dict with the same 22 keys as loss_calculator, each an array of the common shape
+    (healthy keys are None if no baselines are given, as in loss_calculator).
+    Percentages are zero wherever the system loss (or the denominator) is zero.
+    """
+    Psys_actual, Pmods_actual, Pstrs_actual = np.broadcast_arrays(
+        np.asarray(Psys_actual, dtype=float), np.asarray(Pmods_actual, dtype=float),
+        np.asarray(Pstrs_actual, dtype=float))
+    shape = Psys_actual.shape
+
+    # Mismatch losses for mismatched systems
+    mismatch_mods_to_strs = Pmods_actual - Pstrs_actual
+    mismatch_strs_to_sys = Pstrs_actual - Psys_actual
+    mismatch_total = mismatch_mods_to_strs + mismatch_strs_to_sys
+
+    report = {
+        "module_MPPs_sum_degraded": Pmods_actual,
+        "module_MPPs_sum_healthy": None,
+        "string_MPPs_sum_degraded": Pstrs_actual,
+        "string_MPPs_sum_healthy": None,
+        "system_MPP_degraded": Psys_actual,
+        "system_MPP_healthy": None,
+        "mismatch_modules_to_strings": mismatch_mods_to_strs,
+        "mismatch_strings_to_system": mismatch_strs_to_sys,
+        "mismatch_total": mismatch_total,
+    }
+    zero_keys = ("total_module_loss", "total_string_loss", "total_system_loss", "degradation_only",
+                 "percent_loss", "percent_degradation_to_loss", "percent_mismatch_to_loss",
+                 "percent_degradation", "percent_mismatch_total", "percent_mismatch_strs_to_sys",
+                 "percent_mismatch_mods_to_strs", "percent_mismatch_strs_norm",
+                 "percent_mismatch_strs_norm_vs_loss")
+    if Psys_healthy is None:
+        report.update({key: np.zeros(shape) for key in zero_keys})
+        return report
+
+    # Losses healthy vs mismatched systems
+    loss_mods = np.broadcast_to(snap_loss(Pmods_healthy - Pmods_actual, Pmods_healthy), shape)
+    loss_strs = np.broadcast_to(snap_loss(Pstrs_healthy - Pstrs_actual, Pstrs_healthy), shape)
+    loss_sys = np.broadcast_to(snap_loss(Psys_healthy - Psys_actual, Psys_healthy), shape)
+    loss_degradation = loss_sys - mismatch_total
+    num_strs = np.asarray(num_strs_affected, dtype=float)
+
+    # Percentages only where losses exist (matches the scalar loss_calculator; noise-level losses are 0, see snap_loss)
+    valid = (loss_sys != 0) & (Psys_healthy != 0)
+
+    def pct(num, den, scale_first=True):
+        num = np.broadcast_to(num, shape)
+        den = np.broadcast_to(den, shape)
+        out = np.zeros(shape, dtype=float)
+        mask = valid & (den != 0) & np.isfinite(den)
+        if scale_first:
+            np.divide(100.0 * num, den, out=out, where=mask)
+        else:
+            np.divide(num, den, out=out, where=mask)
+            out *= 100.0
+        return out
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_loss = np.where(valid, 100.0 * (1 - Psys_actual / Psys_healthy), 0.0)
+        Pstrs_healthy_norm = Pstrs_healthy / num_strs
+        loss_strs_norm = loss_strs / num_strs
+
+    report.update({
+        "module_MPPs_sum_healthy": np.full(shape, Pmods_healthy, dtype=float),
+        "string_MPPs_sum_healthy": np.full(shape, Pstrs_healthy, dtype=float),
+        "system_MPP_healthy": np.full(shape, Psys_healthy, dtype=float),
+        "total_module_loss": loss_mods,
+        "total_string_loss": loss_strs,
+        "total_system_loss": loss_sys,
+        "degradation_only": np.where(valid, loss_degradation, 0.0),
+        "percent_loss": percent_loss,
+        "percent_degradation_to_loss": pct(loss_degradation, loss_sys),
+        "percent_mismatch_to_loss": pct(mismatch_total, loss_sys),
+        "percent_degradation": pct(loss_degradation, Psys_healthy),
+        "percent_mismatch_total": pct(mismatch_total, Psys_healthy),
+        "percent_mismatch_strs_to_sys": pct(mismatch_strs_to_sys, Psys_healthy),
+        "percent_mismatch_mods_to_strs": pct(mismatch_mods_to_strs, Psys_healthy),
+        "percent_mismatch_strs_norm": pct(mismatch_mods_to_strs, Pstrs_healthy_norm),
+        "percent_mismatch_strs_norm_vs_loss": pct(mismatch_mods_to_strs, loss_strs_norm, scale_first=False),
+    })
+    return report
+
+def loss_calculator_batch(Isys, Vsys, Pmods_actual, Pstrs_actual,
+                          Pmods_healthy=None, Pstrs_healthy=None, Psys_healthy=None, num_strs_affected=150,
+                          refine=None):
+    """
+    Batched loss_calculator over a stack of systems.
+
+    Parameters:
+      - Isys: (..., points) system currents
+      - Vsys: (..., points) or (points,) system voltages
+      - Pmods_actual, Pstrs_actual: (...) sums of module / string MPPs per system
+      - Pmods_healthy, Pstrs_healthy, Psys_healthy: healthy baselines (see healthy_sums)
+      - num_strs_affected: scalar or (...) array used to normalise the module->string mismatch
+
+      - refine: None (sampled maximum, as mpp_from_curve) or "parabolic" (see refine_mpp);
+        MPP inputs and baselines should use the same setting
+
+    Returns a dict of arrays with the same 22 keys as loss_calculator.
+    """
+    Isys = np.asarray(Isys, dtype=float)
+    Psys = Isys * np.asarray(Vsys, dtype=float)
+    if refine is None:
+        idx = np.argmax(Psys, axis=-1)
+        Psys_actual = np.take_along_axis(Psys, idx[..., None], axis=-1)[..., 0]
+    else:
+        Psys_actual, _, _ = refine_mpp(Isys, Vsys, Psys, method=refine)
+    return loss_metrics_batch(Psys_actual, Pmods_actual, Pstrs_actual,
+                              Pmods_healthy, Pstrs_healthy, Psys_healthy, num_strs_affected)
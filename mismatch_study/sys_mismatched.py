@@ -1,16 +1,255 @@
 # Tide Langner
 # Mismatch System Builder
 
+from collections import Counter
 import numpy as np
 from pvmismatch.pvmismatch_lib import pvstring, pvsystem
+from pvmismatch.pvmismatch_lib.pvconstants import npinterpx
+
+
+# --- Count-based system ---
+class CompositeSystem:
+    """
+    Parallel PV system stored as a multiset of string signatures.
+
+    A signature is a tuple of module prototype IDs (e.g. ("D", "D", "H", ...)), one per module in the string.
+    Only one PVstring is built per distinct signature; the system I-V curve and loss metrics weight each
+    distinct string by its multiplicity, so 150 strings with 2 distinct compositions cost 2 string solves.
+
+    Parameters:
+      - prototypes (dict): {prototype_id: PVmodule}
+      - signatures: either a mapping {signature: count}, or a sequence with one signature per string
+        position (the per-position layout is kept for pvstrs/print_system)
+      - string_cache (dict, optional): {signature: PVstring} shared between systems built from the same
+        prototypes; distinct strings are taken from / added to it instead of being solved again
+
+    Exposes the PVsystem attributes used in this study: Isys, Vsys, Psys, Imp, Vmp, Pmp, Isc, Voc, FF, eff,
+    numberStrs, numberMods, pvstrs (expanded by reference), plus string_counts [(PVstring, count), ...].
+    """
+
+    def __init__(self, prototypes, signatures, string_cache=None):
+        if hasattr(signatures, "items"):
+            counts = Counter({tuple(sig): int(c) for sig, c in signatures.items() if int(c) > 0})
+            layout = None
+        else:
+            layout = [tuple(sig) for sig in signatures]
+            counts = Counter(layout)
+        if not counts:
+            raise ValueError("CompositeSystem needs at least one string.")
+
+        self.prototypes = dict(prototypes)
+        self.signatures = list(counts.keys())
+        self.counts = np.array([counts[sig] for sig in self.signatures], dtype=int)
+        self._layout = layout
+
+        self.strings = {}
+        for sig in self.signatures:
+            missing = set(sig) - set(self.prototypes)
+            if missing:
+                raise ValueError(f"Unknown module prototype ID(s) in signature: {sorted(missing)}")
+            pvstr = string_cache.get(sig) if string_cache is not None else None
+            if pvstr is None:
+                pvstr = pvstring.PVstring(pvmods=[self.prototypes[m] for m in sig])
+                if string_cache is not None:
+                    string_cache[sig] = pvstr
+            self.strings[sig] = pvstr
+
+        self.pvconst = self.strings[self.signatures[0]].pvconst
+        for pvstr in self.strings.values():
+            if pvstr.pvconst is not self.pvconst:
+                raise Exception('pvconst must be the same for all strings')
+
+        self.numberStrs = int(self.counts.sum())
+        self.update()
+
+    @property
+    def string_counts(self):
+        """Distinct strings with their multiplicities."""
+        return [(self.strings[sig], int(c)) for sig, c in zip(self.signatures, self.counts)]
+
+    @property
+    def pvstrs(self):
+        """All strings in system order (references to the shared distinct PVstring objects)."""
+        if self._layout is not None:
+            return [self.strings[sig] for sig in self._layout]
+        return [self.strings[sig] for sig, c in zip(self.signatures, self.counts) for _ in range(c)]
+
+    @property
+    def numberMods(self):
+        return [len(pvstr.pvmods) for pvstr in self.pvstrs]
+
+    def update(self):
+        """Update system calculations."""
+        self.Isys, self.Vsys, self.Psys = self.calcSystem()
+        (self.Imp, self.Vmp, self.Pmp,
+         self.Isc, self.Voc, self.FF, self.eff) = self.calcMPP_IscVocFFeff()
+
+    def calcSystem(self):
+        """
+        Weighted form of PVconstants.calcParallel over the distinct strings.
+        Returns (Isys, Vsys, Psys)
+        """
+        Isys, Vsys = parallel_curves(self.counts[None, :], [self.strings[sig] for sig in self.signatures])
+        Isys, Vsys = Isys[0], Vsys[0]
+        return Isys, Vsys, Isys * Vsys
+
+    def calcMPP_IscVocFFeff(self):
+        """Same MPP interpolation as PVsystem.calcMPP_IscVocFFeff (efficiency weighted by multiplicity)."""
+        mpp = np.argmax(self.Psys)
+        P = self.Psys[mpp - 1:mpp + 2]
+        V = self.Vsys[mpp - 1:mpp + 2]
+        I = self.Isys[mpp - 1:mpp + 2]
+        Pv = np.diff(P, axis=0) / np.diff(V, axis=0)
+        Vmid = (V[1:] + V[:-1]) / 2.0
+        Imid = (I[1:] + I[:-1]) / 2.0
+        Vmp = (-Pv[0] * np.diff(Vmid, axis=0) / np.diff(Pv, axis=0) + Vmid[0]).item()
+        Imp = (-Pv[0] * np.diff(Imid, axis=0) / np.diff(Pv, axis=0) + Imid[0]).item()
+        Pmp = Imp * Vmp
+        Voc = np.interp(np.float64(0), np.flipud(self.Isys), np.flipud(self.Vsys))
+        Isc = np.interp(np.float64(0), self.Vsys, self.Isys)
+        FF = Pmp / Isc / Voc
+        # Irradiated area per distinct module object (strings repeat the same prototypes)
+        mod_suns = {}
+        for pvstr in self.strings.values():
+            for pvmod in pvstr.pvmods:
+                if id(pvmod) not in mod_suns:
+                    mod_suns[id(pvmod)] = pvmod.Ee.sum() * pvmod.cellArea
+        totalSuns = sum(c * sum(mod_suns[id(pvmod)] for pvmod in pvstr.pvmods)
+                        for pvstr, c in self.string_counts)
+        Psun = self.pvconst.E0 * totalSuns / 100 / 100
+        eff = Pmp / Psun
+        return Imp, Vmp, Pmp, Isc, Voc, FF, eff
+
+
+def parallel_curves(counts, pv_strings):
+    """
+    System I-V curves for a batch of parallel combinations of the same string prototypes.
+
+    Follows PVconstants.calcParallel (voltage grid from the min/max string voltage of the strings present),
+    with each string curve weighted by its count instead of being repeated.
+
+    Parameters:
+      - counts: (B, S) number of strings of each prototype in each of B systems
+      - pv_strings: S PVstring prototypes (sharing one pvconst)
+
+    Returns (Isys, Vsys), both (B, 2 * npts)
+    """
+    counts = np.atleast_2d(np.asarray(counts))
+    pvconst = pv_strings[0].pvconst
+    V_str = [pvstr.Vstring.flatten() for pvstr in pv_strings]
+    I_str = [pvstr.Istring.flatten() for pvstr in pv_strings]
+    V_max = np.array([v.max() for v in V_str])
+    V_min = np.array([v.min() for v in V_str])
+
+    Isys = np.zeros((counts.shape[0], 2 * pvconst.npts))
+    Vsys = np.zeros_like(Isys)
+    for b, row in enumerate(counts):
+        present = np.flatnonzero(row)
+        Vtot = np.concatenate((V_min[present].min() * pvconst.negpts,
+                               V_max[present].max() * pvconst.pts), axis=0).flatten()
+        for j in present:
+            Isys[b] += row[j] * npinterpx(Vtot, V_str[j], I_str[j])
+        Vsys[b] = Vtot
+    return Isys, Vsys
+
+
+# --- Series combination kernel ---
+def _module_arrays(module):
+    """(I, V, Isc) of a PVmodule or of a module curve dict {"I", "V", "Isc"} (see sys_timeseries.curve_from_module)."""
+    if hasattr(module, "Imod"):
+        return module.Imod.flatten(), module.Vmod.flatten(), float(module.Isc.mean())
+    return np.ravel(module["I"]), np.ravel(module["V"]), float(module["Isc"])
+
+
+def series_curves(counts, modules, pvconst=None, clip_bypass=False):
+    """
+    String I-V curves for a batch of series combinations of the same module types.
+
+    Follows PVconstants.calcSeries as called by PVstring.calcString (current grid from the mean Isc and the
+    min/max module current of the modules present), with each module curve weighted by its count instead of
+    being repeated; module order does not change a series curve.
+
+    Parameters:
+      - counts: (B, T) number of modules of each type in each of B strings
+      - modules: T PVmodules or module curve dicts {"I", "V", "Isc"} (decreasing current, as Imod/Vmod)
+      - pvconst: PVconstants (default: modules[0].pvconst)
+      - clip_bypass: hold each module voltage at its curve minimum (bypass-diode floor) where the string
+        current lies beyond the module's sampled range, instead of extrapolating linearly as calcSeries does
+
+    Returns (Istring, Vstring), both (B, 2 * npts) in PVstring order (decreasing current)
+    """
+    counts = np.atleast_2d(np.asarray(counts))
+    pvconst = pvconst if pvconst is not None else modules[0].pvconst
+    curves = [_module_arrays(m) for m in modules]
+    Isc = np.array([c[2] for c in curves])
+    I_max = np.array([c[0].max() for c in curves])
+    I_min = np.array([c[0].min() for c in curves])
+
+    present = counts > 0
+    meanIsc = (counts @ Isc) / counts.sum(axis=1)
+    Imax = np.where(present, I_max, -np.inf).max(axis=1)
+    Imin = np.minimum(np.where(present, I_min, np.inf).min(axis=1), 0.0)
+    Ireverse = (Imax - meanIsc)[:, None] * pvconst.Imod_pts.T + meanIsc[:, None]
+    Iforward = (Imin - meanIsc)[:, None] * pvconst.Imod_negpts.T + meanIsc[:, None]
+    Itot = np.concatenate((Iforward, Ireverse), axis=1)
+
+    Vtot = np.zeros_like(Itot)
+    for t, (I, V, _) in enumerate(curves):
+        rows = np.flatnonzero(present[:, t])
+        if rows.size == 0:
+            continue
+        Vt = npinterpx(Itot[rows].ravel(), np.flipud(I), np.flipud(V)).reshape(len(rows), -1)
+        if clip_bypass:
+            Vt = np.maximum(Vt, V.min())
+        Vtot[rows] += counts[rows, t][:, None] * Vt
+    return np.flip(Itot, axis=1), np.flip(Vtot, axis=1)
+
+
+class SeriesString:
+    """
+    Lightweight stand-in for a PVstring whose curve comes from series_curves.
+    Exposes the attributes used in this study: pvmods, pvconst, numberMods, Istring, Vstring, Pstring.
+    """
+
+    def __init__(self, pvmods, Istring, Vstring, pvconst):
+        self.pvmods = list(pvmods)
+        self.numberMods = len(self.pvmods)
+        self.pvconst = pvconst
+        self.Istring, self.Vstring = Istring, Vstring
+        self.Pstring = Istring * Vstring
+
+
+def string_prototypes(module_healthy, module_degraded, mods_per_string=30, series_kernel=False):
+    """
+    PVstring prototypes with k = 0..mods_per_string degraded modules (first k modules degraded).
+    series_kernel=True builds all of them in one series_curves call (SeriesString objects).
+    """
+    if not series_kernel:
+        return [pvstring.PVstring(pvmods=[module_degraded] * k + [module_healthy] * (mods_per_string - k))
+                for k in range(mods_per_string + 1)]
+    k = np.arange(mods_per_string + 1)
+    Istr, Vstr = series_curves(np.column_stack((mods_per_string - k, k)), [module_healthy, module_degraded])
+    return [SeriesString([module_degraded] * kk + [module_healthy] * (mods_per_string - kk), Istr[kk], Vstr[kk],
+                         module_healthy.pvconst)
+            for kk in k]
+
+
+def _assemble(signatures, prototypes, composite=False):
+    """Build a CompositeSystem, or a full PVsystem with one PVstring per signature (one per string)."""
+    if composite:
+        return CompositeSystem(prototypes, signatures)
+    pv_strings = [pvstring.PVstring(pvmods=[prototypes[m] for m in sig]) for sig in signatures]
+    return pvsystem.PVsystem(pvstrs=pv_strings)
 
 
 def create_mismatched_pyramid(degraded_sets=1, min_degraded_modules=1, max_degraded_modules=30, clamp_after_max=False,
-                              module_healthy=None, module_degraded=None):
+                              module_healthy=None, module_degraded=None, composite=False,
+                              total_strings=150, mods_per_string=30, strings_per_set=30):
     """
     Build a pyramid-like mismatched PV system:
-    - 150 strings organised into 5 "sets" (30 strings each)
-    - 30 modules per string
+    - total_strings strings organised into "sets" of strings_per_set strings (default 150 = 5 x 30)
+    - mods_per_string modules per string (default 30)
+    - if strings_per_set does not divide total_strings, the last set is shorter
 
     Pattern:
     Degraded modules from min_degraded_modules to max_degraded_modules with an increment of 1 per string.
@@ -19,11 +258,11 @@ def create_mismatched_pyramid(degraded_sets=1, min_degraded_modules=1, max_degra
       - clamp_after_max=True: remain at max_degraded_modules for remaining strings in the set
       - clamp_after_max=False: remaining strings in the set are healthy (0 degraded)
       - Non-affected sets are fully healthy.
+
+    composite=True returns a CompositeSystem (one PVstring per distinct string) instead of a PVsystem.
     """
-    total_strings = 150
-    mods_per_string = 30
-    total_sets = total_strings // 30                # == 5
-    strings_per_set = total_strings // total_sets   # == 30
+    if total_strings < 1 or mods_per_string < 1 or strings_per_set < 1:
+        raise ValueError("total_strings, mods_per_string and strings_per_set must be >= 1.")
 
     # Build degradation pattern (pyramid from min_degraded_modules to max_degraded_modules) across strings
     if clamp_after_max:
@@ -49,103 +288,102 @@ def create_mismatched_pyramid(degraded_sets=1, min_degraded_modules=1, max_degra
                 else:
                     reached_max = True
 
-    # Build a string with k degraded modules
-    def make_string(k_degraded):
+    # Signature of a string with k degraded modules
+    def make_signature(k_degraded):
         k = int(np.clip(k_degraded, 0, mods_per_string))  # Ensure int k is in valid range [0, mods_per_string]
-        mods = [module_degraded] * k + [module_healthy] * (mods_per_string - k)
-        return pvstring.PVstring(pvmods=mods)
+        return ("D",) * k + ("H",) * (mods_per_string - k)
 
-    pv_strings = []
-    for set_idx in range(total_sets):
+    signatures = []
+    for s_idx in range(total_strings):
+        set_idx, str_idx = divmod(s_idx, strings_per_set)
         is_affected = set_idx < degraded_sets  # True/False if this set is affected
-        for str_idx in range(strings_per_set):
-            if is_affected:
-                k_deg = affected_pattern[str_idx]
-            else:
-                k_deg = 0  # non-affected sets remain healthy
-            pv_strings.append(make_string(k_deg))
+        if is_affected:
+            k_deg = affected_pattern[str_idx]
+        else:
+            k_deg = 0  # non-affected sets remain healthy
+        signatures.append(make_signature(k_deg))
 
     # Assemble the full system
-    system = pvsystem.PVsystem(pvstrs=pv_strings)
-    return system
+    return _assemble(signatures, {"H": module_healthy, "D": module_degraded}, composite)
 
 def create_mismatched_parametric(min_degraded_modules=None, num_degraded_strings=None,
-                                 module_healthy=None, module_degraded=None):
+                                 module_healthy=None, module_degraded=None, composite=False,
+                                 total_strings=150, mods_per_string=30):
     """
     Build a mismatched PV system by specifying:
-      - min_degraded_modules: K degraded modules per affected string (0..30)
-      - num_degraded_strings: N affected strings (0..150), taken from the start
+      - min_degraded_modules: K degraded modules per affected string (0..mods_per_string)
+      - num_degraded_strings: N affected strings (0..total_strings), taken from the start
+      - total_strings, mods_per_string: system topology (default 150 strings x 30 modules)
 
     Remaining strings are healthy. This is a simple builder to support parametric loops.
+    composite=True returns a CompositeSystem (at most 2 string solves) instead of a PVsystem.
     """
 
-    total_strings = 150
-    mods_per_string = 30
-
     # Clamp inputs
     k = int(np.clip(min_degraded_modules, 0, mods_per_string))
     n = int(np.clip(num_degraded_strings, 0, total_strings))
 
-    # Make a string with k degraded modules
-    def make_string(k_local):
-        mods = [module_degraded] * k_local + [module_healthy] * (mods_per_string - k_local)
-        return pvstring.PVstring(pvmods=mods)
+    # Signature of a string with k degraded modules
+    def make_signature(k_local):
+        return ("D",) * k_local + ("H",) * (mods_per_string - k_local)
 
-    pv_strings = []
+    signatures = []
     for s_idx in range(total_strings):
         if s_idx < n:
-            pv_strings.append(make_string(k))
+            signatures.append(make_signature(k))
         else:
-            pv_strings.append(make_string(0))
+            signatures.append(make_signature(0))
 
-    return pvsystem.PVsystem(pvstrs=pv_strings)
+    return _assemble(signatures, {"H": module_healthy, "D": module_degraded}, composite)
 
 def create_mismatched_multimodal(min_degraded_modules=None, num_degraded_strings=None,
-                                 module_healthy=None, modules_degraded_levels=None):
+                                 module_healthy=None, modules_degraded_levels=None, composite=False,
+                                 total_strings=150, mods_per_string=30):
     """
     Build a mismatched PV system with multiple degraded levels spread evenly:
       - Within a string: first K modules are degraded and cycle levels 1..L (wrap).
       - Across strings: the starting level offset advances by +1 per string (r = s_idx % L).
 
     Parameters:
-      - min_degraded_modules (int): K degraded modules per affected string (0..30)
-      - num_degraded_strings (int): N affected strings (0..150), taken from the start
+      - min_degraded_modules (int): K degraded modules per affected string (0..mods_per_string)
+      - num_degraded_strings (int): N affected strings (0..total_strings), taken from the start
       - module_healthy: healthy PVmodule instance
       - modules_degraded_levels (Sequence[PVmodule]): ordered degraded level variants
+      - composite (bool): return a CompositeSystem (at most L+1 string solves) instead of a PVsystem
+      - total_strings, mods_per_string (int): system topology (default 150 strings x 30 modules)
     """
-    total_strings = 150
-    mods_per_string = 30
-    L = len(modules_degraded_levels)
-
     if not modules_degraded_levels:
         raise ValueError("modules_degraded_levels must be a non-empty sequence of degraded PVmodule variants.")
+    L = len(modules_degraded_levels)
 
     k = int(np.clip(min_degraded_modules or 0, 0, mods_per_string))
     n = int(np.clip(num_degraded_strings or 0, 0, total_strings))
 
-    pv_strings = []
+    signatures = []
     for s_idx in range(total_strings):
         if s_idx < n and k > 0:
             # Per-string starting offset (+1 per string)
             r = s_idx % L
-            mods = []
+            sig = []
             for pos in range(k):
                 # First K modules: degraded, cycling from offset r
                 lvl_idx = (r + pos) % L
-                mods.append(modules_degraded_levels[lvl_idx])
+                sig.append(f"L{lvl_idx}")
             # Remaining modules: healthy
-            mods.extend([module_healthy] * (mods_per_string - k))
-            pv_strings.append(pvstring.PVstring(pvmods=mods))
+            sig.extend(["H"] * (mods_per_string - k))
+            signatures.append(tuple(sig))
         else:
-            pv_strings.append(pvstring.PVstring(pvmods=[module_healthy] * mods_per_string))
+            signatures.append(("H",) * mods_per_string)
 
-    return pvsystem.PVsystem(pvstrs=pv_strings)
+    prototypes = {"H": module_healthy}
+    prototypes.update({f"L{i}": m for i, m in enumerate(modules_degraded_levels)})
+    return _assemble(signatures, prototypes, composite)
 
 
 # --- Visualise/Print pyramid system---
 def system_binary_matrix(pvsys, module_degraded=None):
     """
-    Return a 150x30 matrix of 0/1 where 0=healthy module, 1=degraded module
+    Return a (strings x modules per string) matrix of 0/1 where 0=healthy module, 1=degraded module
     """
     rows = []
     for s in pvsys.pvstrs:
@@ -153,19 +391,18 @@ def system_binary_matrix(pvsys, module_degraded=None):
         rows.append(row)
     return np.array(rows, dtype=int)
 
-def print_system(pvsys, module_degraded=None):
+def print_system(pvsys, module_degraded=None, strings_per_set=30):
     """
-    Print full system as lines of 30 characters per string.
+    Print full system as one line per string (one character per module).
     - '0' denotes healthy modules
     - '1' denotes degraded modules
-    Groups output by 5 sets (30 strings each).
+    Groups output by sets of strings_per_set strings (5 sets of 30 for the default 150-string system).
     """
     mat = system_binary_matrix(pvsys, module_degraded)
-    strings_per_set = 30
-    total_sets = 5
+    total_sets = -(-len(mat) // strings_per_set)
     for set_idx in range(total_sets):
         start = set_idx * strings_per_set
-        end = start + strings_per_set
+        end = min(start + strings_per_set, len(mat))
         print(f"Set {set_idx} (strings {start}-{end-1})")
         for si in range(start, end):
             line = "".join(str(x) for x in mat[si])
@@ -0,0 +1,303 @@
+# Tide Langner
+# Monte Carlo degradation sampler with streaming statistics
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
+from case_study_data.module_cache import CELL_DEFAULTS, DEG_FACTORS, get_module
+from sys_mismatch_calculator import loss_metrics_batch
+from sys_timeseries import CELL_PARAMS, module_curve, system_mpps
+
+"""
+Each realisation draws an Rs multiplier and an Rsh divisor for every module of a strings x modules system,
+either from the discrete degradation levels L1-L6 (same factors as sys_degraded_fully / DEG_LEVELS in
+excel_tool) or from continuous distributions, and evaluates the loss_calculator metrics against the
+healthy system.
+
+Work is split into batches of realisations. Each batch gets its own seed spawned from one SeedSequence, so
+results do not depend on the number of workers or their scheduling. Workers return one metric row per
+realisation; the parent folds the rows into streaming estimators (Welford mean/variance, P2 quantiles) in
+batch order and discards them, so memory does not grow with the number of realisations.
+"""
+
+# Continuous multiplier distributions: name -> number of parameters
+DISTRIBUTIONS = {"fixed": 1, "uniform": 2, "lognormal": 2, "triangular": 3}
+
+
+# --- Streaming estimators ---
+class RunningStats:
+    """Welford mean / variance / min / max over the columns of a stream of (batch, n) arrays."""
+
+    def __init__(self, n):
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+
+    def update(self, rows):
+        rows = np.atleast_2d(rows)
+        nb = rows.shape[0]
+        if nb == 0:
+            return
+        mean_b = rows.mean(axis=0)
+        m2_b = ((rows - mean_b) ** 2).sum(axis=0)
+        # Chan et al. combination of the running and batch moments
+        total = self.count + nb
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * nb / total
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.count * nb / total
+        self.count = total
+        self.min = np.minimum(self.min, rows.min(axis=0))
+        self.max = np.maximum(self.max, rows.max(axis=0))
+
+    @property
+    def var(self):
+        """Sample variance (ddof=1)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+
+class P2Quantile:
+    """
+    P2 estimator (Jain & Chlamtac, 1985) of one quantile p over the columns of a stream of (batch, n) arrays.
+    Keeps 5 markers per column; exact (np.quantile) until 5 observations have been seen.
+    """
+
+    def __init__(self, p, n):
+        if not 0.0 < p < 1.0:
+            raise ValueError("Quantile p must be in (0, 1).")
+        self.p = p
+        self.count = 0
+        self._first = []
+        self.q = np.zeros((n, 5))
+        self.pos = np.tile(np.arange(1.0, 6.0), (n, 1))
+        self.desired = np.tile(np.array([1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]), (n, 1))
+        self.step = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+    def update(self, rows):
+        for x in np.atleast_2d(rows):
+            self._add(np.asarray(x, dtype=float))
+
+    def _add(self, x):
+        self.count += 1
+        if self.count <= 5:
+            self._first.append(x)
+            if self.count == 5:
+                self.q = np.sort(np.stack(self._first, axis=1), axis=1)
+                self._first = []
+            return
+
+        q, pos = self.q, self.pos
+        q[:, 0] = np.minimum(q[:, 0], x)
+        q[:, 4] = np.maximum(q[:, 4], x)
+        # Cell k containing x (0..3); markers above it move one position up
+        k = np.clip((x[:, None] >= q[:, 1:4]).sum(axis=1), 0, 3)
+        pos += np.arange(5)[None, :] > k[:, None]
+        self.desired += self.step
+
+        rows = np.arange(len(x))
+        for i in (1, 2, 3):
+            d = self.desired[:, i] - pos[:, i]
+            up = (d >= 1) & (pos[:, i + 1] - pos[:, i] > 1)
+            down = (d <= -1) & (pos[:, i - 1] - pos[:, i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            n_lo, n_i, n_hi = pos[:, i - 1], pos[:, i], pos[:, i + 1]
+            q_lo, q_i, q_hi = q[:, i - 1], q[:, i], q[:, i + 1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # Piecewise-parabolic prediction, linear fallback if it leaves (q_lo, q_hi)
+                parabolic = q_i + s / (n_hi - n_lo) * ((n_i - n_lo + s) * (q_hi - q_i) / (n_hi - n_i)
+                                                       + (n_hi - n_i - s) * (q_i - q_lo) / (n_i - n_lo))
+                j = (i + s).astype(int)
+                linear = q_i + s * (q[rows, j] - q_i) / (pos[rows, j] - n_i)
+            new = np.where((q_lo < parabolic) & (parabolic < q_hi), parabolic, linear)
+            q[:, i] = np.where(move, new, q_i)
+            pos[:, i] = np.where(move, n_i + s, n_i)
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return np.full(self.q.shape[0], np.nan)
+        if self.count < 5:
+            return np.quantile(np.stack(self._first, axis=0), self.p, axis=0)
+        return self.q[:, 2].copy()
+
+
+# --- Sampling ---
+def _check_distribution(spec, name):
+    if spec is None or spec == "same":
+        return
+    if not isinstance(spec, (tuple, list)) or not spec or spec[0] not in DISTRIBUTIONS \
+            or len(spec) != DISTRIBUTIONS[spec[0]] + 1:
+        raise ValueError(f"Invalid {name} distribution {spec!r}. Use one of "
+                         f"('fixed', v), ('uniform', lo, hi), ('lognormal', median, sigma), "
+                         f"('triangular', left, mode, right).")
+
+
+def _draw(rng, spec, size):
+    kind, args = spec[0], [float(a) for a in spec[1:]]
+    if kind == "fixed":
+        return np.full(size, args[0])
+    if kind == "uniform":
+        return rng.uniform(args[0], args[1], size)
+    if kind == "lognormal":
+        return args[0] * np.exp(args[1] * rng.standard_normal(size))
+    return rng.triangular(args[0], args[1], args[2], size)
+
+
+def sample_factors(rng, shape, level_probs=None, rs_factor=None, rsh_factor="same", p_degraded=1.0,
+                   factor_step=0.05):
+    """
+    Per-module (Rs multiplier, Rsh divisor) for one realisation, each array of the given shape.
+
+    Parameters:
+      - level_probs: {level: probability} over DEG_FACTORS levels 0 (healthy) .. 6; takes precedence
+      - rs_factor: continuous Rs multiplier distribution, e.g. ("lognormal", 2.0, 0.3)
+      - rsh_factor: Rsh divisor distribution, or "same" to reuse the Rs factor (as in DEG_LEVELS)
+      - p_degraded: probability that a module is degraded at all (continuous mode)
+      - factor_step: continuous factors are rounded to this step (>= 1, i.e. degradation only) so modules
+        share prototypes
+    """
+    if level_probs is not None:
+        levels = np.array(sorted(level_probs))
+        lvl = rng.choice(levels, size=shape, p=np.array([level_probs[l] for l in levels], dtype=float))
+        f = np.vectorize(DEG_FACTORS.get, otypes=[float])(lvl)
+        return f, f
+
+    rs = _draw(rng, rs_factor, shape)
+    rsh = rs if rsh_factor == "same" else _draw(rng, rsh_factor, shape)
+    healthy = rng.random(shape) >= p_degraded
+    rs = np.where(healthy, 1.0, np.maximum(np.round(rs / factor_step) * factor_step, 1.0))
+    rsh = np.where(healthy, 1.0, np.maximum(np.round(rsh / factor_step) * factor_step, 1.0))
+    return rs, rsh
+
+
+# --- Worker ---
+_curves = {}
+_baseline = {}
+
+
+def _curve(factors, Ee, Tcell):
+    """Module curve for (Rs multiplier, Rsh divisor), cached per worker."""
+    key = (factors, Ee, Tcell)
+    if key not in _curves:
+        params = {name: CELL_DEFAULTS[name] for name in CELL_PARAMS}
+        params["Rs"] *= factors[0]
+        params["Rsh"] /= factors[1]
+        _curves[key] = module_curve(params, Ee, Tcell)
+    return _curves[key]
+
+
+def _healthy_baseline(total_strings, mods_per_string, Ee, Tcell, pvconst):
+    key = (total_strings, mods_per_string, Ee, Tcell)
+    if key not in _baseline:
+        modules = {0: _curve((1.0, 1.0), Ee, Tcell)}
+        Psys, Pstrs, Pmods = system_mpps(modules, {(0,) * mods_per_string: total_strings}, pvconst)
+        _baseline[key] = (Pmods, Pstrs, Psys)
+    return _baseline[key]
+
+
+def _run_batch(job):
+    """Evaluate one batch of realisations; returns a (n, len(metric keys)) array."""
+    seed, n, sampling, total_strings, mods_per_string, Ee, Tcell = job
+    rng = np.random.default_rng(seed)
+    pvconst = get_module().pvconst
+    Pmods_h, Pstrs_h, Psys_h = _healthy_baseline(total_strings, mods_per_string, Ee, Tcell, pvconst)
+
+    rows = []
+    for _ in range(n):
+        rs, rsh = sample_factors(rng, (total_strings, mods_per_string), **sampling)
+        pairs, ids = np.unique(np.stack((rs.ravel(), rsh.ravel()), axis=1), axis=0, return_inverse=True)
+        ids = ids.reshape(total_strings, mods_per_string)
+        modules = {i: _curve((float(a), float(b)), Ee, Tcell) for i, (a, b) in enumerate(pairs)}
+        counts = {}
+        for sig in map(tuple, ids.tolist()):
+            counts[sig] = counts.get(sig, 0) + 1
+        Psys, Pstrs, Pmods = system_mpps(modules, counts, pvconst)
+        report = loss_metrics_batch(Psys, Pmods, Pstrs, Pmods_h, Pstrs_h, Psys_h, num_strs_affected=total_strings)
+        rows.append([float(v) for v in report.values()])
+    return np.array(rows)
+
+
+def metric_keys():
+    """loss_calculator metric names, in the column order of the Monte Carlo rows."""
+    return list(loss_metrics_batch(0.0, 0.0, 0.0, 1.0, 1.0, 1.0).keys())
+
+
+# --- Engine ---
+def run_monte_carlo(n_systems=1000, level_probs=None, rs_factor=None, rsh_factor="same", p_degraded=1.0,
+                    factor_step=0.05, total_strings=150, mods_per_string=30, Ee=1.0, Tcell=298.15,
+                    quantiles=(0.05, 0.5, 0.95), seed=0, batch_size=50, max_workers=None):
+    """
+    Monte Carlo distribution of the loss_calculator metrics for randomly degraded systems.
+
+    Parameters:
+      - n_systems: number of realisations
+      - level_probs / rs_factor / rsh_factor / p_degraded / factor_step: sampling (see sample_factors);
+        e.g. level_probs={0: 0.7, 1: 0.1, 3: 0.1, 6: 0.1} or rs_factor=("lognormal", 2.0, 0.3)
+      - total_strings, mods_per_string: system topology (default 150 x 30)
+      - Ee [suns], Tcell [K]: operating condition of every module
+      - quantiles: streaming P2 quantile estimates to keep
+      - seed: root seed; batch b uses SeedSequence(seed).spawn(...)[b] (reproducible for any worker count)
+      - batch_size: realisations per worker task
+      - max_workers: process pool size; defaults to min(number of batches, os.cpu_count()); <= 1 runs in-process
+
+    Returns dict with "n_systems", "metrics" ({metric: {"mean", "std", "min", "max", "q05", ...}}),
+    "seed" and "elapsed_s".
+    """
+    start = time.time()
+    if level_probs is None and rs_factor is None:
+        raise ValueError("Give level_probs (discrete levels) or rs_factor (continuous multipliers).")
+    if level_probs is not None:
+        unknown = set(level_probs) - set(DEG_FACTORS)
+        if unknown:
+            raise ValueError(f"Unknown degradation level(s) {sorted(unknown)}. Allowed: {sorted(DEG_FACTORS)}")
+        if not np.isclose(sum(level_probs.values()), 1.0):
+            raise ValueError("level_probs must sum to 1.")
+    _check_distribution(rs_factor, "rs_factor")
+    _check_distribution(rsh_factor, "rsh_factor")
+    if n_systems < 1 or batch_size < 1 or total_strings < 1 or mods_per_string < 1:
+        raise ValueError("n_systems, batch_size, total_strings and mods_per_string must be >= 1.")
+
+    sampling = {"level_probs": level_probs, "rs_factor": rs_factor, "rsh_factor": rsh_factor,
+                "p_degraded": p_degraded, "factor_step": factor_step}
+    sizes = [batch_size] * (n_systems // batch_size) + ([n_systems % batch_size] if n_systems % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(s, n, sampling, total_strings, mods_per_string, Ee, Tcell) for s, n in zip(seeds, sizes)]
+
+    keys = metric_keys()
+    stats = RunningStats(len(keys))
+    estimators = [P2Quantile(q, len(keys)) for q in quantiles]
+
+    def consume(rows):
+        stats.update(rows)
+        for est in estimators:
+            est.update(rows)
+
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+    if max_workers <= 1:
+        for job in jobs:
+            consume(_run_batch(job))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # map yields in batch order, so the P2 estimates are reproducible too
+            for rows in pool.map(_run_batch, jobs):
+                consume(rows)
+
+    std = np.sqrt(stats.var)
+    metrics = {}
+    for c, key in enumerate(keys):
+        entry = {"mean": float(stats.mean[c]), "std": float(std[c]),
+                 "min": float(stats.min[c]), "max": float(stats.max[c])}
+        for est in estimators:
+            entry[f"q{round(100 * est.p):02d}"] = float(est.value[c])
+        metrics[key] = entry
+
+    elapsed = time.time() - start
+    print(f"[run_monte_carlo] {stats.count} systems in {timedelta(seconds=elapsed)} ({max_workers} workers)")
+    return {"n_systems": stats.count, "metrics": metrics, "seed": seed, "elapsed_s": elapsed}
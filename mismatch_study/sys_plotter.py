@@ -1,6 +1,11 @@
 # Tide Langner
 # Plot mismatch components and scenarios
 
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 from sys_mismatch_calculator import mpp_from_curve, loss_calculator
@@ -360,7 +365,7 @@ def plot_parametric_3d(k_mesh, set_mesh, z_mesh, z_mode="W", title=None, mode=1,
 
 
 def save_parametric_3d(k_mesh, set_mesh, z_mesh, title=None, z_label=None, z_unit="W", cmap="viridis",
-                       save_path=None, show=False, view=None):
+                       save_path=None, show=False, view=None, dpi=600):
     """
     Save a 3D surface plot to disk (optionally show).
 
@@ -374,6 +379,8 @@ def save_parametric_3d(k_mesh, set_mesh, z_mesh, title=None, z_label=None, z_uni
       cmap: matplotlib colormap name (e.g., 'viridis', 'Reds', 'magma', 'cividis')
       save_path: path to save (PDF recommended). If None, will not save.
       show: whether to display the window (False by default for batch use)
+      view: "top" for a top-down view, anything else for the default orthographic view
+      dpi: resolution of rasterised elements in the saved file
     """
     from mpl_toolkits.mplot3d import Axes3D
     from matplotlib.ticker import EngFormatter
@@ -524,7 +531,7 @@ def save_parametric_3d(k_mesh, set_mesh, z_mesh, title=None, z_label=None, z_uni
 
     # Save or show the plot
     if save_path is not None:
-        fig.savefig(save_path, dpi=600, bbox_inches="tight")
+        fig.savefig(save_path, dpi=dpi, bbox_inches="tight")
 
     if show:
         plt.show()
@@ -533,7 +540,7 @@ def save_parametric_3d(k_mesh, set_mesh, z_mesh, title=None, z_label=None, z_uni
 
 
 def plot_and_save_trend_surfaces(k_mesh, set_mesh, surfaces_by_metric, scenario_order=None, metric_meta=None,
-                                 cmaps=None, alpha=0.4, out_root="results_plotted/trends", show=False):
+                                 cmaps=None, alpha=0.4, out_root="results_plotted/trends", show=False, dpi=900):
     """
     Plot and save 3D surfaces for ALL degradation scenarios on a shared Z axis
     and connect their surface peaks with a line. Done separately for each metric.
@@ -557,6 +564,7 @@ def plot_and_save_trend_surfaces(k_mesh, set_mesh, surfaces_by_metric, scenario_
     - alpha: float transparency for surfaces (0..1)
     - out_root: output directory. Results saved under results_plotted/trends by default.
     - show: whether to display figures interactively in addition to saving.
+    - dpi: resolution of rasterised elements in the saved figures
 
     Outputs per metric (under out_root):
     - <metric_key>_trend_surfaces.png: overlayed 3D surfaces and peak-connecting line
@@ -716,7 +724,7 @@ def plot_and_save_trend_surfaces(k_mesh, set_mesh, surfaces_by_metric, scenario_
 
         # --- Save figure ---
         fig_path = Path(out_dir) / f"{metric_key}_trend_surfaces.pdf"
-        fig.savefig(fig_path, dpi=900)
+        fig.savefig(fig_path, dpi=dpi)
 
         # --- Save peaks CSV ---
         csv_path = Path(out_dir) / f"{metric_key}_peaks.csv"
@@ -732,3 +740,136 @@ def plot_and_save_trend_surfaces(k_mesh, set_mesh, surfaces_by_metric, scenario_
             plt.close(fig)
 
 
+# --- Figure cache ---
+# Every output folder holds a .figure_cache.json index {file name: key}. The key is a content hash of
+# everything that determines the figure (plotted arrays, title/labels, colormap, view, dpi, PLOTTER_VERSION),
+# so a figure is only rendered again when one of its inputs changes.
+# Bump PLOTTER_VERSION whenever the look of the saved figures changes.
+PLOTTER_VERSION = 1
+FIGURE_CACHE_INDEX = ".figure_cache.json"
+
+
+def figure_cache_key(*arrays, **params):
+    """SHA-1 of the plotted arrays (dtype, shape and bytes), the rendering parameters and PLOTTER_VERSION."""
+    h = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode("utf-8"))
+        h.update(arr.tobytes())
+    params = dict(params, plotter_version=PLOTTER_VERSION)
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _read_figure_index(folder):
+    index_path = Path(folder) / FIGURE_CACHE_INDEX
+    if not index_path.exists():
+        return {}
+    with open(index_path, "r") as f:
+        return json.load(f)
+
+
+def figure_is_cached(path, key):
+    """True if path exists and was last rendered from inputs with this key."""
+    path = Path(path)
+    return path.exists() and _read_figure_index(path.parent).get(path.name) == key
+
+
+def record_figure(path, key):
+    """Store the key of a freshly rendered figure in its folder's index."""
+    path = Path(path)
+    index = _read_figure_index(path.parent)
+    index[path.name] = key
+    tmp = path.parent / f"{FIGURE_CACHE_INDEX}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, path.parent / FIGURE_CACHE_INDEX)
+
+
+def surface_figure_key(k_mesh, set_mesh, z_mesh, *, title=None, z_label=None, z_unit="W", cmap="viridis",
+                       view=None, dpi=600):
+    """Figure cache key of a save_parametric_3d figure."""
+    return figure_cache_key(k_mesh, set_mesh, z_mesh, kind="surface", title=title, z_label=z_label, z_unit=z_unit,
+                            cmap=cmap, view=view, dpi=dpi)
+
+
+def save_parametric_3d_cached(k_mesh, set_mesh, z_mesh, *, save_path, title=None, z_label=None, z_unit="W",
+                              cmap="viridis", view=None, dpi=600, force=False):
+    """
+    save_parametric_3d through the figure cache: reuse save_path if it was rendered from the same inputs.
+    Returns (key, rendered) where rendered is False if the existing file was reused.
+    """
+    key = surface_figure_key(k_mesh, set_mesh, z_mesh, title=title, z_label=z_label, z_unit=z_unit, cmap=cmap,
+                             view=view, dpi=dpi)
+    if not force and figure_is_cached(save_path, key):
+        return key, False
+    save_parametric_3d(k_mesh, set_mesh, z_mesh, title=title, z_label=z_label, z_unit=z_unit, cmap=cmap,
+                       save_path=save_path, show=False, view=view, dpi=dpi)
+    record_figure(save_path, key)
+    return key, True
+
+
+# --- Headless batch rendering ---
+# A render job is a dict:
+#   {"kind": "surface" | "trend", "kwargs": {...}, "output": "<figure path>", "key": "<figure_cache_key>"}
+# "surface" jobs call save_parametric_3d(**kwargs), "trend" jobs plot_and_save_trend_surfaces(**kwargs).
+_RENDERERS = {"surface": save_parametric_3d, "trend": plot_and_save_trend_surfaces}
+
+
+def _init_render_worker():
+    """Process-pool initializer: render without a display."""
+    plt.switch_backend("Agg")
+
+
+def _render_job(job):
+    _RENDERERS[job["kind"]](**job["kwargs"])
+    return job["output"], job["key"]
+
+
+def render_batch(jobs, max_workers=None, force=False):
+    """
+    Render a list of figure jobs headlessly (Agg backend), in a process pool.
+
+    Jobs whose output is in the figure cache with the same key are skipped. Keys are recorded (by the
+    parent process) after every finished figure, so an interrupted batch resumes where it stopped.
+
+    Parameters:
+      jobs: render job dicts (see above)
+      max_workers: pool size; defaults to min(#jobs to render, os.cpu_count()); <= 1 renders in-process
+      force: re-render every job
+
+    Returns:
+      {"rendered": [paths], "skipped": [paths]}
+    """
+    todo, skipped = [], []
+    for job in jobs:
+        if not force and figure_is_cached(job["output"], job["key"]):
+            skipped.append(str(job["output"]))
+        else:
+            Path(job["output"]).parent.mkdir(parents=True, exist_ok=True)
+            todo.append(job)
+
+    rendered = []
+    if todo:
+        if max_workers is None:
+            max_workers = min(len(todo), os.cpu_count() or 1)
+        if max_workers <= 1:
+            backend = plt.get_backend()
+            _init_render_worker()
+            try:
+                for job in todo:
+                    out, key = _render_job(job)
+                    record_figure(out, key)
+                    rendered.append(str(out))
+            finally:
+                if backend.lower() != "agg":
+                    plt.switch_backend(backend)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker) as pool:
+                futures = [pool.submit(_render_job, job) for job in todo]
+                for fut in as_completed(futures):
+                    out, key = fut.result()
+                    record_figure(out, key)
+                    rendered.append(str(out))
+
+    return {"rendered": rendered, "skipped": skipped}
@@ -0,0 +1,215 @@
+# Tide Langner
+# Module-to-string reconfiguration optimizer
+
+import time
+from collections import Counter
+from datetime import timedelta
+import numpy as np
+from pvmismatch.pvmismatch_lib.pvconstants import npinterpx
+try:
+    from sys_mismatched import CompositeSystem
+    from sys_mismatch_calculator import refine_mpp, system_mpp
+    from sys_timeseries import curve_from_module, series_curve
+except ImportError:  # imported as part of the mismatch_study package (e.g. from excel_tool)
+    from mismatch_study.sys_mismatched import CompositeSystem
+    from mismatch_study.sys_mismatch_calculator import refine_mpp, system_mpp
+    from mismatch_study.sys_timeseries import curve_from_module, series_curve
+
+"""
+Search for the assignment of a pool of module types to strings that maximises the system MPP.
+
+  1. Greedy start: modules sorted by Imp (descending) fill the strings in order, so modules of similar current
+     share a string.
+  2. Local swaps: exchange one module of type a in string i with one of type b in string j while the system
+     MPP improves (first improvement, repeated until no swap helps).
+
+Modules of one type are interchangeable and module order does not change a series curve, so a string is a
+composition (count per type). String curves are cached per composition and each string's current is kept on a
+fixed system voltage grid; a swap re-evaluates only the two strings it touches:
+Isys_new = Isys - I_i - I_j + I_i' + I_j'.
+Reported MPPs (initial / greedy / optimised) are recomputed exactly with CompositeSystem.
+"""
+
+
+class _SwapState:
+    """String compositions and their currents on a fixed voltage grid, with the running system current."""
+
+    def __init__(self, curves, types, mods_per_string, pvconst, refine):
+        self.curves = curves
+        self.types = types
+        self.pvconst = pvconst
+        self.refine = refine
+        # Fixed grid spanning every possible string (pure strings of the extreme module types)
+        V_lo = mods_per_string * min(c["V"].min() for c in curves.values())
+        V_hi = mods_per_string * max(c["V"].max() for c in curves.values())
+        self.Vsys = np.concatenate((V_lo * pvconst.negpts, V_hi * pvconst.pts), axis=0).flatten()
+        self._currents = {}
+        self.evaluations = 0
+
+    def current(self, comp):
+        """String current on the system grid for a composition (tuple of counts per type), cached."""
+        I = self._currents.get(comp)
+        if I is None:
+            composition = {t: n for t, n in zip(self.types, comp) if n}
+            Istring, Vstring = series_curve(self.curves, composition, self.pvconst)
+            # The bypass-clipped reverse end repeats voltages; npinterpx's unused left extrapolation divides by 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                I = npinterpx(self.Vsys, Vstring.flatten(), Istring.flatten())
+            self._currents[comp] = I
+        return I
+
+    def power(self, Isys):
+        self.evaluations += 1
+        if self.refine is None:
+            return float(np.max(Isys * self.Vsys))
+        return float(refine_mpp(Isys, self.Vsys, method=self.refine)[0])
+
+    def system_current(self, comps):
+        return np.sum([self.current(c) for c in comps], axis=0)
+
+
+def _greedy_layout(pool, imp, num_strings, mods_per_string, types):
+    """Modules sorted by Imp (descending), filled into strings in order; returns compositions."""
+    order = sorted(pool, key=lambda t: -imp[t])
+    modules = [t for t in order for _ in range(pool[t])]
+    comps = []
+    for s in range(num_strings):
+        counts = Counter(modules[s * mods_per_string:(s + 1) * mods_per_string])
+        comps.append(tuple(counts.get(t, 0) for t in types))
+    return comps
+
+
+def _swaps(ci, cj, n_types):
+    """Compositions after exchanging one module of type a (string i) with one of type b (string j)."""
+    for a in range(n_types):
+        if not ci[a]:
+            continue
+        for b in range(n_types):
+            if a == b or not cj[b]:
+                continue
+            ni, nj = list(ci), list(cj)
+            ni[a] -= 1
+            ni[b] += 1
+            nj[b] -= 1
+            nj[a] += 1
+            ni, nj = tuple(ni), tuple(nj)
+            if {ni, nj} != {ci, cj}:
+                yield ni, nj
+
+
+def _local_search(state, comps, max_passes, tol):
+    """First-improvement pairwise module swaps; returns (compositions, power, swaps)."""
+    comps = list(comps)
+    Isys = state.system_current(comps)
+    best = state.power(Isys)
+    swaps = 0
+    n_types = len(state.types)
+
+    for _ in range(max_passes):
+        improved = False
+        # Pairs of string compositions already checked without improvement in the current state
+        tried = set()
+        for i in range(len(comps)):
+            for j in range(i + 1, len(comps)):
+                ci, cj = comps[i], comps[j]
+                if ci == cj or (ci, cj) in tried:
+                    continue
+                tried.add((ci, cj))
+                for ni, nj in _swaps(ci, cj, n_types):
+                    I_new = Isys - state.current(ci) - state.current(cj) + state.current(ni) + state.current(nj)
+                    P_new = state.power(I_new)
+                    if P_new > best * (1 + tol):
+                        comps[i], comps[j] = ni, nj
+                        Isys, best = I_new, P_new
+                        swaps += 1
+                        improved = True
+                        tried.clear()
+                        break
+        if not improved:
+            break
+    return comps, best, swaps
+
+
+def _exact_mpp(prototypes, comps, types):
+    """System MPP of a layout with pvmismatch strings (CompositeSystem, sampled MPP as loss_calculator)."""
+    signatures = [tuple(t for t, n in zip(types, comp) for _ in range(n)) for comp in comps]
+    return system_mpp(CompositeSystem(prototypes, signatures))
+
+
+def optimise_strings(prototypes, layout=None, pool=None, num_strings=None, refine="parabolic", max_passes=50,
+                     tol=1e-9, verbose=True):
+    """
+    Reconfigure modules across strings to maximise the system MPP.
+
+    Parameters:
+      - prototypes (dict): {type_id: PVmodule} (e.g. excel_tool "H", "L1".."L6" or sys_mismatched "H", "D")
+      - layout: current assignment, one signature (tuple of type IDs) per string; gives pool and topology
+      - pool (dict): {type_id: count} if no layout is given, together with num_strings
+      - refine: MPP used as the search objective; "parabolic" (smooth in the layout, see refine_mpp) or None
+      - max_passes: maximum local-search passes over all string pairs
+      - tol: minimum relative MPP gain for a swap to be accepted
+
+    Returns dict with "layout" (optimised signatures, sorted by type within a string), "compositions"
+    ({type_id: count} per string), exact MPPs "Pmp_initial" (layout, if given), "Pmp_greedy", "Pmp_optimised",
+    "gain_W" / "gain_percent" (vs initial, else vs greedy), "swaps", "evaluations" and "elapsed_s".
+    """
+    start = time.time()
+    if layout is not None:
+        layout = [tuple(sig) for sig in layout]
+        num_strings = len(layout)
+        pool = Counter(t for sig in layout for t in sig)
+        if len({len(sig) for sig in layout}) != 1:
+            raise ValueError("All strings in the layout must have the same number of modules.")
+    if pool is None or not num_strings:
+        raise ValueError("Give a layout, or a pool of module counts and num_strings.")
+    pool = {t: int(n) for t, n in pool.items() if int(n) > 0}
+    missing = set(pool) - set(prototypes)
+    if missing:
+        raise ValueError(f"Unknown module type(s) in pool: {sorted(missing)}")
+    total = sum(pool.values())
+    if total % num_strings:
+        raise ValueError(f"{total} modules cannot be split evenly into {num_strings} strings.")
+    mods_per_string = total // num_strings
+
+    types = sorted(pool, key=str)
+    curves = {t: curve_from_module(prototypes[t]) for t in types}
+    imp = {}
+    for t, c in curves.items():
+        k = int(np.argmax(c["I"] * c["V"]))
+        imp[t] = float(c["I"][k])
+    pvconst = prototypes[types[0]].pvconst
+    state = _SwapState(curves, types, mods_per_string, pvconst, refine)
+
+    # Greedy start; a given layout competes as a starting point too
+    starts = {"greedy": _greedy_layout(pool, imp, num_strings, mods_per_string, types)}
+    if layout is not None:
+        starts["initial"] = [tuple(Counter(sig).get(t, 0) for t in types) for sig in layout]
+
+    # Search from every start; the exact (pvmismatch) MPP picks the result, so it is never worse than the input
+    candidates = []
+    for name, comps in starts.items():
+        found, _, n_swaps = _local_search(state, comps, max_passes, tol)
+        candidates.append((_exact_mpp(prototypes, found, types), found, n_swaps))
+    exact = {name: _exact_mpp(prototypes, comps, types) for name, comps in starts.items()}
+    if layout is not None:
+        candidates.append((exact["initial"], starts["initial"], 0))
+    Pmp_best, best_comps, swaps = max(candidates, key=lambda c: c[0])
+
+    result = {
+        "layout": [tuple(t for t, n in zip(types, comp) for _ in range(n)) for comp in best_comps],
+        "compositions": [{t: n for t, n in zip(types, comp) if n} for comp in best_comps],
+        "Pmp_initial": exact.get("initial"),
+        "Pmp_greedy": exact["greedy"],
+        "Pmp_optimised": Pmp_best,
+        "swaps": swaps,
+        "evaluations": state.evaluations,
+    }
+    reference = result["Pmp_initial"] if layout is not None else result["Pmp_greedy"]
+    result["gain_W"] = result["Pmp_optimised"] - reference
+    result["gain_percent"] = 100.0 * result["gain_W"] / reference if reference else 0.0
+    result["elapsed_s"] = time.time() - start
+    if verbose:
+        print(f"[optimise_strings] {num_strings} strings x {mods_per_string} modules: "
+              f"{reference:.1f} W -> {result['Pmp_optimised']:.1f} W ({result['gain_percent']:+.3f} %), "
+              f"{swaps} swaps, {state.evaluations} evaluations in {timedelta(seconds=result['elapsed_s'])}")
+    return result
@@ -3,299 +3,679 @@
 
 from __future__ import annotations
 
+import hashlib
+import os
+import shutil
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta
 from pathlib import Path
 import json
 import numpy as np
 
 from pvmismatch.pvmismatch_lib import pvstring
-from sys_mismatched import create_mismatched_parametric, create_mismatched_multimodal
-from sys_mismatch_calculator import loss_calculator
+from sys_mismatched import (create_mismatched_parametric, create_mismatched_multimodal, string_prototypes,
+                            series_curves, SeriesString)
+from sys_mismatch_calculator import (LOSS_RTOL, loss_calculator, loss_metrics_batch, mpp_from_curve, refine_mpp,
+                                    string_mpp_table)
 
 
-def save_parametric_discrete_modal(*, resolution: int = 30, degradation_mode: int, deg_label: str,
-                                   system_healthy, mod_healthy, mod_deg):
-    """Compute and save parametric mismatch data for later plotting.
+def adaptive_voltage_grid(V_curves, I_curves, num_points=101, floor=0.2, mpp_share=0.4):
+    """Non-uniform voltage grid shared by a family of I-V curves.
+
+    Candidate nodes are the union of every curve's own voltage samples. Nodes are chosen at equal steps of
+    a cumulative measure mixing three shares:
+      - floor: uniform in voltage (flat segments keep a few points)
+      - mpp_share: uniform over the band spanned by the curves' MPP voltages (the knee region where
+        every mixture of the curves has its MPP)
+      - the rest: I-V turning angle summed over curves (knees and bypass-diode steps)
 
     Parameters:
-      resolution: 1, 5, 10, or 30 (step for affected strings axis)
-      degradation_mode: scenario identifier used for output folder naming
-      deg_label: formatted label stored in metadata
-      system_healthy: pre-built healthy system object (from sys_simulate)
-      mod_healthy: healthy module object
-      mod_deg: degraded module object for this degradation_mode
+      V_curves, I_curves: sequences of 1D arrays (voltages non-decreasing, as returned by pvmismatch)
+      num_points: grid size (at most the number of candidate nodes)
+      floor, mpp_share: measure shares described above
 
-    Saves:
-      results/mode_{degradation_mode}/surface_res{resolution}.npz
-      results/mode_{degradation_mode}/surface_res{resolution}.metadata.json
+    Returns:
+      V_grid: (points,) increasing voltages
     """
+    pool = np.unique(np.concatenate([np.ravel(v) for v in V_curves]))
+    if num_points >= len(pool):
+        return pool
+    I_pool = np.array([np.interp(pool, np.ravel(v), np.ravel(i)) for v, i in zip(V_curves, I_curves)])
+
+    # Turning angle of each curve at each node, in coordinates normalised by the curve family's span
+    v_n = (pool - pool[0]) / (pool[-1] - pool[0])
+    i_span = max(float(np.ptp(I_pool)), 1e-12)
+    angle = np.arctan2(np.diff(I_pool / i_span, axis=1), np.diff(v_n))
+    turning = np.zeros(len(pool))
+    turning[1:-1] = np.abs(np.diff(angle, axis=1)).sum(axis=0)
+    turning = np.cumsum(turning) / max(turning.sum(), 1e-12)
+
+    # MPP band, widened by one candidate node on each side
+    k_mpp = np.argmax(I_pool * pool, axis=1)
+    lo, hi = max(int(k_mpp.min()) - 1, 0), min(int(k_mpp.max()) + 1, len(pool) - 1)
+    band = np.clip((pool - pool[lo]) / max(pool[hi] - pool[lo], 1e-12), 0.0, 1.0)
+
+    measure = floor * v_n + mpp_share * band + (1.0 - floor - mpp_share) * turning
+    idx = np.searchsorted(measure, np.linspace(0.0, measure[-1], num_points))
+    idx = np.unique(np.clip(idx, 0, len(pool) - 1))
+    # Fill up to num_points where several targets landed on the same node
+    if len(idx) < num_points:
+        spare = np.setdiff1d(np.arange(len(pool)), idx)
+        gaps = np.diff(measure)[np.clip(spare - 1, 0, len(pool) - 2)]
+        idx = np.union1d(idx, spare[np.argsort(gaps)[::-1][:num_points - len(idx)]])
+    return pool[idx]
+
+
+def sweep_axes(*, resolution=30, total_strings=150, mods_per_string=30, n_values=None, k_values=None):
+    """K, N meshgrids of a parametric sweep (rows: affected strings N, columns: degraded modules K).
 
-    if resolution not in (1, 5, 10, 30):
-        raise ValueError("Invalid resolution value. Must be 1, 5, 10 or 30.")
-
-    start = time.time()
-
-    # Grid setup
-    k_grid_vals = np.arange(0, 31, 1)              # degraded modules per affected string
-    str_grid_vals = np.arange(0, 151, resolution)  # number of affected strings
-    K, N = np.meshgrid(k_grid_vals, str_grid_vals)
-
-    # Allocate result arrays
-    Z_W = np.zeros_like(K, dtype=float)
-    Z_pct = np.zeros_like(K, dtype=float)
-
-    # Cubes for system I-V-P curves
-    num_rows, num_cols = N.shape
-    num_points = len(system_healthy.Vsys)
-    Vsys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-    Isys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-    Psys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-
-    # Discover metrics and establish healthy baselines
-    _probe_sys = create_mismatched_parametric(min_degraded_modules=0, num_degraded_strings=0,
-                                              module_healthy=mod_healthy, module_degraded=mod_deg)
-    _probe_rep = loss_calculator(_probe_sys, system_healthy)
-    metric_keys = list(_probe_rep.keys())
-    metric_surfaces = {k: np.zeros((num_rows, num_cols), dtype=float) for k in metric_keys}
-
-    Pmods_healthy = float(_probe_rep["module_MPPs_sum_healthy"])
-    Pstrs_healthy = float(_probe_rep["string_MPPs_sum_healthy"])
-    Psys_healthy = float(_probe_rep["system_MPP_healthy"])
-
-    # Precompute string prototypes for k = 0..30
-    proto = {}
-    for k_local in range(0, 31):
-        mods = [mod_deg] * k_local + [mod_healthy] * (30 - k_local)
-        s = pvstring.PVstring(pvmods=mods)
-        Istr_k, Vstr_k, Pstr_k = s.Istring, s.Vstring, s.Pstring
-        idx_s = int(np.argmax(Pstr_k))
-        Pmp_str_k = float(Pstr_k[idx_s])
-        sum_mods_mpp_k = 0.0
-        for m in s.pvmods:
-            idx_m = int(np.argmax(m.Pmod))
-            sum_mods_mpp_k += float(m.Pmod[idx_m])
-        proto[k_local] = {"V": Vstr_k, "I": Istr_k, "P": Pstr_k,
-                          "Pmp_str": Pmp_str_k, "sum_mods_mpp": sum_mods_mpp_k}
-
-    # Ensure common voltage grid
-    V_ref = proto[0]["V"]
-    for k_local in range(1, 31):
-        if len(proto[k_local]["V"]) != len(V_ref) or not np.allclose(proto[k_local]["V"], V_ref, rtol=1e-10, atol=1e-10):
-            proto[k_local]["I"] = np.interp(V_ref, proto[k_local]["V"], proto[k_local]["I"])
-            proto[k_local]["P"] = V_ref * proto[k_local]["I"]
-            proto[k_local]["V"] = V_ref
-
-    # Build cubes/surfaces analytically (no full system construction)
-    total_strings = 150
-    for i in range(N.shape[0]):  # over affected strings
-        n = int(N[i, 0])
-        for j in range(K.shape[1]):  # over degraded modules per string
-            k = int(K[i, j])
+    Parameters:
+      resolution: step of the affected-strings axis 0..total_strings (used when n_values is None)
+      total_strings: strings in the system
+      mods_per_string: modules per string (K axis is 0..mods_per_string when k_values is None)
+      n_values, k_values: explicit axis vectors (integers, sorted and de-duplicated)
 
-            Ik = proto[k]["I"]
-            I0 = proto[0]["I"]
-            V = V_ref
-
-            Isys_ij = n * Ik + (total_strings - n) * I0
-            Vsys_ij = V
-            Psys_ij = Vsys_ij * Isys_ij
-
-            idx_sys = int(np.argmax(Psys_ij))
-            Psys_actual = float(Psys_ij[idx_sys])
-
-            Pmods_actual = n * proto[k]["sum_mods_mpp"] + (total_strings - n) * proto[0]["sum_mods_mpp"]
-            Pstrs_actual = n * proto[k]["Pmp_str"] + (total_strings - n) * proto[0]["Pmp_str"]
-
-            mismatch_mods_to_strs = Pmods_actual - Pstrs_actual
-            mismatch_strs_to_sys = Pstrs_actual - Psys_actual
-            mismatch_total = mismatch_mods_to_strs + mismatch_strs_to_sys
-
-            loss_mods = Pmods_healthy - Pmods_actual
-            loss_strs = Pstrs_healthy - Pstrs_actual
-            loss_sys = Psys_healthy - Psys_actual
-
-            num_strs_affected = 150
-            percent_loss = percent_mismatch_total = percent_degradation = 0.0
-            percent_mismatch_to_loss = percent_degradation_to_loss = 0.0
-            percent_mismatch_strs_to_sys = percent_mismatch_mods_to_strs = 0.0
-            percent_mismatch_strs_norm = percent_mismatch_strs_norm_vs_loss = 0.0
-            if loss_sys != 0 and Psys_healthy != 0:
-                loss_degradation = (loss_sys - mismatch_total)
-                percent_loss = 100.0 * (1 - Psys_actual / Psys_healthy)
-                percent_mismatch_total = 100.0 * mismatch_total / Psys_healthy
-                percent_degradation = 100.0 * loss_degradation / Psys_healthy
-                percent_mismatch_to_loss = 100.0 * mismatch_total / loss_sys
-                percent_degradation_to_loss = 100.0 * loss_degradation / loss_sys
-                percent_mismatch_strs_to_sys = 100.0 * mismatch_strs_to_sys / Psys_healthy
-                percent_mismatch_mods_to_strs = 100.0 * mismatch_mods_to_strs / Psys_healthy
-                denom_strs = (Pstrs_healthy / num_strs_affected)
-                denom_loss_strs = (loss_strs / num_strs_affected) if num_strs_affected != 0 else 0.0
-                if denom_strs != 0:
-                    percent_mismatch_strs_norm = 100.0 * mismatch_mods_to_strs / denom_strs
-                if denom_loss_strs != 0:
-                    percent_mismatch_strs_norm_vs_loss = 100.0 * (mismatch_mods_to_strs / denom_loss_strs)
-            else:
-                loss_degradation = (loss_sys - mismatch_total)
-
-            Z_W[i, j] = mismatch_total
-            Z_pct[i, j] = percent_mismatch_total
-
-            Vsys_cube[i, j, :] = Vsys_ij
-            Isys_cube[i, j, :] = Isys_ij
-            Psys_cube[i, j, :] = Psys_ij
-
-            metric_surfaces["module_MPPs_sum_degraded"][i, j] = Pmods_actual
-            metric_surfaces["module_MPPs_sum_healthy"][i, j] = Pmods_healthy
-            metric_surfaces["string_MPPs_sum_degraded"][i, j] = Pstrs_actual
-            metric_surfaces["string_MPPs_sum_healthy"][i, j] = Pstrs_healthy
-            metric_surfaces["system_MPP_degraded"][i, j] = Psys_actual
-            metric_surfaces["system_MPP_healthy"][i, j] = Psys_healthy
-            metric_surfaces["total_module_loss"][i, j] = loss_mods
-            metric_surfaces["total_string_loss"][i, j] = loss_strs
-            metric_surfaces["total_system_loss"][i, j] = loss_sys
-            metric_surfaces["mismatch_modules_to_strings"][i, j] = mismatch_mods_to_strs
-            metric_surfaces["mismatch_strings_to_system"][i, j] = mismatch_strs_to_sys
-            metric_surfaces["mismatch_total"][i, j] = mismatch_total
-            metric_surfaces["degradation_only"][i, j] = loss_degradation
-            metric_surfaces["percent_loss"][i, j] = percent_loss
-            metric_surfaces["percent_degradation_to_loss"][i, j] = percent_degradation_to_loss
-            metric_surfaces["percent_mismatch_to_loss"][i, j] = percent_mismatch_to_loss
-            metric_surfaces["percent_degradation"][i, j] = percent_degradation
-            metric_surfaces["percent_mismatch_total"][i, j] = percent_mismatch_total
-            metric_surfaces["percent_mismatch_strs_to_sys"][i, j] = percent_mismatch_strs_to_sys
-            metric_surfaces["percent_mismatch_mods_to_strs"][i, j] = percent_mismatch_mods_to_strs
-            metric_surfaces["percent_mismatch_strs_norm"][i, j] = percent_mismatch_strs_norm
-            metric_surfaces["percent_mismatch_strs_norm_vs_loss"][i, j] = percent_mismatch_strs_norm_vs_loss
+    Returns:
+      K, N: (len(n_values), len(k_values)) integer grids
+    """
+    if int(total_strings) < 1 or int(mods_per_string) < 1:
+        raise ValueError("total_strings and mods_per_string must be >= 1.")
+    if n_values is None:
+        if int(resolution) < 1:
+            raise ValueError("Invalid resolution value. Must be a positive integer.")
+        n_values = np.arange(0, total_strings + 1, int(resolution))
+    if k_values is None:
+        k_values = np.arange(0, mods_per_string + 1)
+    axes = []
+    for name, vals, upper in (("n_values", n_values, total_strings), ("k_values", k_values, mods_per_string)):
+        vals = np.unique(np.asarray(vals, dtype=int))
+        if vals.size == 0 or vals[0] < 0 or vals[-1] > upper:
+            raise ValueError(f"{name} must be a non-empty set of integers in 0..{upper}.")
+        axes.append(vals)
+    n_values, k_values = axes
+    K, N = np.meshgrid(k_values, n_values)
+    return K, N
+
+
+def _check_topology(system_healthy, total_strings, mods_per_string):
+    """Raise if a healthy reference system does not have the requested strings x modules layout."""
+    if system_healthy is None:
+        return
+    n_str = len(system_healthy.pvstrs)
+    n_mods = {len(pvstr.pvmods) for pvstr in system_healthy.pvstrs}
+    if n_str != total_strings or n_mods != {int(mods_per_string)}:
+        raise ValueError(f"system_healthy has {n_str} strings x {sorted(n_mods)} modules, "
+                         f"expected {total_strings} x {mods_per_string}.")
+
+
+def _string_prototypes(mod_healthy, mod_deg, mods_per_string=30, refine=None, grid_points=None, series_kernel=False):
+    """Build string prototypes with k = 0..mods_per_string degraded modules.
+
+    All curves are interpolated onto a common voltage grid so that system currents can be summed directly:
+    the healthy (k=0) string voltage grid, or an adaptive_voltage_grid(grid_points) built from all
+    string curves if grid_points is given.
+
+    Returns:
+      V_ref: (points,) common voltage grid
+      I_k: (mods_per_string + 1, points) string currents on V_ref
+      Pmp_str_k: (mods_per_string + 1,) string MPPs
+      sum_mods_mpp_k: (mods_per_string + 1,) sum of module MPPs per string
+
+    refine: None (sampled MPPs) or "parabolic" (see sys_mismatch_calculator.refine_mpp)
+    series_kernel: build the string curves with sys_mismatched.series_curves instead of PVstring objects
+    """
+    strings = string_prototypes(mod_healthy, mod_deg, mods_per_string, series_kernel=series_kernel)
+    V_ref = None
+    if grid_points is not None:
+        V_ref = adaptive_voltage_grid([s.Vstring for s in strings], [s.Istring for s in strings],
+                                      num_points=grid_points)
+    I_k = []
+    for s in strings:
+        V, I = s.Vstring, s.Istring
+        if V_ref is None:
+            V_ref = V
+        elif len(V) != len(V_ref) or not np.allclose(V, V_ref, rtol=1e-10, atol=1e-10):
+            I = np.interp(V_ref, V, I)
+        I_k.append(I)
+    Pmp_str_k, sum_mods_mpp_k = string_mpp_table(strings, refine)
+
+    return V_ref, np.asarray(I_k), Pmp_str_k, sum_mods_mpp_k
+
+
+# --- Surface archive I/O ---
+# Format v1 stored full (N x K x points) Vsys/Isys/Psys cubes.
+# Format v2 stores a single voltage axis "Vsys" plus "Isys_cube"; Vsys/Psys cubes are rebuilt on load.
+# Layouts: "npz" (single compressed archive) or "npy" (one raw .npy per array, memory-mapped on load).
+SURFACE_FORMAT_VERSION = 2
+SURFACE_LAYOUTS = ("npz", "npy")
+
+
+def _surface_dir(degradation_mode):
+    """Output folder for a degradation mode (relative to the working directory)."""
+    return Path("results") / f"mode_{degradation_mode}"
+
+
+def surface_stem(resolution, total_strings=150, mods_per_string=30, n_values=None, k_values=None):
+    """
+    File stem of a saved surface: "surface_res{resolution}" for the default sweep (150 x 30, N axis
+    0..150 step resolution, K axis 0..30), otherwise "surface_res{resolution}_{strings}x{modules}_{hash}"
+    where the hash covers the N/K axis values (so sweeps with other axes never overwrite each other).
+    """
+    K, N = sweep_axes(resolution=resolution, total_strings=total_strings, mods_per_string=mods_per_string,
+                      n_values=n_values, k_values=k_values)
+    if int(total_strings) == 150 and int(mods_per_string) == 30 and int(resolution) >= 1:
+        K_default, N_default = sweep_axes(resolution=resolution)
+        if np.array_equal(K, K_default) and np.array_equal(N, N_default):
+            return f"surface_res{resolution}"
+    axes = json.dumps({"n_values": N[:, 0].tolist(), "k_values": K[0].tolist()})
+    axes_hash = hashlib.sha1(axes.encode("utf-8")).hexdigest()[:8]
+    return f"surface_res{resolution}_{int(total_strings)}x{int(mods_per_string)}_{axes_hash}"
+
+
+def locate_surface(out_dir, resolution, *, total_strings=150, mods_per_string=30, n_values=None, k_values=None):
+    """
+    Return (data_path, meta_path) for a saved surface of the given sweep (see surface_stem).
+    data_path is the .npz archive or, if the metadata manifest says layout="npy", the .npy store directory.
+    Raises ValueError if the saved metadata describes another sweep (resolution, topology or axes).
+    """
+    out_dir = Path(out_dir)
+    stem = surface_stem(resolution, total_strings, mods_per_string, n_values, k_values)
+    meta_path = out_dir / f"{stem}.metadata.json"
+    data_path = out_dir / f"{stem}.npz"
+    if meta_path.exists():
+        with open(meta_path, "r") as f:
+            metadata = json.load(f)
+        K, N = sweep_axes(resolution=resolution, total_strings=total_strings, mods_per_string=mods_per_string,
+                          n_values=n_values, k_values=k_values)
+        expected = {"resolution": resolution, "total_strings": int(total_strings),
+                    "mods_per_string": int(mods_per_string), "num_rows": N.shape[0], "num_cols": N.shape[1],
+                    "n_values": N[:, 0].tolist(), "k_values": K[0].tolist()}
+        # Surfaces saved before the axes were recorded only carry the shape
+        diff = {key: (metadata[key], value) for key, value in expected.items()
+                if key in metadata and metadata[key] != value}
+        if diff:
+            raise ValueError(f"{meta_path} describes another sweep, (saved, expected): {diff}")
+        if metadata.get("layout") == "npy":
+            data_path = out_dir / metadata.get("store_dir", stem)
+    return data_path, meta_path
+
+
+def _save_surface(*, degradation_mode, resolution, deg_label, K, N, V_ref, Isys_cube, metric_surfaces, notes,
+                  layout="npz", mpp_refine=None, voltage_grid="healthy_string", total_strings=150,
+                  mods_per_string=30):
+    """
+    Write a surface (format v2) and its metadata JSON to results/mode_{degradation_mode}/,
+    named by surface_stem (resolution, topology and axes).
 
-    elapsed = time.time() - start
-    print(f"\nParametric generation time: {timedelta(seconds=elapsed)}")
+    layout:
+      "npz": {stem}.npz (compressed, smallest on disk)
+      "npy": {stem}/<array>.npy (uncompressed, opened with mmap_mode='r' on load)
+    """
+    if layout not in SURFACE_LAYOUTS:
+        raise ValueError(f"Invalid layout '{layout}'. Must be one of {SURFACE_LAYOUTS}.")
 
-    # Save artifacts for this degradation mode
-    out_dir = Path("results") / f"mode_{degradation_mode}"
+    out_dir = _surface_dir(degradation_mode)
     out_dir.mkdir(parents=True, exist_ok=True)
-    npz_path = out_dir / f"surface_res{resolution}.npz"
-    meta_path = out_dir / f"surface_res{resolution}.metadata.json"
+    stem = surface_stem(resolution, total_strings, mods_per_string, N[:, 0], K[0])
+    meta_path = out_dir / f"{stem}.metadata.json"
 
-    savez_payload = {
+    num_rows, num_cols = N.shape
+    payload = {
         "K": K.astype(np.int16),
         "N": N.astype(np.int16),
-        "Vsys_cube": Vsys_cube.astype(np.float32),
+        "Vsys": np.asarray(V_ref).astype(np.float32),
         "Isys_cube": Isys_cube.astype(np.float32),
-        "Psys_cube": Psys_cube.astype(np.float32),
-        "mismatch_total_W": Z_W.astype(np.float32),
-        "percent_mismatch_total": Z_pct.astype(np.float32),
+        "mismatch_total_W": metric_surfaces["mismatch_total"].astype(np.float32),
+        "percent_mismatch_total": metric_surfaces["percent_mismatch_total"].astype(np.float32),
     }
     for kname, arr in metric_surfaces.items():
-        savez_payload[f"metric_{kname}"] = arr.astype(np.float32)
-
-    np.savez_compressed(npz_path, **savez_payload)
+        payload[f"metric_{kname}"] = arr.astype(np.float32)
 
     metadata = {
+        "format_version": SURFACE_FORMAT_VERSION,
+        "layout": layout,
         "degradation_mode": degradation_mode,
         "deg_label": deg_label,
         "resolution": resolution,
         "num_rows": int(num_rows),
         "num_cols": int(num_cols),
-        "num_points": int(num_points),
-        "arrays": sorted(list(savez_payload.keys())),
+        "num_points": int(len(V_ref)),
+        "total_strings": int(total_strings),
+        "mods_per_string": int(mods_per_string),
+        "n_values": N[:, 0].astype(int).tolist(),
+        "k_values": K[0].astype(int).tolist(),
+        "arrays": sorted(list(payload.keys())),
+        "derived_arrays": ["Psys_cube", "Vsys_cube"],
         "units": {
+            "Vsys": "V",
             "Vsys_cube": "V",
             "Isys_cube": "A",
             "Psys_cube": "W",
             "mismatch_total_W": "W",
             "percent_mismatch_total": "%",
         },
-        "notes": "All arrays are float32 except K/N (int16). Shapes: curves (N x K x num_points), metrics (N x K).",
+        "mpp_refine": mpp_refine,
+        "voltage_grid": voltage_grid,
+        "notes": notes,
     }
+
+    if layout == "npz":
+        np.savez_compressed(out_dir / f"{stem}.npz", **payload)
+    else:
+        store_dir = out_dir / stem
+        store_dir.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for kname, arr in payload.items():
+            np.save(store_dir / f"{kname}.npy", arr)
+            files[kname] = {"file": f"{kname}.npy", "dtype": str(arr.dtype), "shape": list(arr.shape)}
+        # Manifest: the metadata JSON doubles as the index of the .npy store
+        metadata["store_dir"] = store_dir.name
+        metadata["files"] = files
+
     with open(meta_path, "w") as f:
         json.dump(metadata, f, indent=2)
 
 
+class SurfaceArchive:
+    """
+    Read-only view of a saved surface with the same interface as np.load's NpzFile
+    (`files`, `[key]`, `in`, context manager).
+
+    - path to a .npz file: arrays are inflated on access (np.load).
+    - path to a .npy store directory: each array is memory-mapped on first access (mmap_mode='r').
+
+    Format v2 surfaces expose "Vsys_cube" and "Psys_cube" as derived arrays (built on first access).
+    Format v1 archives are passed through and additionally expose "Vsys".
+    """
+
+    _DERIVED = ("Vsys", "Vsys_cube", "Psys_cube")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._derived = {}
+        self._mapped = {}
+        if self.path.is_dir():
+            self._npz = None
+            stored = sorted(p.stem for p in self.path.glob("*.npy"))
+        else:
+            self._npz = np.load(self.path)
+            stored = list(self._npz.files)
+        self._stored = stored
+        self.format_version = 2 if ("Vsys" in stored and "Psys_cube" not in stored) else 1
+        has_curves = "Isys_cube" in stored and ("Vsys" in stored or "Vsys_cube" in stored)
+        extra = [k for k in self._DERIVED if k not in stored] if has_curves else []
+        self.files = stored + extra
+
+    def __contains__(self, key):
+        return key in self.files
+
+    def _read(self, key):
+        if self._npz is not None:
+            return self._npz[key]
+        if key not in self._mapped:
+            self._mapped[key] = np.load(self.path / f"{key}.npy", mmap_mode="r")
+        return self._mapped[key]
+
+    def __getitem__(self, key):
+        if key in self._stored:
+            return self._read(key)
+        if key not in self.files:
+            raise KeyError(f"{key} is not a file in the archive")
+        if key not in self._derived:
+            if key == "Vsys":
+                # v1: every cell shares the same voltage axis
+                self._derived[key] = np.asarray(self._read("Vsys_cube")[0, 0, :])
+            elif key == "Vsys_cube":
+                shape = self._read("Isys_cube").shape
+                self._derived[key] = np.broadcast_to(self["Vsys"], shape)
+            else:  # Psys_cube
+                self._derived[key] = self["Vsys"] * self._read("Isys_cube")
+        return self._derived[key]
+
+    def close(self):
+        self._derived.clear()
+        self._mapped.clear()
+        if self._npz is not None:
+            self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_surface(path) -> SurfaceArchive:
+    """Open a saved surface (.npz archive or .npy store directory, any format version)."""
+    return SurfaceArchive(path)
+
+
+def prototype_baselines(V_ref, I_0, Pmp_str_0, sum_mods_mpp_0, total_strings=150, refine=None):
+    """
+    Scalar healthy reference outputs (module/string/system MPP sums) from the healthy (k=0) string prototype.
+
+    The healthy system is total_strings healthy strings on the same voltage grid and with the same MPP method
+    as the degraded rows, so the N=0 / K=0 cells have exactly zero loss (a separately solved PVsystem has its
+    own grid and would shift every loss by the grid/refine difference).
+    """
+    Isys = total_strings * np.asarray(I_0, dtype=float)
+    Psys = mpp_from_curve(Isys, V_ref, V_ref * Isys, refine=refine)[0]
+    return {
+        "Pmods_healthy": float(total_strings * sum_mods_mpp_0),
+        "Pstrs_healthy": float(total_strings * Pmp_str_0),
+        "Psys_healthy": float(Psys),
+    }
+
+
+def check_losses(metric_surfaces, K, N):
+    """
+    Sanity check of a metric surface: the all-healthy cells (N=0 or K=0) must have zero loss and no cell
+    may gain power over the healthy system (beyond float noise, see snap_loss).
+    """
+    loss = np.asarray(metric_surfaces["total_system_loss"], dtype=float)
+    Psys_healthy = np.asarray(metric_surfaces["system_MPP_healthy"], dtype=float)
+    tol = LOSS_RTOL * np.abs(Psys_healthy)
+    healthy = (np.asarray(N) == 0) | (np.asarray(K) == 0)
+    if np.any(np.abs(loss[healthy]) > tol[healthy]):
+        raise ValueError(f"Healthy cells (N=0 or K=0) have a non-zero system loss "
+                         f"(max |loss| {np.abs(loss[healthy]).max():.3g} W); the healthy baseline does not "
+                         f"match the rows' voltage grid / MPP method.")
+    if np.any(loss < -tol):
+        raise ValueError(f"Negative system loss {loss.min():.3g} W (degraded system above the healthy baseline).")
+
+
+def save_parametric_discrete_modal(*, resolution: int = 30, degradation_mode: int, deg_label: str,
+                                   system_healthy=None, mod_healthy, mod_deg, layout: str = "npz",
+                                   refine=None, grid_points=None, total_strings: int = 150,
+                                   mods_per_string: int = 30, n_values=None, k_values=None, series_kernel=False):
+    """Compute and save parametric mismatch data for later plotting.
+
+    Parameters:
+      resolution: step for the affected strings axis (also names the output files)
+      degradation_mode: scenario identifier used for output folder naming
+      deg_label: formatted label stored in metadata
+      system_healthy: optional pre-built healthy system object (from sys_simulate), only used to check the topology;
+        the healthy baselines come from the healthy string prototype (see prototype_baselines)
+      mod_healthy: healthy module object
+      mod_deg: degraded module object for this degradation_mode
+      layout: "npz" (compressed archive) or "npy" (memory-mappable store, one file per array)
+      refine: None (sampled MPPs) or "parabolic" sub-sample MPPs for systems, strings and modules
+      grid_points: None (healthy string voltage grid) or target size of an adaptive voltage grid
+        concentrated at the knee/MPP and bypass steps (see adaptive_voltage_grid)
+      total_strings, mods_per_string: system topology (150 x 30 by default; must match system_healthy)
+      n_values, k_values: explicit N/K axis vectors instead of 0..total_strings step resolution / 0..mods_per_string
+      series_kernel: build the 31 string prototypes in one sys_mismatched.series_curves call (no PVstring objects)
+
+    Saves:
+      results/mode_{degradation_mode}/{stem}.npz (or {stem}/*.npy)
+      results/mode_{degradation_mode}/{stem}.metadata.json
+      with stem = surface_stem(...), "surface_res{resolution}" for the default 150 x 30 sweep
+    """
+
+    start = time.time()
+
+    # Grid setup (rows: affected strings, columns: degraded modules per affected string)
+    K, N = sweep_axes(resolution=resolution, total_strings=total_strings, mods_per_string=mods_per_string,
+                      n_values=n_values, k_values=k_values)
+    _check_topology(system_healthy, total_strings, mods_per_string)
+
+    # String prototypes for k = 0..mods_per_string on a common voltage grid
+    V_ref, I_k, Pmp_str_k, sum_mods_mpp_k = _string_prototypes(mod_healthy, mod_deg, mods_per_string,
+                                                               refine=refine, grid_points=grid_points,
+                                                               series_kernel=series_kernel)
+
+    # Healthy baselines on the same grid and with the same MPP method as the rows
+    baselines = prototype_baselines(V_ref, I_k[0], Pmp_str_k[0], sum_mods_mpp_k[0], total_strings, refine)
+    Pmods_healthy = baselines["Pmods_healthy"]
+    Pstrs_healthy = baselines["Pstrs_healthy"]
+    Psys_healthy = baselines["Psys_healthy"]
+
+    # Build the whole (N x K x points) current cube in one broadcast (no full system construction)
+    n_healthy = total_strings - N
+    Isys_cube = N[..., None] * I_k[K] + n_healthy[..., None] * I_k[0]
+    Psys_cube = V_ref * Isys_cube
+
+    # System MPPs with a single argmax along the curve axis (optionally refined between samples)
+    if refine is None:
+        idx_sys = np.argmax(Psys_cube, axis=-1)
+        Psys_actual = np.take_along_axis(Psys_cube, idx_sys[..., None], axis=-1)[..., 0]
+    else:
+        Psys_actual, _, _ = refine_mpp(Isys_cube, V_ref, Psys_cube, method=refine)
+
+    Pmods_actual = N * sum_mods_mpp_k[K] + n_healthy * sum_mods_mpp_k[0]
+    Pstrs_actual = N * Pmp_str_k[K] + n_healthy * Pmp_str_k[0]
+
+    metric_surfaces = loss_metrics_batch(Psys_actual, Pmods_actual, Pstrs_actual,
+                                         Pmods_healthy, Pstrs_healthy, Psys_healthy,
+                                         num_strs_affected=total_strings)
+    check_losses(metric_surfaces, K, N)
+
+    elapsed = time.time() - start
+    print(f"\nParametric generation time: {timedelta(seconds=elapsed)}")
+
+    # Save artifacts for this degradation mode
+    _save_surface(degradation_mode=degradation_mode, resolution=resolution, deg_label=deg_label,
+                  K=K, N=N, V_ref=V_ref, Isys_cube=Isys_cube, metric_surfaces=metric_surfaces,
+                  notes="All arrays are float32 except K/N (int16). Shapes: Vsys (num_points), "
+                        "Isys_cube (N x K x num_points), metrics (N x K). "
+                        "Vsys_cube/Psys_cube are derived on load (Psys = Vsys * Isys).",
+                  layout=layout, mpp_refine=refine,
+                  voltage_grid="healthy_string" if grid_points is None else "adaptive",
+                  total_strings=total_strings, mods_per_string=mods_per_string)
+
+
+def _discrete_modal_worker(kwargs):
+    """Process-pool entry point: save one degradation mode and return its id."""
+    save_parametric_discrete_modal(**kwargs)
+    return kwargs["degradation_mode"]
+
+
+def save_parametric_modes(*, degraded_modes, resolution: int = 30, system_healthy, mod_healthy,
+                          layout: str = "npz", max_workers=None, refine=None, grid_points=None,
+                          total_strings: int = 150, mods_per_string: int = 30, n_values=None, k_values=None,
+                          series_kernel=False):
+    """Save discrete-modal surfaces for several degradation modes in parallel.
+
+    Each worker only receives the healthy and degraded module prototypes (no full systems are pickled)
+    and derives its healthy baselines from its own string prototypes (see prototype_baselines).
+
+    Parameters:
+      degraded_modes: {degradation_mode: (mod_deg, deg_label)}
+      resolution: step for affected strings axis
+      system_healthy: pre-built healthy system object (topology check only)
+      mod_healthy: healthy module object
+      layout: "npz" or "npy", see _save_surface
+      max_workers: pool size; defaults to min(len(degraded_modes), os.cpu_count())
+      refine: None or "parabolic" MPP refinement (see save_parametric_discrete_modal)
+      grid_points: None or adaptive voltage grid size (see save_parametric_discrete_modal)
+      total_strings, mods_per_string, n_values, k_values: sweep topology/axes (see save_parametric_discrete_modal)
+      series_kernel: string curves from sys_mismatched.series_curves (see save_parametric_discrete_modal)
+
+    Saves:
+      results/mode_{m}/{surface_stem}.* for every m in degraded_modes
+    """
+    start = time.time()
+    _check_topology(system_healthy, total_strings, mods_per_string)
+    jobs = [dict(resolution=resolution, degradation_mode=int(m), deg_label=lbl,
+                 mod_healthy=mod_healthy, mod_deg=mod_deg, layout=layout, refine=refine,
+                 grid_points=grid_points, total_strings=total_strings, mods_per_string=mods_per_string,
+                 n_values=n_values, k_values=k_values, series_kernel=series_kernel)
+            for m, (mod_deg, lbl) in degraded_modes.items()]
+
+    if max_workers is None:
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+
+    done = []
+    if max_workers <= 1:
+        for job in jobs:
+            done.append(_discrete_modal_worker(job))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_discrete_modal_worker, job) for job in jobs]
+            for fut in as_completed(futures):
+                done.append(fut.result())
+
+    elapsed = time.time() - start
+    print(f"\nSaved modes {sorted(done)} in {timedelta(seconds=elapsed)} ({max_workers} workers)")
+    return sorted(done)
+
+
+# --- Row checkpoints (resumable generation) ---
+# Completed N-rows are written to <surface>.staging/row_XXXX.npz and listed in manifest.json.
+# The manifest stores a fingerprint of the inputs; staging from a different configuration is discarded.
+
+def _curve_fingerprint(config, modules):
+    """Hash of the sweep configuration and the module I-V curves it is built from."""
+    h = hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8"))
+    for m in modules:
+        h.update(np.ascontiguousarray(m.Imod, dtype=float).tobytes())
+        h.update(np.ascontiguousarray(m.Vmod, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def _staging_open(stage_dir, fingerprint, resume=True):
+    """Return the set of completed rows in stage_dir (starting a fresh staging area if needed)."""
+    stage_dir = Path(stage_dir)
+    manifest_path = stage_dir / "manifest.json"
+    if resume and manifest_path.exists():
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") == fingerprint:
+            return {int(i) for i in manifest.get("rows_done", []) if (stage_dir / f"row_{int(i):04d}.npz").exists()}
+        print(f"[staging] Inputs changed since last run, discarding {stage_dir}")
+    if stage_dir.exists():
+        shutil.rmtree(stage_dir)
+    stage_dir.mkdir(parents=True, exist_ok=True)
+    _staging_write_manifest(stage_dir, fingerprint, set())
+    return set()
+
+
+def _staging_write_manifest(stage_dir, fingerprint, rows_done):
+    tmp = Path(stage_dir) / "manifest.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"fingerprint": fingerprint, "rows_done": sorted(int(i) for i in rows_done)}, f, indent=2)
+    os.replace(tmp, Path(stage_dir) / "manifest.json")
+
+
+def _staging_save_row(stage_dir, fingerprint, rows_done, i, Isys_row, metric_row):
+    """Persist one completed row atomically, then record it in the manifest."""
+    stage_dir = Path(stage_dir)
+    tmp = stage_dir / f"row_{i:04d}.tmp.npz"
+    np.savez(tmp, Isys=Isys_row, **{f"metric_{k}": v for k, v in metric_row.items()})
+    os.replace(tmp, stage_dir / f"row_{i:04d}.npz")
+    rows_done.add(int(i))
+    _staging_write_manifest(stage_dir, fingerprint, rows_done)
+
+
+def _staging_load_row(stage_dir, i):
+    with np.load(Path(stage_dir) / f"row_{i:04d}.npz") as data:
+        Isys_row = data["Isys"]
+        metric_row = {k[len("metric_"):]: data[k] for k in data.files if k.startswith("metric_")}
+    return Isys_row, metric_row
+
+
 def save_parametric_multi_modal(*, resolution: int = 30, degradation_mode: int, deg_label: str,
-                                system_healthy, mod_healthy, modules_degraded_levels):
+                                system_healthy, mod_healthy, modules_degraded_levels, layout: str = "npz",
+                                checkpoint: bool = True, resume: bool = True, total_strings: int = 150,
+                                mods_per_string: int = 30, n_values=None, k_values=None, series_kernel=False,
+                                grid_points=None, refine=None):
     """
     Compute and save parametric mismatch data for the multimodal equal-spread pattern.
 
     Pattern (must match the system builder):
       - Within a string: first K modules degraded, cycling 1..L (wrap).
       - Across strings: per-string starting level offset advances by +1 per string (r = s_idx % L).
+
+    layout: "npz" (compressed archive) or "npy" (memory-mappable store), see _save_surface.
+    total_strings, mods_per_string, n_values, k_values: sweep topology/axes (see save_parametric_discrete_modal).
+    series_kernel: build all (K, offset) string prototypes in one sys_mismatched.series_curves call.
+    grid_points: None (healthy string voltage grid) or target size of an adaptive voltage grid built from all
+      (K, offset) string curves (see adaptive_voltage_grid); the healthy baselines use the same grid.
+    refine: None (sampled MPPs) or "parabolic" sub-sample MPPs for systems, strings and modules
+      (see save_parametric_discrete_modal).
+
+    Checkpointing: with checkpoint=True every completed N-row is written to
+    results/mode_{degradation_mode}/{surface_stem}.staging/ and listed in its manifest.json.
+    If a run dies, calling again with resume=True only computes the missing rows (as long as the
+    axes, module curves, series_kernel and voltage grid are unchanged). The staging area is removed once the surface is saved.
     """
-    if resolution not in (1, 5, 10, 30):
-        raise ValueError("Invalid resolution value. Must be 1, 5, 10 or 30.")
     if not modules_degraded_levels:
         raise ValueError("modules_degraded_levels must be a non-empty sequence of degraded PVmodule variants.")
 
     start = time.time()
 
     # Grid
-    k_grid_vals = np.arange(0, 31, 1)              # degraded modules per affected string
-    str_grid_vals = np.arange(0, 151, resolution)  # number of affected strings
-    K, N = np.meshgrid(k_grid_vals, str_grid_vals)
+    K, N = sweep_axes(resolution=resolution, total_strings=total_strings, mods_per_string=mods_per_string,
+                      n_values=n_values, k_values=k_values)
+    _check_topology(system_healthy, total_strings, mods_per_string)
 
     num_rows, num_cols = N.shape
 
-    # Allocate arrays
-    Z_W = np.zeros_like(K, dtype=float)
-    Z_pct = np.zeros_like(K, dtype=float)
+    # Metric keys follow loss_calculator (healthy vs healthy report gives the schema)
+    healthy_rep = loss_calculator(system_healthy, system_healthy)
+    metric_surfaces = {k: np.zeros((num_rows, num_cols), dtype=float) for k in healthy_rep.keys()}
 
-    # Discover metric keys by probing one configuration (schema compatibility)
-    from sys_mismatched import create_mismatched_parametric as _probe_param
-    probe_sys = _probe_param(min_degraded_modules=0, num_degraded_strings=0,
-                             module_healthy=mod_healthy, module_degraded=modules_degraded_levels[0])
-    probe_rep = loss_calculator(probe_sys, system_healthy)
-    metric_surfaces = {k: np.zeros((num_rows, num_cols), dtype=float) for k in probe_rep.keys()}
-
-    # System curve length
-    num_points = len(system_healthy.Vsys)
-    Vsys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-    Isys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-    Psys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
-
-    # -- Precompute single-string prototypes for k=0..30 and offsets r=0..L-1 --
-    total_strings = 150
-    mods_per_string = 30
+    # -- Precompute single-string prototypes for the K axis and offsets r=0..L-1 --
     levels = modules_degraded_levels
     L = len(levels)
 
-    def build_string_for(k_local: int, r_offset: int) -> pvstring.PVstring:
+    def modules_for(k_local: int, r_offset: int):
         # Match builder: first K degraded with cycling from r_offset; rest healthy
         pvmods = []
         for idx in range(k_local):
             lvl_idx = (r_offset + idx) % L
             pvmods.append(levels[lvl_idx])
         pvmods.extend([mod_healthy] * (mods_per_string - k_local))
-        return pvstring.PVstring(pvmods=pvmods)
-
-    # Healthy prototype (k=0)
-    s0 = build_string_for(0, 0)
-    V_ref = s0.Vstring
-    I0 = s0.Istring
-    P0 = s0.Pstring
-    Pmp_str_0 = float(P0[int(np.argmax(P0))])
-    sum_mods_mpp_0 = 0.0
-    for m in s0.pvmods:
-        pm = m.Pmod
-        sum_mods_mpp_0 += float(pm[int(np.argmax(pm))])
-
-    # Cache (k,r) on V_ref: string I/P curves and aggregates
+        return pvmods
+
+    keys = [(0, 0)] + [(k_local, r) for k_local in np.unique(K[0]).tolist() if k_local > 0 for r in range(L)]
+    kernel_strings = {}
+    if series_kernel:
+        # One batched series combination for every (k, r) composition
+        types = [mod_healthy] + list(levels)
+        counts = np.zeros((len(keys), len(types)), dtype=int)
+        for row, (k_local, r) in enumerate(keys):
+            counts[row, 0] = mods_per_string - k_local
+            for idx in range(k_local):
+                counts[row, 1 + (r + idx) % L] += 1
+        Istr, Vstr = series_curves(counts, types)
+        for row, key in enumerate(keys):
+            kernel_strings[key] = SeriesString(modules_for(*key), Istr[row], Vstr[row], mod_healthy.pvconst)
+
+    def build_string_for(k_local: int, r_offset: int):
+        if series_kernel:
+            return kernel_strings[(k_local, r_offset)]
+        return pvstring.PVstring(pvmods=modules_for(k_local, r_offset))
+
+    strings = {key: build_string_for(*key) for key in keys}
+
+    # Common voltage grid: the healthy (k=0) string grid or an adaptive grid over every prototype
+    if grid_points is None:
+        V_ref = strings[(0, 0)].Vstring
+    else:
+        V_ref = adaptive_voltage_grid([s.Vstring for s in strings.values()], [s.Istring for s in strings.values()],
+                                      num_points=grid_points)
+
+    # System curve length
+    num_points = len(V_ref)
+    Isys_cube = np.zeros((num_rows, num_cols, num_points), dtype=float)
+
+    # Cache (k,r): string currents on V_ref; string/module MPPs from each string's own curve (as _string_prototypes),
+    # so the voltage grid only affects the system curves
+    Pmp_str_keys, sum_mods_mpp_keys = string_mpp_table([strings[key] for key in keys], refine)
     proto_str = {}
-    for k_local in range(0, 31):
-        for r in range(L if k_local > 0 else 1):  # for k=0, only r=0 needed
-            s = build_string_for(k_local, r)
-            V = s.Vstring
-            I = s.Istring
-            P = s.Pstring
-            if len(V) != len(V_ref) or not np.allclose(V, V_ref, rtol=1e-10, atol=1e-10):
-                I = np.interp(V_ref, V, I)
-                P = V_ref * I
-            idx_s = int(np.argmax(P))
-            Pmp_str = float(P[idx_s])
-            sum_mods_mpp = 0.0
-            for m in s.pvmods:
-                pm = m.Pmod
-                sum_mods_mpp += float(pm[int(np.argmax(pm))])
-            proto_str[(k_local, r)] = {"I": I, "P": P, "Pmp_str": Pmp_str, "sum_mods_mpp": sum_mods_mpp}
+    for key, Pmp_str, sum_mods_mpp in zip(keys, Pmp_str_keys, sum_mods_mpp_keys):  # for k=0, only r=0 needed
+        s = strings[key]
+        V, I = s.Vstring, s.Istring
+        if len(V) != len(V_ref) or not np.allclose(V, V_ref, rtol=1e-10, atol=1e-10):
+            I = np.interp(V_ref, V, I)
+        proto_str[key] = {"I": I, "Pmp_str": float(Pmp_str), "sum_mods_mpp": float(sum_mods_mpp)}
+
+    # Healthy prototype (k=0) on V_ref
+    I0 = proto_str[(0, 0)]["I"]
+    Pmp_str_0 = proto_str[(0, 0)]["Pmp_str"]
+    sum_mods_mpp_0 = proto_str[(0, 0)]["sum_mods_mpp"]
 
     # Count per-offset strings among the first n strings (r advances +1 each string)
     def offset_counts(n: int, L: int) -> np.ndarray:
@@ -305,155 +685,98 @@ def save_parametric_multi_modal(*, resolution: int = 30, degradation_mode: int,
             c[:rem] += 1
         return c
 
-    # Healthy baselines
-    Pmods_healthy = float(probe_rep["module_MPPs_sum_healthy"])
-    Pstrs_healthy = float(probe_rep["string_MPPs_sum_healthy"])
-    Psys_healthy = float(probe_rep["system_MPP_healthy"])
-
-    # -- Aggregate across grid without constructing full systems --
-    for i in range(num_rows):             # over affected strings
+    # Healthy baselines from the same string prototype and grid as the rows (see prototype_baselines)
+    baselines = prototype_baselines(V_ref, I0, Pmp_str_0, sum_mods_mpp_0, total_strings, refine)
+    Pmods_healthy = baselines["Pmods_healthy"]
+    Pstrs_healthy = baselines["Pstrs_healthy"]
+    Psys_healthy = baselines["Psys_healthy"]
+
+    # -- Aggregate one N-row across K without constructing full systems --
+    def compute_row(i):
+        Isys_row = np.zeros((num_cols, num_points), dtype=float)
+        Pmods_row = np.zeros(num_cols, dtype=float)
+        Pstrs_row = np.zeros(num_cols, dtype=float)
         n = int(N[i, 0])
         off_counts = offset_counts(n, L)
         for j in range(num_cols):         # over degraded modules per string
             k = int(K[i, j])
-
-            Isys = np.zeros_like(V_ref, dtype=float)
-
             if k == 0:
-                Isys = total_strings * I0
-                Pmods_actual = total_strings * sum_mods_mpp_0
-                Pstrs_actual = total_strings * Pmp_str_0
-            else:
-                Pmods_actual = 0.0
-                Pstrs_actual = 0.0
-                # Affected strings distributed by offsets r=0..L-1 (r = s_idx % L)
-                for r, cnt in enumerate(off_counts):
-                    if cnt == 0:
-                        continue
-                    ps = proto_str[(k, r)]
-                    Isys += cnt * ps["I"]
-                    Pmods_actual += cnt * ps["sum_mods_mpp"]
-                    Pstrs_actual += cnt * ps["Pmp_str"]
-                # Healthy strings
-                healthy_cnt = total_strings - n
-                if healthy_cnt > 0:
-                    Isys += healthy_cnt * I0
-                    Pmods_actual += healthy_cnt * sum_mods_mpp_0
-                    Pstrs_actual += healthy_cnt * Pmp_str_0
-
-            V = V_ref
-            P = V * Isys
-
-            idx_sys = int(np.argmax(P))
-            Psys_actual = float(P[idx_sys])
-
-            # Mismatch metrics:
-            mismatch_mods_to_strs = Pmods_actual - Pstrs_actual
-            mismatch_strs_to_sys = Pstrs_actual - Psys_actual
-            mismatch_total = mismatch_mods_to_strs + mismatch_strs_to_sys
-
-            loss_mods = Pmods_healthy - Pmods_actual
-            loss_strs = Pstrs_healthy - Pstrs_actual
-            loss_sys = Psys_healthy - Psys_actual
-            loss_degradation = (loss_sys - mismatch_total)
-
-            percent_loss = percent_mismatch_total = percent_degradation = 0.0
-            percent_mismatch_to_loss = percent_degradation_to_loss = 0.0
-            percent_mismatch_strs_to_sys = percent_mismatch_mods_to_strs = 0.0
-            percent_mismatch_strs_norm = percent_mismatch_strs_norm_vs_loss = 0.0
-            if Psys_healthy != 0:
-                percent_loss = 100.0 * (1 - Psys_actual / Psys_healthy)
-                percent_mismatch_total = 100.0 * mismatch_total / Psys_healthy
-                percent_degradation = 100.0 * loss_degradation / Psys_healthy
-                percent_mismatch_strs_to_sys = 100.0 * mismatch_strs_to_sys / Psys_healthy
-                percent_mismatch_mods_to_strs = 100.0 * mismatch_mods_to_strs / Psys_healthy
-            if loss_sys != 0:
-                percent_mismatch_to_loss = 100.0 * mismatch_total / loss_sys
-                percent_degradation_to_loss = 100.0 * loss_degradation / loss_sys
-
-            # String-normalised percents (use healthy strings baseline per 150 strings)
-            num_strs_affected_norm = 150
-            denom_strs = (Pstrs_healthy / num_strs_affected_norm)
-            denom_loss_strs = (loss_strs / num_strs_affected_norm) if num_strs_affected_norm != 0 else 0.0
-            if denom_strs != 0:
-                percent_mismatch_strs_norm = 100.0 * mismatch_mods_to_strs / denom_strs
-            if denom_loss_strs != 0:
-                percent_mismatch_strs_norm_vs_loss = 100.0 * (mismatch_mods_to_strs / denom_loss_strs)
-
-            Z_W[i, j] = mismatch_total
-            Z_pct[i, j] = percent_mismatch_total
-
-            Vsys_cube[i, j, :] = V
-            Isys_cube[i, j, :] = Isys
-            Psys_cube[i, j, :] = P
-
-            metric_surfaces["module_MPPs_sum_degraded"][i, j] = Pmods_actual
-            metric_surfaces["module_MPPs_sum_healthy"][i, j] = Pmods_healthy
-            metric_surfaces["string_MPPs_sum_degraded"][i, j] = Pstrs_actual
-            metric_surfaces["string_MPPs_sum_healthy"][i, j] = Pstrs_healthy
-            metric_surfaces["system_MPP_degraded"][i, j] = Psys_actual
-            metric_surfaces["system_MPP_healthy"][i, j] = Psys_healthy
-            metric_surfaces["total_module_loss"][i, j] = loss_mods
-            metric_surfaces["total_string_loss"][i, j] = loss_strs
-            metric_surfaces["total_system_loss"][i, j] = loss_sys
-            metric_surfaces["mismatch_modules_to_strings"][i, j] = mismatch_mods_to_strs
-            metric_surfaces["mismatch_strings_to_system"][i, j] = mismatch_strs_to_sys
-            metric_surfaces["mismatch_total"][i, j] = mismatch_total
-            metric_surfaces["degradation_only"][i, j] = loss_degradation
-            metric_surfaces["percent_loss"][i, j] = percent_loss
-            metric_surfaces["percent_degradation_to_loss"][i, j] = percent_degradation_to_loss
-            metric_surfaces["percent_mismatch_to_loss"][i, j] = percent_mismatch_to_loss
-            metric_surfaces["percent_degradation"][i, j] = percent_degradation
-            metric_surfaces["percent_mismatch_total"][i, j] = percent_mismatch_total
-            metric_surfaces["percent_mismatch_strs_to_sys"][i, j] = percent_mismatch_strs_to_sys
-            metric_surfaces["percent_mismatch_mods_to_strs"][i, j] = percent_mismatch_mods_to_strs
-            metric_surfaces["percent_mismatch_strs_norm"][i, j] = percent_mismatch_strs_norm
-            metric_surfaces["percent_mismatch_strs_norm_vs_loss"][i, j] = percent_mismatch_strs_norm_vs_loss
+                Isys_row[j] = total_strings * I0
+                Pmods_row[j] = total_strings * sum_mods_mpp_0
+                Pstrs_row[j] = total_strings * Pmp_str_0
+                continue
+            # Affected strings distributed by offsets r=0..L-1 (r = s_idx % L)
+            for r, cnt in enumerate(off_counts):
+                if cnt == 0:
+                    continue
+                ps = proto_str[(k, r)]
+                Isys_row[j] += cnt * ps["I"]
+                Pmods_row[j] += cnt * ps["sum_mods_mpp"]
+                Pstrs_row[j] += cnt * ps["Pmp_str"]
+            # Healthy strings
+            healthy_cnt = total_strings - n
+            if healthy_cnt > 0:
+                Isys_row[j] += healthy_cnt * I0
+                Pmods_row[j] += healthy_cnt * sum_mods_mpp_0
+                Pstrs_row[j] += healthy_cnt * Pmp_str_0
+
+        # System MPPs along the curve axis (optionally refined between samples), then the same metrics
+        # (and zero-loss masking) as the discrete engine
+        Psys_row_curve = V_ref * Isys_row
+        if refine is None:
+            Psys_row = np.max(Psys_row_curve, axis=-1)
+        else:
+            Psys_row, _, _ = refine_mpp(Isys_row, V_ref, Psys_row_curve, method=refine)
+        report = loss_metrics_batch(Psys_row, Pmods_row, Pstrs_row, Pmods_healthy, Pstrs_healthy, Psys_healthy,
+                                    num_strs_affected=total_strings)
+        metric_row = {k: np.asarray(report[k], dtype=float) for k in metric_surfaces}
+        return Isys_row, metric_row
+
+    # Staging area for completed rows
+    stage_dir = _surface_dir(degradation_mode) / f"{surface_stem(resolution, total_strings, mods_per_string, N[:, 0], K[0])}.staging"
+    fingerprint = None
+    rows_done = set()
+    if checkpoint:
+        # Every option that changes row values (string path, voltage grid, MPP method) is part of the fingerprint
+        config = {"resolution": resolution, "num_points": num_points, "levels": L,
+                  "total_strings": total_strings, "mods_per_string": mods_per_string,
+                  "n_values": N[:, 0].tolist(), "k_values": K[0].tolist(),
+                  "series_kernel": bool(series_kernel), "grid_points": grid_points, "mpp_refine": refine,
+                  "V_ref": hashlib.sha1(np.ascontiguousarray(V_ref, dtype=float).tobytes()).hexdigest()}
+        fingerprint = _curve_fingerprint(config, [mod_healthy] + list(levels))
+        rows_done = _staging_open(stage_dir, fingerprint, resume=resume)
+        if rows_done:
+            print(f"[save_parametric_multimodal_equal_spread] Resuming: {len(rows_done)}/{num_rows} rows staged")
+
+    for i in range(num_rows):             # over affected strings
+        if i in rows_done:
+            Isys_row, metric_row = _staging_load_row(stage_dir, i)
+        else:
+            Isys_row, metric_row = compute_row(i)
+            if checkpoint:
+                _staging_save_row(stage_dir, fingerprint, rows_done, i, Isys_row, metric_row)
+        Isys_cube[i] = Isys_row
+        for kname, row in metric_row.items():
+            metric_surfaces[kname][i] = row
+    check_losses(metric_surfaces, K, N)
 
     elapsed = time.time() - start
     print(f"\n[save_parametric_multimodal_equal_spread] Generation time: {timedelta(seconds=elapsed)}")
 
     # Save artifacts
-    out_dir = Path("results") / f"mode_{degradation_mode}"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    npz_path = out_dir / f"surface_res{resolution}.npz"
-    meta_path = out_dir / f"surface_res{resolution}.metadata.json"
-
-    savez_payload = {
-        "K": K.astype(np.int16),
-        "N": N.astype(np.int16),
-        "Vsys_cube": Vsys_cube.astype(np.float32),
-        "Isys_cube": Isys_cube.astype(np.float32),
-        "Psys_cube": Psys_cube.astype(np.float32),
-        "mismatch_total_W": Z_W.astype(np.float32),
-        "percent_mismatch_total": Z_pct.astype(np.float32),
-    }
-    for kname, arr in metric_surfaces.items():
-        savez_payload[f"metric_{kname}"] = arr.astype(np.float32)
-
-    np.savez_compressed(npz_path, **savez_payload)
-
-    metadata = {
-        "degradation_mode": degradation_mode,
-        "deg_label": deg_label,
-        "resolution": resolution,
-        "num_rows": int(num_rows),
-        "num_cols": int(num_cols),
-        "num_points": int(num_points),
-        "arrays": sorted(list(savez_payload.keys())),
-        "units": {
-            "Vsys_cube": "V",
-            "Isys_cube": "A",
-            "Psys_cube": "W",
-            "mismatch_total_W": "W",
-            "percent_mismatch_total": "%",
-        },
-        "notes": (
-            f"Multimodal equal-spread with L={len(modules_degraded_levels)} degraded levels. "
-            "Pattern: within-string cycles 1..L; across strings offset +1 per row. "
-            "Arrays are float32 except K/N (int16). Shapes: curves (N x K x num_points), metrics (N x K)."
-        ),
-    }
-    with open(meta_path, "w") as f:
-        json.dump(metadata, f, indent=2)
-
+    _save_surface(degradation_mode=degradation_mode, resolution=resolution, deg_label=deg_label,
+                  K=K, N=N, V_ref=V_ref, Isys_cube=Isys_cube, metric_surfaces=metric_surfaces,
+                  notes=(
+                      f"Multimodal equal-spread with L={len(modules_degraded_levels)} degraded levels. "
+                      "Pattern: within-string cycles 1..L; across strings offset +1 per row. "
+                      "Arrays are float32 except K/N (int16). Shapes: Vsys (num_points), "
+                      "Isys_cube (N x K x num_points), metrics (N x K). "
+                      "Vsys_cube/Psys_cube are derived on load (Psys = Vsys * Isys)."
+                  ),
+                  layout=layout, mpp_refine=refine,
+                  voltage_grid="healthy_string" if grid_points is None else "adaptive",
+                  total_strings=total_strings, mods_per_string=mods_per_string)
+
+    # Surface is complete: drop the staging area
+    if checkpoint and stage_dir.exists():
+        shutil.rmtree(stage_dir)
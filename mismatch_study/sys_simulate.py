@@ -3,15 +3,21 @@
 
 import time
 from datetime import timedelta
+import numpy as np
 
 from case_study_data.module_specs import degraded_module
 from sys_healthy import create_healthy, plot_healthy
 from sys_degraded_fully import create_degraded, plot_degraded, plot_deg_vs_healthy_mods, plot_degradation_modes
-from sys_mismatched import create_mismatched_pyramid, create_mismatched_parametric, print_system, create_mismatched_multimodal
-from sys_mismatch_calculator import loss_calculator
+from sys_mismatched import (create_mismatched_pyramid, create_mismatched_parametric, print_system,
+                            create_mismatched_multimodal, parallel_curves, string_prototypes)
+from sys_mismatch_calculator import loss_calculator, loss_calculator_batch, mpp_from_curve, string_mpp_table
 from sys_plotter import (plot_system_comparisons, plot_healthy_vs_mismatch, plot_parametric_2d,
-                         plot_parametric_3d, save_parametric_3d, plot_and_save_trend_surfaces)
-from sys_save import save_parametric_discrete_modal, save_parametric_multi_modal
+                         plot_parametric_3d, save_parametric_3d, plot_and_save_trend_surfaces,
+                         save_parametric_3d_cached, surface_figure_key, figure_cache_key, render_batch)
+from sys_timeseries import load_profile, simulate_timeseries
+from sys_montecarlo import run_monte_carlo
+from sys_save import (save_parametric_discrete_modal, save_parametric_multi_modal, save_parametric_modes,
+                      load_surface, locate_surface)
 
 # ======== SET DEGRADATION MODE ========= #
 """
@@ -146,30 +152,40 @@ def run_mismatch_pyramid(degraded_sets=3, min_degraded_modules=1, max_degraded_m
     print(f"\nTotal time: {timedelta(seconds=elapsed)}")
 
 
-def run_mismatch_parametric_2d(mismatch_vs="total"):
+def run_mismatch_parametric_2d(mismatch_vs="total", refine=None):
     """Sweeps for mismatch plots
 
     Parameter:
     - mismatch_vs (string): "total" or "loss"
+    - refine: None (sampled MPPs) or "parabolic" (sub-sample MPPs)
     """
 
     # Plot A:
     # - (y-axis): (string-normalised) module->string mismatch.
     # - (x-axis): degraded modules per string.
     # - Normalised to show mismatch for one string, not the entire system.
+    # String prototypes with k = 0..30 degraded modules; every system below is a count-weighted
+    # parallel combination of these, evaluated in one batch (no 150-string systems are built)
+    strings_k = string_prototypes(mod_healthy, mod_deg)
+    Pmp_str_k, sum_mods_mpp_k = string_mpp_table(strings_k, refine)
+    # Healthy baselines through the same path (parallel grid, MPP method) as the swept systems
+    counts_0 = np.zeros((1, len(strings_k)), dtype=int)
+    counts_0[0, 0] = 150
+    Isys_0, Vsys_0 = parallel_curves(counts_0, strings_k)
+    Psys_healthy = mpp_from_curve(Isys_0[0], Vsys_0[0], Isys_0[0] * Vsys_0[0], refine=refine)[0]
+    Pmods_healthy, Pstrs_healthy = 150 * sum_mods_mpp_k[0], 150 * Pmp_str_k[0]
+
     k_values = list(range(0, 31))   # range of degraded modules
-    mod2str_values = []
-    mod2str_percents = []
-    mod2str_percents_vs_loss = []
-    for k in k_values:
-        sys_k = create_mismatched_pyramid(degraded_sets=1,
-                                          min_degraded_modules=k, max_degraded_modules=k,
-                                          clamp_after_max=True,
-                                          module_healthy=mod_healthy, module_degraded=mod_deg)
-        rep_k = loss_calculator(sys_k, system_healthy, num_strs_affected=30)
-        mod2str_values.append(float(rep_k["mismatch_modules_to_strings"]))
-        mod2str_percents.append(float(rep_k["percent_mismatch_strs_norm"]))
-        mod2str_percents_vs_loss.append(float(rep_k["percent_mismatch_strs_norm_vs_loss"]))
+    # One affected set (30 strings with k degraded modules), remaining 120 strings healthy
+    counts_k = np.zeros((len(k_values), len(strings_k)), dtype=int)
+    counts_k[:, 0] = 120
+    counts_k[np.arange(len(k_values)), k_values] += 30
+    Isys_k, Vsys_k = parallel_curves(counts_k, strings_k)
+    rep_k = loss_calculator_batch(Isys_k, Vsys_k, counts_k @ sum_mods_mpp_k, counts_k @ Pmp_str_k,
+                                  Pmods_healthy, Pstrs_healthy, Psys_healthy, num_strs_affected=30, refine=refine)
+    mod2str_values = rep_k["mismatch_modules_to_strings"].tolist()
+    mod2str_percents = rep_k["percent_mismatch_strs_norm"].tolist()
+    mod2str_percents_vs_loss = rep_k["percent_mismatch_strs_norm_vs_loss"].tolist()
 
     # Plot B:
     # - (y-axis): strings->system mismatch.
@@ -178,19 +194,17 @@ def run_mismatch_parametric_2d(mismatch_vs="total"):
     n_min, n_max = 0, 150
     fixed_k_for_string_sweep = 30
     n_values = list(range(n_min, n_max + 1))
-    str2sys_values = []
-    str2sys_percents = []
-    str2sys_percents_vs_loss = []
-    for n in n_values:
-        sys_n = create_mismatched_parametric(
-            min_degraded_modules=fixed_k_for_string_sweep,
-            num_degraded_strings=n,
-            module_healthy=mod_healthy,
-            module_degraded=mod_deg)
-        rep_n = loss_calculator(sys_n, system_healthy, num_strs_affected=n)
-        str2sys_values.append(float(rep_n["mismatch_strings_to_system"]))
-        str2sys_percents.append(float(rep_n["percent_mismatch_total"]))
-        str2sys_percents_vs_loss.append(float(rep_n["percent_mismatch_to_loss"]))
+    # n strings with fixed_k degraded modules, remaining strings healthy
+    counts_n = np.zeros((len(n_values), len(strings_k)), dtype=int)
+    counts_n[:, fixed_k_for_string_sweep] += n_values
+    counts_n[:, 0] += 150 - np.asarray(n_values)
+    Isys_n, Vsys_n = parallel_curves(counts_n, strings_k)
+    rep_n = loss_calculator_batch(Isys_n, Vsys_n, counts_n @ sum_mods_mpp_k, counts_n @ Pmp_str_k,
+                                  Pmods_healthy, Pstrs_healthy, Psys_healthy, num_strs_affected=np.asarray(n_values),
+                                  refine=refine)
+    str2sys_values = rep_n["mismatch_strings_to_system"].tolist()
+    str2sys_percents = rep_n["percent_mismatch_total"].tolist()
+    str2sys_percents_vs_loss = rep_n["percent_mismatch_to_loss"].tolist()
 
     # Plot metrics on one figure with two subplots
     if mismatch_vs == "total":
@@ -210,7 +224,7 @@ def run_mismatch_parametric_3d(resolution=30, metric_key="mismatch_total_W", deg
     """Load a saved parametric surface and plot it in 3D.
 
     Parameters:
-    - resolution: 1, 5, 10, 30 (must match saved surface)
+    - resolution: step of the saved surface, e.g. 1, 5, 10, 30 (must match saved surface)
     - metric_key: key inside the saved NPZ to plot. Examples:
         > "mismatch_total_W"
         > "percent_mismatch_total"
@@ -220,8 +234,8 @@ def run_mismatch_parametric_3d(resolution=30, metric_key="mismatch_total_W", deg
     - deg_mode: degradation mode
     """
 
-    if resolution not in (1, 5, 10, 30):
-        raise ValueError("Invalid resolution value. Must be 1, 5, 10 or 30.")
+    if int(resolution) < 1:
+        raise ValueError("Invalid resolution value. Must be a positive integer.")
 
     from pathlib import Path
     import json
@@ -233,8 +247,7 @@ def run_mismatch_parametric_3d(resolution=30, metric_key="mismatch_total_W", deg
 
     # Paths to saved artifacts
     out_dir = Path("results") / f"mode_{deg_mode}"
-    npz_path = out_dir / f"surface_res{resolution}.npz"
-    meta_path = out_dir / f"surface_res{resolution}.metadata.json"
+    npz_path, meta_path = locate_surface(out_dir, resolution)
 
     # Validate presence
     if not meta_path.exists():
@@ -247,7 +260,7 @@ def run_mismatch_parametric_3d(resolution=30, metric_key="mismatch_total_W", deg
         metadata = json.load(f)
 
     # Load arrays
-    with np.load(npz_path) as data:
+    with load_surface(npz_path) as data:
         try:
             K = data["K"]
             N = data["N"]
@@ -303,7 +316,7 @@ def run_mismatch_parametric_3d(resolution=30, metric_key="mismatch_total_W", deg
                        deg_label=deg_label_loaded)
 
 
-def save_parametric_results(resolution=30, mode_id=None):
+def save_parametric_results(resolution=30, mode_id=None, layout="npz", grid_points=None):
     """
     Save the discrete-modal parametric surfaces for the current degraded mode.
     (Can iterate through all 1-6 modes)
@@ -311,6 +324,8 @@ def save_parametric_results(resolution=30, mode_id=None):
     Parameters:
       resolution: 1, 5, 10, 30 (step along affected-strings axis)
       mode_id: folder id for results/mode_{mode_id}; defaults to global degradation_mode
+      layout: "npz" (compressed) or "npy" (memory-mapped store for fast random-access plotting)
+      grid_points: None (healthy string voltage grid) or size of an adaptive voltage grid (e.g. 101)
     """
     mid = degradation_mode if mode_id is None else int(mode_id)
     save_parametric_discrete_modal(
@@ -320,16 +335,96 @@ def save_parametric_results(resolution=30, mode_id=None):
         system_healthy=system_healthy,
         mod_healthy=mod_healthy,
         mod_deg=mod_deg,
+        layout=layout,
+        grid_points=grid_points,
     )
 
 
-def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
+def save_parametric_results_all(resolution=30, modes=range(1, 7), layout="npz", max_workers=None, grid_points=None):
+    """
+    Save the discrete-modal parametric surfaces for several degradation modes in one run.
+    The healthy baseline is built once (module globals); modes are processed in parallel.
+
+    Parameters:
+      resolution: 1, 5, 10, 30 (step along affected-strings axis)
+      modes: degradation modes to generate (results/mode_{m})
+      layout: "npz" (compressed) or "npy" (memory-mapped store)
+      max_workers: process pool size (defaults to one worker per mode, capped at CPU count)
+      grid_points: None (healthy string voltage grid) or size of an adaptive voltage grid (e.g. 101)
+    """
+    degraded_modes = {}
+    for m in modes:
+        d = create_degraded(degradation_mode=int(m))
+        degraded_modes[int(m)] = (d["module_degraded"], d["deg_label"])
+
+    save_parametric_modes(
+        degraded_modes=degraded_modes,
+        resolution=resolution,
+        system_healthy=system_healthy,
+        mod_healthy=mod_healthy,
+        layout=layout,
+        max_workers=max_workers,
+        grid_points=grid_points,
+    )
+
+
+# Metric surfaces saved per mode and their colormaps (3 and 4 share 'inferno')
+SURFACE_METRIC_SPECS = [
+    ("metric_system_MPP_degraded",        "viridis"),
+    ("metric_total_system_loss",          "cividis"),
+    ("metric_mismatch_total",             "inferno"),
+    ("metric_percent_mismatch_total",     "inferno"),
+    ("metric_percent_mismatch_to_loss",   "plasma"),
+]
+TREND_METRICS = ("metric_mismatch_total", "metric_percent_mismatch_total",
+                 "metric_total_system_loss", "metric_percent_mismatch_to_loss")
+
+
+def _format_metric_label(key: str) -> str:
+    """Readable label from a metric key (e.g. metric_total_system_loss -> Total System Loss)."""
+    base = key[7:] if key.startswith("metric_") else key
+    return base.replace("_", " ").title()
+
+
+def _select_metric_key(files, metric_key):
+    """Return metric_key, or its variant with/without the 'metric_' prefix, if present in files (else None)."""
+    if metric_key in files:
+        return metric_key
+    alt = metric_key[len("metric_"):] if metric_key.startswith("metric_") else f"metric_{metric_key}"
+    return alt if alt in files else None
+
+
+def _surface_summary_line(selected_key, Z, K, N, unit, plot_names, keys=()):
+    """
+    One summary_res*.txt line: saved figure(s), min/mean/max (with the K/N location of the max)
+    and the figure cache key(s) the figures were rendered from.
+    """
+    names = ", ".join(plot_names)
+    key_text = f" | key={', '.join(keys)}" if keys else ""
+    if np.isfinite(Z.astype(float)).any():
+        z_max = float(np.nanmax(Z))
+        z_min = float(np.nanmin(Z))
+        z_mean = float(np.nanmean(Z))
+        imax, jmax = np.unravel_index(int(np.nanargmax(Z)), Z.shape)
+        return (f"- {selected_key}: saved -> {names} | unit={unit} | "
+                f"min={z_min:.3f}, mean={z_mean:.3f}, max={z_max:.3f} @ (K={int(K[imax, jmax])}, N={int(N[imax, jmax])})"
+                f"{key_text}")
+    return f"- {selected_key}: all values non-finite; plot saved as {names}{key_text}"
+
+
+def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None, force=False):
     """
     Iterate through degradation modes and save plots and summaries for selected metrics.
+    Figures already rendered from the same inputs are reused (see sys_plotter figure cache);
+    the summary records each figure's cache key.
 
     Parameters:
     - resolution (int): 1, 5, 10, 30 (must match saved surface)
     - view (string): "top" or "ortho"
+    - force (bool): re-render figures even if cached
+
+    The voltage grid is fixed when a surface is saved (grid_points of save_parametric_results); plots use the saved
+    metrics as they are and the summary header records the grid from the metadata.
 
     Metrics:
       1 - metric_system_MPP_degraded          (Viridis)
@@ -348,24 +443,9 @@ def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
     base_plot_dir = Path("results_plotted")
     base_plot_dir.mkdir(parents=True, exist_ok=True)
 
-    # colormap per metric (3 and 4 share 'inferno')
-    metric_specs = [
-        ("metric_system_MPP_degraded",        "viridis"),
-        ("metric_total_system_loss",          "cividis"),
-        ("metric_mismatch_total",             "inferno"),
-        ("metric_percent_mismatch_total",     "inferno"),
-        ("metric_percent_mismatch_to_loss",   "plasma"),
-    ]
-
-    # Format label from key
-    def format_label(key: str) -> str:
-        base = key[7:] if key.startswith("metric_") else key
-        return base.replace("_", " ").title()
-
     for mode_val in modes:
         out_dir = Path("results") / f"mode_{mode_val}"
-        npz_path = out_dir / f"surface_res{resolution}.npz"
-        meta_path = out_dir / f"surface_res{resolution}.metadata.json"
+        npz_path, meta_path = locate_surface(out_dir, resolution)
 
         if not meta_path.exists() or not npz_path.exists():
             print(f"[run_batch_plot_metrics] Skipping mode {mode_val}: missing saved data at resolution={resolution}")
@@ -374,7 +454,7 @@ def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
         with open(meta_path, "r") as f:
             metadata = json.load(f)
 
-        with np.load(npz_path) as data:
+        with load_surface(npz_path) as data:
             # required meshes
             if "K" not in data.files or "N" not in data.files:
                 print(f"[run_batch_plot_metrics] Skipping mode {mode_val}: missing K/N meshes")
@@ -386,18 +466,11 @@ def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
             mode_plot_dir = base_plot_dir / f"mode_{mode_val}"
             mode_plot_dir.mkdir(parents=True, exist_ok=True)
             summary_lines = []
-            summary_lines.append(f"Mode {mode_val} - {metadata.get('deg_label', '')} (resolution={metadata.get('resolution')})")
+            summary_lines.append(f"Mode {mode_val} - {metadata.get('deg_label', '')} (resolution={metadata.get('resolution')}, voltage grid={metadata.get('voltage_grid', 'healthy_string')})")
             summary_lines.append("")
 
-            for metric_key, cmap in metric_specs:
-                selected_key = None
-                if metric_key in data.files:
-                    selected_key = metric_key
-                else:
-                    alt = metric_key[len("metric_"):] if metric_key.startswith("metric_") else f"metric_{metric_key}"
-                    if alt in data.files:
-                        selected_key = alt
-
+            for metric_key, cmap in SURFACE_METRIC_SPECS:
+                selected_key = _select_metric_key(data.files, metric_key)
                 if selected_key is None:
                     summary_lines.append(f"- {metric_key}: NOT FOUND")
                     continue
@@ -406,7 +479,7 @@ def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
                 units_map = metadata.get("units", {})
                 unit = units_map.get(selected_key) or ("%" if "percent" in selected_key.lower() else "W")
 
-                z_label = format_label(selected_key)
+                z_label = _format_metric_label(selected_key)
                 title = f"{z_label} Surface [{unit}] — {metadata.get('deg_label', f'Mode {mode_val}')}"
 
                 if view == "top":
@@ -414,27 +487,12 @@ def save_parametric_surfaces(resolution=1, modes=range(1, 7), view=None):
                 else:
                     plot_path = mode_plot_dir / f"{selected_key}_res{resolution}.pdf"
 
-                # Plot and save
-                save_parametric_3d(K, N, Z, title=title, z_label=z_label, z_unit=unit,
-                                   cmap=cmap, save_path=plot_path, show=False, view=view)
+                # Plot and save (or reuse the cached figure)
+                key, _ = save_parametric_3d_cached(K, N, Z, save_path=plot_path, title=title, z_label=z_label,
+                                                   z_unit=unit, cmap=cmap, view=view, force=force)
 
                 # Statistics and maxima to summary
-                z_flat = Z.astype(float).ravel()
-                finite_mask = np.isfinite(z_flat)
-                if finite_mask.any():
-                    z_max = float(np.nanmax(Z))
-                    z_min = float(np.nanmin(Z))
-                    z_mean = float(np.nanmean(Z))
-                    flat_idx = int(np.nanargmax(Z))
-                    imax, jmax = np.unravel_index(flat_idx, Z.shape)
-                    k_max = int(K[imax, jmax])
-                    n_max = int(N[imax, jmax])
-                    summary_lines.append(
-                        f"- {selected_key}: saved -> {plot_path.name} | unit={unit} | "
-                        f"min={z_min:.3f}, mean={z_mean:.3f}, max={z_max:.3f} @ (K={k_max}, N={n_max})"
-                    )
-                else:
-                    summary_lines.append(f"- {selected_key}: all values non-finite; plot saved as {plot_path.name}")
+                summary_lines.append(_surface_summary_line(selected_key, Z, K, N, unit, [plot_path.name], [key]))
 
             summary_path = mode_plot_dir / f"summary_res{resolution}.txt"
             summary_path.write_text("\n".join(summary_lines), encoding="utf-8")
@@ -462,9 +520,32 @@ def save_trend_surfaces(resolution=1, modes=range(1, 7), show=False,
 
     Saves outputs into: results_plotted/trends
     """
+    K_ref, N_ref, surfaces_by_metric, metric_meta, scenario_order = _collect_trend_surfaces(resolution, modes, metrics)
+
+    # Nothing to plot?
+    any_data = any(bool(surfaces_by_metric[m]) for m in metrics)
+    if not any_data or K_ref is None or N_ref is None:
+        print("[run_trend_surfaces] No valid surfaces collected. Nothing to plot.")
+        return
+
+    # Call plot to save
+    plot_and_save_trend_surfaces(k_mesh=K_ref, set_mesh=N_ref, surfaces_by_metric=surfaces_by_metric,
+                                 scenario_order=scenario_order, metric_meta=metric_meta,
+                                 out_root=out_root, show=show, alpha=0.4)
+
+    # show time to load
+    end = time.time()
+    elapsed = end - start
+    print(f"\nLoad+plot prep time: {timedelta(seconds=elapsed)}")
+
+
+def _collect_trend_surfaces(resolution, modes, metrics):
+    """
+    Load the requested metric surfaces of several modes for the trend plots.
+    Returns (K_ref, N_ref, surfaces_by_metric, metric_meta, scenario_order); K_ref/N_ref are None if nothing loaded.
+    """
     from pathlib import Path
     import json
-    import numpy as np
 
     # Prepare containers
     surfaces_by_metric = {m: {} for m in metrics}
@@ -473,15 +554,9 @@ def save_trend_surfaces(resolution=1, modes=range(1, 7), show=False,
     K_ref = None
     N_ref = None
 
-    # Format label from key
-    def format_label(key: str) -> str:
-        base = key[7:] if key.startswith("metric_") else key
-        return base.replace("_", " ").title()
-
     for mode_val in modes:
         out_dir = Path("results") / f"mode_{mode_val}"
-        npz_path = out_dir / f"surface_res{resolution}.npz"
-        meta_path = out_dir / f"surface_res{resolution}.metadata.json"
+        npz_path, meta_path = locate_surface(out_dir, resolution)
 
         if not meta_path.exists() or not npz_path.exists():
             print(f"[run_trend_surfaces] Skipping mode {mode_val}: missing saved data at resolution={resolution}")
@@ -493,7 +568,7 @@ def save_trend_surfaces(resolution=1, modes=range(1, 7), show=False,
         scenario_label = metadata.get("deg_label", f"Mode {mode_val}")
         scenario_order.append(scenario_label)
 
-        with np.load(npz_path) as data:
+        with load_surface(npz_path) as data:
             if "K" not in data.files or "N" not in data.files:
                 print(f"[run_trend_surfaces] Skipping mode {mode_val}: missing K/N meshes")
                 continue
@@ -510,25 +585,14 @@ def save_trend_surfaces(resolution=1, modes=range(1, 7), show=False,
                     print(f"[run_trend_surfaces] Skipping mode {mode_val}: K/N mesh mismatch vs reference")
                     continue
 
-            # Load each requested metric if present
+            # Load each requested metric if present (allow missing/extra 'metric_' prefix)
             for metric_key in metrics:
-                selected_key = None
-                if metric_key in data.files:
-                    selected_key = metric_key
-                else:
-                    # allow missing/extra 'metric_' prefix
-                    if metric_key.startswith("metric_"):
-                        alt = metric_key[len("metric_"):]
-                    else:
-                        alt = f"metric_{metric_key}"
-                    if alt in data.files:
-                        selected_key = alt
-
+                selected_key = _select_metric_key(data.files, metric_key)
                 if selected_key is None:
                     print(f"[run_trend_surfaces] Mode {mode_val}: metric '{metric_key}' not found, skipping.")
                     continue
 
-                Z = data[selected_key]
+                Z = np.asarray(data[selected_key])
                 surfaces_by_metric[metric_key][scenario_label] = Z
 
                 # Collect meta (unit/label) once per metric
@@ -537,29 +601,115 @@ def save_trend_surfaces(resolution=1, modes=range(1, 7), show=False,
 
                 if metric_key not in metric_meta:
                     metric_meta[metric_key] = {
-                        "label": format_label(selected_key),
+                        "label": _format_metric_label(selected_key),
                         "unit": unit,
-                        "title": f"{format_label(selected_key)} Trend Surfaces ({unit})"
+                        "title": f"{_format_metric_label(selected_key)} Trend Surfaces ({unit})"
                     }
 
-    # Nothing to plot?
-    any_data = any(bool(surfaces_by_metric[m]) for m in metrics)
-    if not any_data or K_ref is None or N_ref is None:
-        print("[run_trend_surfaces] No valid surfaces collected. Nothing to plot.")
-        return
+    return K_ref, N_ref, surfaces_by_metric, metric_meta, scenario_order
 
-    # Call plot to save
-    plot_and_save_trend_surfaces(k_mesh=K_ref, set_mesh=N_ref, surfaces_by_metric=surfaces_by_metric,
-                                 scenario_order=scenario_order, metric_meta=metric_meta,
-                                 out_root=out_root, show=show, alpha=0.4)
 
-    # show time to load
-    end = time.time()
-    elapsed = end - start
-    print(f"\nLoad+plot prep time: {timedelta(seconds=elapsed)}")
+def render_parametric_surfaces(resolution=1, modes=range(1, 7), views=("ortho", "top"), trends=True,
+                               max_workers=None, force=False):
+    """
+    Headless batch version of save_parametric_surfaces (every view) and save_trend_surfaces.
 
+    Builds the figure list (modes x SURFACE_METRIC_SPECS x views, plus one trend figure per TREND_METRICS
+    entry), renders it with the Agg backend in a process pool and skips figures whose inputs are unchanged
+    since the last render (figure cache, shared with save_parametric_surfaces).
 
-def save_multimodal_results(resolution=30, levels=(1, 2, 3, 4, 5, 6), mode_id=999):
+    Parameters:
+    - resolution (int): step of the saved surfaces
+    - modes (iterable): degradation modes (results/mode_{m})
+    - views (iterable): "ortho" and/or "top"
+    - trends (bool): also render results_plotted/trends/*
+    - max_workers (int): process pool size (default: CPU count); <= 1 renders in-process
+    - force (bool): re-render everything
+
+    Outputs: the same files as save_parametric_surfaces / save_trend_surfaces (+ summary_res*.txt per mode)
+    """
+    from pathlib import Path
+    import json
+
+    start_batch = time.time()
+    base_plot_dir = Path("results_plotted")
+    jobs = []
+
+    for mode_val in modes:
+        npz_path, meta_path = locate_surface(Path("results") / f"mode_{mode_val}", resolution)
+        if not meta_path.exists() or not npz_path.exists():
+            print(f"[render_parametric_surfaces] Skipping mode {mode_val}: missing saved data at resolution={resolution}")
+            continue
+
+        with open(meta_path, "r") as f:
+            metadata = json.load(f)
+
+        mode_plot_dir = base_plot_dir / f"mode_{mode_val}"
+        mode_plot_dir.mkdir(parents=True, exist_ok=True)
+        summary_lines = [f"Mode {mode_val} - {metadata.get('deg_label', '')} (resolution={metadata.get('resolution')}, voltage grid={metadata.get('voltage_grid', 'healthy_string')})", ""]
+
+        with load_surface(npz_path) as data:
+            if "K" not in data.files or "N" not in data.files:
+                print(f"[render_parametric_surfaces] Skipping mode {mode_val}: missing K/N meshes")
+                continue
+            K = np.asarray(data["K"])
+            N = np.asarray(data["N"])
+
+            for metric_key, cmap in SURFACE_METRIC_SPECS:
+                selected_key = _select_metric_key(data.files, metric_key)
+                if selected_key is None:
+                    summary_lines.append(f"- {metric_key}: NOT FOUND")
+                    continue
+
+                Z = np.asarray(data[selected_key])
+                unit = metadata.get("units", {}).get(selected_key) or ("%" if "percent" in selected_key.lower() else "W")
+                z_label = _format_metric_label(selected_key)
+                title = f"{z_label} Surface [{unit}] — {metadata.get('deg_label', f'Mode {mode_val}')}"
+
+                plot_names, keys = [], []
+                for view in views:
+                    view_arg = "top" if view == "top" else None
+                    suffix = "_top" if view_arg == "top" else ""
+                    plot_path = mode_plot_dir / f"{selected_key}_res{resolution}{suffix}.pdf"
+                    plot_names.append(plot_path.name)
+                    kwargs = dict(k_mesh=K, set_mesh=N, z_mesh=Z, title=title, z_label=z_label, z_unit=unit,
+                                  cmap=cmap, save_path=str(plot_path), show=False, view=view_arg)
+                    key = surface_figure_key(K, N, Z, title=title, z_label=z_label, z_unit=unit, cmap=cmap,
+                                             view=view_arg)
+                    keys.append(key)
+                    jobs.append({"kind": "surface", "kwargs": kwargs, "output": str(plot_path), "key": key})
+
+                summary_lines.append(_surface_summary_line(selected_key, Z, K, N, unit, plot_names, keys))
+
+        summary_path = mode_plot_dir / f"summary_res{resolution}.txt"
+        summary_path.write_text("\n".join(summary_lines), encoding="utf-8")
+
+    if trends:
+        out_root = base_plot_dir / "trends"
+        K_ref, N_ref, surfaces_by_metric, metric_meta, scenario_order = _collect_trend_surfaces(
+            resolution, modes, TREND_METRICS)
+        for metric_key, scenario_dict in surfaces_by_metric.items():
+            if not scenario_dict or K_ref is None:
+                continue
+            order = [sc for sc in scenario_order if sc in scenario_dict]
+            kwargs = dict(k_mesh=K_ref, set_mesh=N_ref, surfaces_by_metric={metric_key: scenario_dict},
+                          scenario_order=scenario_order, metric_meta={metric_key: metric_meta[metric_key]},
+                          out_root=str(out_root), show=False, alpha=0.4)
+            key = figure_cache_key(K_ref, N_ref, *(scenario_dict[sc] for sc in order), kind="trend",
+                                   scenarios=order, meta=metric_meta[metric_key], alpha=0.4, dpi=900)
+            jobs.append({"kind": "trend", "kwargs": kwargs,
+                         "output": str(out_root / f"{metric_key}_trend_surfaces.pdf"), "key": key})
+
+    result = render_batch(jobs, max_workers=max_workers, force=force)
+
+    elapsed = time.time() - start_batch
+    print(f"\n[render_parametric_surfaces] Rendered {len(result['rendered'])}, "
+          f"unchanged {len(result['skipped'])} figures in {timedelta(seconds=elapsed)}")
+    return result
+
+
+def save_multimodal_results(resolution=30, levels=(1, 2, 3, 4, 5, 6), mode_id=999, layout="npz",
+                            checkpoint=True, resume=True, grid_points=None, refine=None):
     """
     Build L degraded module variants, save the multimodal equal-spread parametric surfaces,
     and then plot them using the existing helpers.
@@ -568,6 +718,11 @@ def save_multimodal_results(resolution=30, levels=(1, 2, 3, 4, 5, 6), mode_id=99
       resolution: 1, 5, 10, 30 (step along affected-strings axis)
       levels: iterable of degradation_mode integers to instantiate degraded module variants
       mode_id: integer used as folder id under results/mode_{mode_id}
+      layout: "npz" (compressed) or "npy" (memory-mapped store)
+      checkpoint: stage completed rows so an interrupted run can be resumed
+      resume: reuse rows staged by a previous (interrupted) run with the same inputs
+      grid_points: None (healthy string voltage grid) or size of an adaptive voltage grid (e.g. 101)
+      refine: None (sampled MPPs) or "parabolic" (sub-sample MPPs)
     """
     # Prepare degraded module variants in the requested order
     modules_degraded_levels = []
@@ -587,6 +742,11 @@ def save_multimodal_results(resolution=30, levels=(1, 2, 3, 4, 5, 6), mode_id=99
         system_healthy=system_healthy,
         mod_healthy=mod_healthy,
         modules_degraded_levels=modules_degraded_levels,
+        layout=layout,
+        checkpoint=checkpoint,
+        resume=resume,
+        grid_points=grid_points,
+        refine=refine,
     )
 
 
@@ -596,6 +756,8 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
     """
     Load the saved multimodal parametric NPZ for a given mode_id (e.g., 999),
     and save 3D metric surfaces to a separate folder hierarchy.
+    Figures already rendered from the same inputs are reused (see sys_plotter figure cache);
+    overwrite=True re-renders them regardless. The summary records each figure's cache key.
 
     Outputs: <out_root>/mode_{mode_id}/
       - <metric_key>_res{resolution}.pdf (or *_top.pdf if view='top')
@@ -607,33 +769,11 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
 
     # Metric keys to plot and their colormaps
     # If 'metrics' is provided, it overrides this default list
-    metric_specs = metrics or [
-        ("metric_system_MPP_degraded",        "viridis"),
-        ("metric_total_system_loss",          "cividis"),
-        ("metric_mismatch_total",             "inferno"),
-        ("metric_percent_mismatch_total",     "inferno"),
-        ("metric_percent_mismatch_to_loss",   "plasma"),
-    ]
-
-    def format_label(key: str) -> str:
-        base = key[7:] if key.startswith("metric_") else key
-        return base.replace("_", " ").title()
-
-    # If a file already exists and overwrite=False, generate a unique variant name
-    def unique_path(p: Path) -> Path:
-        if not p.exists():
-            return p
-        idx = 2
-        while True:
-            cand = p.with_name(f"{p.stem}_v{idx}{p.suffix}")
-            if not cand.exists():
-                return cand
-            idx += 1
+    metric_specs = metrics or SURFACE_METRIC_SPECS
 
     # Locate saved NPZ/metadata produced by the multimodal saver for the given mode_id/resolution
     src_dir = Path("results") / f"mode_{mode_id}"
-    npz_path = src_dir / f"surface_res{resolution}.npz"
-    meta_path = src_dir / f"surface_res{resolution}.metadata.json"
+    npz_path, meta_path = locate_surface(src_dir, resolution)
 
     if not meta_path.exists() or not npz_path.exists():
         print(f"[save_multimodal_metric_surfaces] Missing saved data for mode {mode_id} at resolution={resolution}")
@@ -645,7 +785,7 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
     with open(meta_path, "r") as f:
         metadata = json.load(f)
 
-    with np.load(npz_path) as data:
+    with load_surface(npz_path) as data:
         if "K" not in data.files or "N" not in data.files:
             print(f"[save_multimodal_metric_surfaces] Missing K/N meshes for mode {mode_id}")
             return
@@ -654,17 +794,10 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
         N = data["N"]
 
         # Per-metric stats
-        summary_lines = [f"Mode {mode_id} - {metadata.get('deg_label', '')} (resolution={metadata.get('resolution')})", ""]
+        summary_lines = [f"Mode {mode_id} - {metadata.get('deg_label', '')} (resolution={metadata.get('resolution')}, voltage grid={metadata.get('voltage_grid', 'healthy_string')})", ""]
 
         for metric_key, cmap in metric_specs:
-            selected_key = None
-            if metric_key in data.files:
-                selected_key = metric_key
-            else:
-                alt = metric_key[len("metric_"):] if metric_key.startswith("metric_") else f"metric_{metric_key}"
-                if alt in data.files:
-                    selected_key = alt
-
+            selected_key = _select_metric_key(data.files, metric_key)
             if selected_key is None:
                 summary_lines.append(f"- {metric_key}: NOT FOUND")
                 continue
@@ -673,36 +806,20 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
             units_map = metadata.get("units", {})
             unit = units_map.get(selected_key) or ("%" if "percent" in selected_key.lower() else "W")
 
-            z_label = format_label(selected_key)
+            z_label = _format_metric_label(selected_key)
             title = f"{z_label} Surface [{unit}] — {metadata.get('deg_label', f'Mode {mode_id}')}"
 
             # Choose output filename (top-down view or ortho)
             plot_name = f"{selected_key}_res{resolution}_top.svg" if view == "top" \
                         else f"{selected_key}_res{resolution}.svg"
             plot_path = mode_plot_dir / plot_name
-            if not overwrite:
-                plot_path = unique_path(plot_path)
 
-            # Plot and save the surface
-            save_parametric_3d(K, N, Z, title=title, z_label=z_label, z_unit=unit,
-                               cmap=cmap, save_path=str(plot_path), show=False, view=view)
+            # Plot and save the surface (or reuse the cached figure)
+            key, _ = save_parametric_3d_cached(K, N, Z, save_path=plot_path, title=title, z_label=z_label,
+                                               z_unit=unit, cmap=cmap, view=view, force=overwrite)
 
             # Simple stats for quick inspection
-            z_flat = Z.astype(float).ravel()
-            if np.isfinite(z_flat).any():
-                z_max = float(np.nanmax(Z))
-                z_min = float(np.nanmin(Z))
-                z_mean = float(np.nanmean(Z))
-                flat_idx = int(np.nanargmax(Z))
-                imax, jmax = np.unravel_index(flat_idx, Z.shape)
-                k_max = int(K[imax, jmax])
-                n_max = int(N[imax, jmax])
-                summary_lines.append(
-                    f"- {selected_key}: saved -> {plot_path.name} | unit={unit} | "
-                    f"min={z_min:.3f}, mean={z_mean:.3f}, max={z_max:.3f} @ (K={k_max}, N={n_max})"
-                )
-            else:
-                summary_lines.append(f"- {selected_key}: all values non-finite; plot saved as {plot_path.name}")
+            summary_lines.append(_surface_summary_line(selected_key, Z, K, N, unit, [plot_path.name], [key]))
 
     # Write short summary file next to plots
     summary_path = mode_plot_dir / f"summary_res{resolution}.txt"
@@ -710,18 +827,83 @@ def save_multimodal_surfaces(*, mode_id=999, resolution=1, view=None,
     print(f"[save_multimodal_metric_surfaces] Wrote {summary_path}")
 
 
+def run_timeseries(profile_csv, min_degraded_modules=10, num_degraded_strings=30, time_col=None,
+                   ee_unit="W/m2", tcell_unit="C", curve_tables=False):
+    """
+    Annual energy, mismatch energy and degradation energy of a parametric mismatched system
+    (current degradation_mode) driven by an (Ee, Tcell) profile CSV (see sys_timeseries).
+
+    Parameters:
+    - profile_csv (str): CSV with Ee and Tcell columns (hourly or sub-hourly)
+    - min_degraded_modules (int): K degraded modules per affected string [0-30]
+    - num_degraded_strings (int): N affected strings [0-150]
+    - time_col (str): optional timestamp column used to infer the step length
+    - ee_unit, tcell_unit: "W/m2" or "suns"; "C" or "K"
+    - curve_tables (bool): interpolate module curves from (Ee, Tcell) tables (see sys_curve_table); faster, but the
+      mismatch/loss energies are then not reliable (simulate_timeseries warns)
+    """
+    profile = load_profile(profile_csv, time_col=time_col, ee_unit=ee_unit, tcell_unit=tcell_unit)
+    system_mismatched = create_mismatched_parametric(min_degraded_modules=min_degraded_modules,
+                                                     num_degraded_strings=num_degraded_strings,
+                                                     module_healthy=mod_healthy, module_degraded=mod_deg,
+                                                     composite=True)
+    result = simulate_timeseries(system_mismatched, profile, module_healthy=mod_healthy, curve_tables=curve_tables)
+
+    print(f"\n=== Annual Energy ({deg_label}, K={min_degraded_modules}, N={num_degraded_strings}) ===")
+    for k, v in result.items():
+        if k.startswith("percent"):
+            print(f"{k}: {v:.2f} %")
+        elif "energy" in k:
+            print(f"{k}: {v:.1f} kWh")
+        elif k == "table_error_max":
+            print(f"{k}: {100 * v:.2f} %")
+    return result
+
+
+def run_mismatch_monte_carlo(n_systems=1000, level_probs=None, rs_factor=None, p_degraded=1.0, seed=0,
+                             max_workers=None):
+    """
+    Monte Carlo loss distribution for randomly degraded 150 x 30 systems (see sys_montecarlo).
+
+    Parameters:
+    - n_systems (int): number of random systems
+    - level_probs (dict): {level: probability} over levels 0 (healthy) and 1-6, e.g. {0: 0.7, 1: 0.1, 3: 0.1, 6: 0.1}
+    - rs_factor (tuple): continuous Rs multiplier (Rsh divided by the same factor) if level_probs is None,
+      e.g. ("lognormal", 2.0, 0.3)
+    - p_degraded (float): share of degraded modules (continuous sampling)
+    - seed (int): root seed (reproducible for any max_workers)
+    """
+    if level_probs is None and rs_factor is None:
+        level_probs = {0: 0.7, 1: 0.1, 3: 0.1, 6: 0.1}
+    result = run_monte_carlo(n_systems=n_systems, level_probs=level_probs, rs_factor=rs_factor,
+                             p_degraded=p_degraded, seed=seed, max_workers=max_workers)
+
+    print(f"\n=== Monte Carlo ({result['n_systems']} systems) ===")
+    for k in ("system_MPP_degraded", "total_system_loss", "mismatch_total", "degradation_only",
+              "percent_loss", "percent_mismatch_total", "percent_mismatch_to_loss"):
+        m = result["metrics"][k]
+        unit = "%" if k.startswith("percent") else "W"
+        quantiles = ", ".join(f"{q}={v:.2f}" for q, v in m.items() if q.startswith("q"))
+        print(f"{k}: mean={m['mean']:.2f} {unit}, std={m['std']:.2f}, {quantiles}")
+    return result
+
+
 # ----- RUN -----
 # run_baselines()
 # run_mismatch_pyramid(degraded_sets=3, min_degraded_modules=1, max_degraded_modules=15, clamp_after_max=True)
-# run_mismatch_parametric_2d(mismatch_vs="total") # Note: long run time (~3min)
+# run_mismatch_parametric_2d(mismatch_vs="total")
+# run_mismatch_monte_carlo(n_systems=1000, level_probs={0: 0.7, 1: 0.1, 3: 0.1, 6: 0.1}) # Random L1-L6 degradation (wrap in `if __name__ == "__main__":` on Windows/macOS)
+# run_timeseries("profile.csv", min_degraded_modules=10, num_degraded_strings=30, time_col="time") # Hourly/15-min Ee [W/m2], Tcell [C] profile
 
 # save_parametric_results(resolution=1, mode_id=1) # Data already stored - not necessary to run
+# save_parametric_results_all(resolution=1, modes=range(1, 7)) # All modes in parallel (wrap in `if __name__ == "__main__":` on Windows/macOS)
 # run_mismatch_parametric_3d(resolution=1, metric_key="metric_percent_mismatch_to_loss", deg_mode=1)
 # run_mismatch_parametric_3d(resolution=1, metric_key="metric_mismatch_total", deg_mode=5)
 # save_parametric_surfaces(resolution=1, view='ortho') # Plots already stored - not necessary to run
 # save_parametric_surfaces(resolution=1, view='top') # Plots already stored - not necessary to run
 
 # save_trend_surfaces(resolution=1, modes=range(1, 7), show=False) # Plots already stored - not necessary to run
+# render_parametric_surfaces(resolution=1, modes=range(1, 7)) # Headless batch of all views + trends, skips unchanged figures (wrap in `if __name__ == "__main__":` on Windows/macOS)
 
 # save_multimodal_results(resolution=1, levels=(1, 2, 3, 4, 5, 6), mode_id=999) # Data already stored - not necessary to run
 # save_multimodal_surfaces(mode_id=999, resolution=1, view='ortho') # Plots already stored - not necessary to run
@@ -0,0 +1,351 @@
+# Tide Langner
+# Annual time-series simulation of a mismatched system driven by an (Ee, Tcell) profile
+
+import csv
+import time
+import warnings
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import numpy as np
+from case_study_data.module_cache import get_module
+try:
+    from sys_mismatched import CompositeSystem, parallel_curves, series_curves
+    from sys_mismatch_calculator import loss_metrics_batch, mpp_from_curve
+    from sys_curve_table import get_curve_table, interpolate_module
+except ImportError:  # imported as part of the mismatch_study package (e.g. from excel_tool)
+    from mismatch_study.sys_mismatched import CompositeSystem, parallel_curves, series_curves
+    from mismatch_study.sys_mismatch_calculator import loss_metrics_batch, mpp_from_curve
+    from mismatch_study.sys_curve_table import get_curve_table, interpolate_module
+
+"""
+Instead of solving the system at every time step, steps are grouped into (Ee, Tcell) bins. Each occupied bin
+is solved once (one module solve per prototype, one series combination per distinct string composition)
+and its powers are applied to every step in the bin, scaled by Ee / Ee_bin (power is close to linear in irradiance within a narrow bin).
+An 8,760-step year typically occupies a few hundred bins.
+
+Units inside this module follow pvmismatch: Ee in suns (1 sun = 1000 W/m2), Tcell in K.
+"""
+
+# Cell parameters carried over when a module is rebuilt at another (Ee, Tcell)
+CELL_PARAMS = ("Rs", "Rsh", "Isc0_T0", "alpha_Isc", "Isat1_T0", "Isat2_T0")
+
+# Prototype ID of the healthy reference module within a bin
+_HEALTHY = "_healthy"
+
+# Per-bin report keys accumulated into energies (W -> Wh)
+ENERGY_KEYS = ("system_MPP_degraded", "system_MPP_healthy", "total_system_loss",
+               "mismatch_total", "mismatch_modules_to_strings", "mismatch_strings_to_system", "degradation_only")
+
+
+# --- Profile ---
+def load_profile(path, ee_col="Ee", tcell_col="Tcell", time_col=None, ee_unit="W/m2", tcell_unit="C",
+                 step_hours=None):
+    """
+    Read an hourly / sub-hourly (Ee, Tcell) profile from a local CSV file.
+
+    Parameters:
+      - path: CSV file with a header row
+      - ee_col, tcell_col: column names of effective irradiance and cell temperature
+      - time_col: optional timestamp column (ISO 8601); used to infer the step length
+      - ee_unit: "W/m2" or "suns"
+      - tcell_unit: "C" or "K"
+      - step_hours: step length in hours; default from time_col (median spacing), else 8760 / number of rows
+
+    Returns dict with "Ee" (suns), "Tcell" (K), "time" (list of datetime or None) and "step_hours".
+    """
+    if ee_unit not in ("W/m2", "suns"):
+        raise ValueError(f"Invalid ee_unit '{ee_unit}'. Must be 'W/m2' or 'suns'.")
+    if tcell_unit not in ("C", "K"):
+        raise ValueError(f"Invalid tcell_unit '{tcell_unit}'. Must be 'C' or 'K'.")
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        required = [c for c in (ee_col, tcell_col, time_col) if c is not None]
+        missing = [c for c in required if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {missing}. Found: {reader.fieldnames}")
+        rows = list(reader)
+    if not rows:
+        raise ValueError(f"{path}: profile is empty.")
+
+    Ee = np.array([float(r[ee_col] or 0.0) for r in rows])
+    Tcell = np.array([float(r[tcell_col]) for r in rows])
+    if ee_unit == "W/m2":
+        Ee = Ee / 1000.0
+    if tcell_unit == "C":
+        Tcell = Tcell + 273.15
+
+    times = None
+    if time_col is not None:
+        times = [datetime.fromisoformat(r[time_col].strip()) for r in rows]
+        if step_hours is None and len(times) > 1:
+            spacing = np.diff([t.timestamp() for t in times]) / 3600.0
+            step_hours = float(np.median(spacing))
+    if step_hours is None:
+        step_hours = 8760.0 / len(rows)
+    if step_hours <= 0:
+        raise ValueError("step_hours must be > 0.")
+
+    return {"Ee": Ee, "Tcell": Tcell, "time": times, "step_hours": float(step_hours)}
+
+
+def bin_conditions(Ee, Tcell, ee_step=0.025, tcell_step=2.0, min_ee=0.005):
+    """
+    Group time steps into (Ee, Tcell) bins.
+
+    Parameters:
+      - Ee, Tcell: per-step irradiance [suns] and cell temperature [K]
+      - ee_step, tcell_step: bin widths [suns], [K]
+      - min_ee: steps below this irradiance are dark (no output, not binned)
+
+    Returns dict with "index" (per-step bin index, -1 for dark steps) and per-bin "Ee", "Tcell"
+    (bin centres) and "count".
+    """
+    Ee = np.asarray(Ee, dtype=float)
+    Tcell = np.asarray(Tcell, dtype=float)
+    if ee_step <= 0 or tcell_step <= 0:
+        raise ValueError("ee_step and tcell_step must be > 0.")
+
+    lit = Ee >= min_ee
+    cells = np.stack((np.floor(Ee[lit] / ee_step), np.floor(Tcell[lit] / tcell_step)), axis=1).astype(np.int64)
+    keys, inverse, count = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+
+    index = np.full(Ee.shape, -1, dtype=np.int64)
+    index[lit] = inverse.ravel()
+    return {
+        "index": index,
+        "Ee": (keys[:, 0] + 0.5) * ee_step,
+        "Tcell": (keys[:, 1] + 0.5) * tcell_step,
+        "count": count,
+    }
+
+
+# --- System at a condition ---
+def _module_params(pvmod):
+    """Cell parameters of a module built from identical cells (as module_cache.get_module builds them)."""
+    cell = pvmod.pvcells[0]
+    params = {name: float(getattr(cell, name)) for name in CELL_PARAMS}
+    for other in pvmod.pvcells[1:]:
+        if other is not cell and any(float(getattr(other, name)) != params[name] for name in CELL_PARAMS):
+            raise ValueError("Time-series simulation needs modules built from identical cells "
+                             "(see case_study_data.module_cache.get_module).")
+    return params
+
+
+def system_layout(pvsys):
+    """
+    Module prototypes and string multiset of a system built by sys_mismatched.
+
+    Returns ({prototype_id: cell parameters}, {signature: count}). A CompositeSystem keeps its prototype IDs;
+    for a PVsystem each distinct module object becomes a prototype "M0", "M1", ...
+    """
+    if isinstance(pvsys, CompositeSystem):
+        params = {pid: _module_params(m) for pid, m in pvsys.prototypes.items()}
+        return params, {sig: int(c) for sig, c in zip(pvsys.signatures, pvsys.counts)}
+
+    ids, params, counts = {}, {}, {}
+    for pvstr in pvsys.pvstrs:
+        sig = []
+        for pvmod in pvstr.pvmods:
+            if id(pvmod) not in ids:
+                ids[id(pvmod)] = f"M{len(ids)}"
+                params[ids[id(pvmod)]] = _module_params(pvmod)
+            sig.append(ids[id(pvmod)])
+        counts[tuple(sig)] = counts.get(tuple(sig), 0) + 1
+    return params, counts
+
+
+def series_curve(modules, composition, pvconst):
+    """
+    PVstring.calcString for a string given as {prototype_id: count} (see sys_mismatched.series_curves).
+    Returns (Istring, Vstring).
+    """
+    ids = list(composition)
+    Istring, Vstring = series_curves([[composition[pid] for pid in ids]], [modules[pid] for pid in ids], pvconst)
+    return Istring[0], Vstring[0]
+
+
+def curve_from_module(pvmod):
+    """Module curve {"I", "V", "Isc", "Pmp"} of a solved PVmodule (see system_mpps)."""
+    I, V = pvmod.Imod.flatten(), pvmod.Vmod.flatten()
+    return {"I": I, "V": V, "Isc": float(pvmod.Isc.mean()), "Pmp": mpp_from_curve(I, V, I * V)[0]}
+
+
+def module_curve(params, Ee=1.0, Tcell=298.15):
+    """Module curve for cell parameters at Ee [suns], Tcell [K] (see curve_from_module)."""
+    return curve_from_module(get_module(**params, Ee=Ee, Tcell=Tcell))
+
+
+def system_mpps(modules, counts, pvconst):
+    """
+    (Psys, sum of string MPPs, sum of module MPPs) of a string multiset built from solved module curves.
+
+    Parameters:
+      - modules: {prototype_id: module curve} (see module_curve)
+      - counts: {signature: count}, a signature being a tuple of prototype IDs (one per module)
+      - pvconst: PVconstants shared by the modules
+    """
+    compositions = {}
+    for sig, c in counts.items():
+        comp = tuple(sorted(Counter(sig).items()))
+        compositions[comp] = compositions.get(comp, 0) + c
+
+    strings, weights, Pstrs, Pmods = [], [], 0.0, 0.0
+    for comp, c in compositions.items():
+        Istring, Vstring = series_curve(modules, dict(comp), pvconst)
+        strings.append(SimpleNamespace(Istring=Istring, Vstring=Vstring, pvconst=pvconst))
+        weights.append(c)
+        Pstrs += c * mpp_from_curve(Istring, Vstring, Istring * Vstring)[0]
+        Pmods += c * sum(n * modules[pid]["Pmp"] for pid, n in comp)
+
+    Isys, Vsys = parallel_curves(np.array(weights)[None, :], strings)
+    return float(np.max(Isys[0] * Vsys[0])), Pstrs, Pmods
+
+
+def evaluate_condition(params, counts, healthy_params, Ee, Tcell, tables=None):
+    """
+    loss_calculator metrics of a system layout (see system_layout) and its all-healthy counterpart with every
+    module at irradiance Ee [suns] and temperature Tcell [K].
+
+    One module solve per prototype and one series combination per distinct string composition;
+    matches building the CompositeSystem and calling loss_calculator (sampled MPPs).
+
+    tables: optional {prototype_id: curve table} (see sys_curve_table) covering every prototype and the healthy
+    module (key _HEALTHY); module curves are then interpolated instead of solved and the report gets
+    "table_error", the largest relative module MPP error estimate of the curves used (see sys_curve_table; not a bound).
+    """
+    def solve(pid, p):
+        if tables is not None:
+            curve = interpolate_module(tables[pid], Ee, Tcell)
+            I, V = curve["I"], curve["V"]
+            return {"I": I, "V": V, "Isc": curve["Isc"], "Pmp": mpp_from_curve(I, V, I * V)[0],
+                    "error": curve["error"]}
+        return module_curve(p, Ee, Tcell)
+
+    modules = {pid: solve(pid, p) for pid, p in params.items()}
+    modules[_HEALTHY] = solve(_HEALTHY, healthy_params)
+    # All modules share pvmismatch's default PVconstants (module_cache builds them without a pvconst)
+    pvconst = get_module(**healthy_params).pvconst
+
+    healthy_counts = {}
+    for sig, c in counts.items():
+        healthy_sig = (_HEALTHY,) * len(sig)
+        healthy_counts[healthy_sig] = healthy_counts.get(healthy_sig, 0) + c
+
+    Psys, Pstrs, Pmods = system_mpps(modules, counts, pvconst)
+    Psys_h, Pstrs_h, Pmods_h = system_mpps(modules, healthy_counts, pvconst)
+    report = loss_metrics_batch(Psys, Pmods, Pstrs, Pmods_h, Pstrs_h, Psys_h,
+                                num_strs_affected=sum(counts.values()))
+    report = {key: float(value) for key, value in report.items()}
+    if tables is not None:
+        report["table_error"] = max(m["error"] for m in modules.values())
+    return report
+
+
+# --- Time-series engine ---
+def simulate_timeseries(pvsys, profile, module_healthy=None, ee_step=0.025, tcell_step=2.0, min_ee=0.005,
+                        scale_irradiance=True, curve_tables=False, table_dir="results/curve_tables", verbose=True):
+    """
+    Annual (or any period) energy of a mismatched system and of its healthy counterpart.
+
+    Parameters:
+      - pvsys: system from sys_mismatched (PVsystem or CompositeSystem), built from module_cache modules
+      - profile: dict from load_profile (or any dict with "Ee" [suns], "Tcell" [K] and "step_hours")
+      - module_healthy: healthy reference module (default: healthy Jinko module, module_cache defaults);
+        the healthy system has the same strings/modules topology with every module healthy
+      - ee_step, tcell_step, min_ee: binning (see bin_conditions)
+      - scale_irradiance: scale bin powers by Ee / Ee_bin per step (False uses the bin value as is)
+      - curve_tables: interpolate module curves from persisted (Ee, Tcell) tables in table_dir instead of
+        solving them (tables are built on first use, see sys_curve_table); adds per-bin "table_error" and
+        "table_error_max" (relative module MPP error estimate, not a bound) to the result. Energies of the
+        system and its healthy counterpart are usable; mismatch, loss and degradation energies are not
+        (a warning is issued), as they are small differences that the interpolation error can dominate
+
+    Returns dict with energies in kWh ("energy", "energy_healthy", "loss_energy", "mismatch_energy",
+    "mismatch_energy_modules_to_strings", "mismatch_energy_strings_to_system", "degradation_energy"),
+    percentages of the healthy energy, per-step powers [W] ("power", "power_healthy", "power_mismatch"),
+    per-bin results ("bins") and counts ("n_steps", "n_bins", "n_module_solves").
+    """
+    t0 = time.time()
+    Ee = np.asarray(profile["Ee"], dtype=float)
+    Tcell = np.asarray(profile["Tcell"], dtype=float)
+    if Ee.shape != Tcell.shape:
+        raise ValueError("Ee and Tcell profiles must have the same length.")
+    step_hours = float(profile["step_hours"])
+
+    params, counts = system_layout(pvsys)
+    healthy_params = _module_params(module_healthy if module_healthy is not None else get_module())
+
+    bins = bin_conditions(Ee, Tcell, ee_step=ee_step, tcell_step=tcell_step, min_ee=min_ee)
+    n_bins = len(bins["count"])
+
+    tables = None
+    if curve_tables:
+        tables = {pid: get_curve_table(p, table_dir, verbose=verbose) for pid, p in params.items()}
+        tables[_HEALTHY] = get_curve_table(healthy_params, table_dir, verbose=verbose)
+
+    # Solve every occupied bin once
+    keys = ENERGY_KEYS + (("table_error",) if curve_tables else ())
+    per_bin = {key: np.zeros(n_bins) for key in keys}
+    for b in range(n_bins):
+        report = evaluate_condition(params, counts, healthy_params, float(bins["Ee"][b]), float(bins["Tcell"][b]),
+                                    tables=tables)
+        for key in keys:
+            per_bin[key][b] = report[key]
+
+    # Map bins back onto the time steps
+    lit = bins["index"] >= 0
+    scale = np.zeros(Ee.shape)
+    if scale_irradiance:
+        scale[lit] = Ee[lit] / bins["Ee"][bins["index"][lit]]
+    else:
+        scale[lit] = 1.0
+
+    def per_step(key):
+        out = np.zeros(Ee.shape)
+        out[lit] = per_bin[key][bins["index"][lit]] * scale[lit]
+        return out
+
+    energy = {key: float(per_step(key).sum()) * step_hours / 1000.0 for key in ENERGY_KEYS}
+    E_healthy = energy["system_MPP_healthy"]
+
+    def pct(e):
+        return 100.0 * e / E_healthy if E_healthy else 0.0
+
+    result = {
+        # Energies [kWh]
+        "energy": energy["system_MPP_degraded"],
+        "energy_healthy": E_healthy,
+        "loss_energy": energy["total_system_loss"],
+        "mismatch_energy": energy["mismatch_total"],
+        "mismatch_energy_modules_to_strings": energy["mismatch_modules_to_strings"],
+        "mismatch_energy_strings_to_system": energy["mismatch_strings_to_system"],
+        "degradation_energy": energy["degradation_only"],
+        # Percentages of healthy energy
+        "percent_loss": pct(energy["total_system_loss"]),
+        "percent_mismatch": pct(energy["mismatch_total"]),
+        "percent_degradation": pct(energy["degradation_only"]),
+        # Per-step powers [W]
+        "power": per_step("system_MPP_degraded"),
+        "power_healthy": per_step("system_MPP_healthy"),
+        "power_mismatch": per_step("mismatch_total"),
+        # Per-bin results [W at the bin centre]
+        "bins": {"Ee": bins["Ee"], "Tcell": bins["Tcell"], "count": bins["count"], **per_bin},
+        "n_steps": int(Ee.size),
+        "n_bins": n_bins,
+        "n_module_solves": 0 if curve_tables else n_bins * (len(params) + 1),
+        "step_hours": step_hours,
+    }
+    if curve_tables:
+        result["table_error_max"] = float(per_bin["table_error"].max()) if n_bins else 0.0
+        warnings.warn("simulate_timeseries(curve_tables=True): mismatch, loss and degradation energies come from "
+                      "interpolated module curves and are not reliable (table_error is a centre-point estimate, not "
+                      "a bound); use curve_tables=False for mismatch energies.", RuntimeWarning, stacklevel=2)
+        if not np.isfinite(result["table_error_max"]):
+            warnings.warn("simulate_timeseries(curve_tables=True): some bins fall in curve-table cells without an "
+                          "error estimate (degenerate pvmismatch curves).", RuntimeWarning, stacklevel=2)
+    if verbose:
+        print(f"[simulate_timeseries] {result['n_steps']} steps -> {n_bins} bins "
+              f"({result['n_module_solves']} module solves) in {timedelta(seconds=time.time() - t0)}")
+    return result